@@ -1,7 +1,7 @@
 from django import forms
 from django.contrib import admin
 
-from .models import SSHCredential, WinRMCredential, Host
+from .models import SSHCredential, WinRMCredential, Host, HostTag
 
 
 class CredentialAdminForm(forms.ModelForm):
@@ -36,3 +36,8 @@ class WinRMCredentialAdmin(admin.ModelAdmin):
 @admin.register(Host)
 class HostAdmin(admin.ModelAdmin):
     list_display = ['id', 'name', 'os']
+
+
+@admin.register(HostTag)
+class HostTagAdmin(admin.ModelAdmin):
+    list_display = ['id', 'name']
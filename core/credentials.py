@@ -0,0 +1,121 @@
+import threading
+import time
+from typing import Callable, Hashable
+
+from django.conf import settings
+from django.db import models
+
+
+class TTLCache:
+    """
+    Кэш в памяти процесса: значение хранится не дольше ttl секунд с момента записи.
+    Устаревшие значения удаляются при обращении к ним и не реже раза в ttl секунд при записи.
+    """
+
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+        self._items: dict[Hashable, tuple[object, float]] = {}
+        self._lock = threading.Lock()
+        self._purged_at = time.monotonic()
+
+    def get(self, key: Hashable):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at < time.monotonic():
+                del self._items[key]
+                return None
+            return value
+
+    def set(self, key: Hashable, value) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if now - self._purged_at > self.ttl:
+                self._items = {item_key: item for item_key, item in self._items.items() if item[1] >= now}
+                self._purged_at = now
+            self._items[key] = (value, now + self.ttl)
+
+    def evict(self, key: Hashable) -> None:
+        with self._lock:
+            self._items.pop(key, None)
+
+    def evict_if(self, predicate: Callable[[Hashable], bool]) -> None:
+        with self._lock:
+            for key in [key for key in self._items if predicate(key)]:
+                del self._items[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+
+# Расшифрованные пароли учетных записей: (модель, id) -> (зашифрованный пароль, пароль)
+secret_cache = TTLCache(settings.CREDENTIAL_CACHE_TTL)
+# Учетные записи хостов выполняющихся операций: (модель, id операции) -> CredentialResolver
+resolver_cache = TTLCache(settings.CREDENTIAL_CACHE_TTL)
+
+
+def get_secret(key: tuple, encrypted: bytes, decrypt: Callable[[bytes], str]) -> str:
+    """
+    Расшифровывает секрет один раз: повторные вызовы в течение settings.CREDENTIAL_CACHE_TTL секунд
+    берут его из secret_cache. Если зашифрованное значение изменилось, секрет расшифровывается заново.
+    """
+    cached = secret_cache.get(key)
+    if cached is not None and cached[0] == encrypted:
+        return cached[1]
+    secret = decrypt(encrypted)
+    secret_cache.set(key, (encrypted, secret))
+    return secret
+
+
+def evict_credential(credential: models.Model) -> None:
+    """
+    Удаляет из кэшей расшифрованный пароль учетной записи и загруженные учетные записи операций.
+    """
+    secret_cache.evict((credential._meta.label, credential.pk))
+    resolver_cache.clear()
+
+
+class CredentialResolver:
+    """
+    Учетные записи (SSHCredential или WinRMCredential) набора хостов. Все связи хост - учетная запись
+    загружаются одним запросом; для каждого хоста выбирается учетная запись с наименьшим id,
+    как host.<учетная запись>_set.first().
+    """
+
+    def __init__(self, model: type[models.Model], hosts: models.QuerySet):
+        self.model = model
+        field = model._meta.get_field('host')
+        name = field.m2m_field_name()
+        links = (field.remote_field.through.objects
+                 .filter(host_id__in=hosts.values('id'))
+                 .select_related(name)
+                 .order_by('host_id', f'{name}_id'))
+        self.credentials: dict[int, models.Model] = {}
+        for link in links:
+            self.credentials.setdefault(link.host_id, getattr(link, name))
+
+    def get(self, host_id: int) -> models.Model | None:
+        if host_id not in self.credentials:
+            # Хост не из набора либо без учетных записей: запрашивается отдельно, результат запоминается
+            self.credentials[host_id] = self.model.objects.filter(host=host_id).order_by('pk').first()
+        return self.credentials[host_id]
+
+    @classmethod
+    def for_operation(cls, model: type[models.Model], operation) -> 'CredentialResolver':
+        """
+        Учетные записи хостов операции (operation.credential_hosts()). Загружаются при первом обращении
+        и переиспользуются подоперациями операции, выполняемыми в этом процессе.
+        """
+        key = (model._meta.label, operation.pk)
+        resolver = resolver_cache.get(key)
+        if resolver is None:
+            resolver = cls(model, operation.credential_hosts())
+            resolver_cache.set(key, resolver)
+        return resolver
+
+    @staticmethod
+    def evict(operation) -> None:
+        resolver_cache.evict_if(lambda key: key[1] == operation.pk)
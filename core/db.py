@@ -0,0 +1,32 @@
+import logging
+
+from django.db import DatabaseError, transaction
+from django.db.migrations import AddIndex
+
+logger = logging.getLogger(__name__)
+
+
+class AddTrigramIndex(AddIndex):
+    """
+    Добавляет индекс с классом операторов pg_trgm (gin_trgm_ops), предварительно создавая расширение pg_trgm.
+    Если расширение недоступно на сервере БД или у пользователя нет прав на его создание, индекс
+    не создается: поиск по подстроке продолжает работать, но без индекса.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if not self.create_extension(schema_editor):
+            logger.warning('Расширение pg_trgm недоступно, индекс %s не создан.', self.index.name)
+            return
+        super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        schema_editor.execute(f'DROP INDEX IF EXISTS {schema_editor.quote_name(self.index.name)}')
+
+    @staticmethod
+    def create_extension(schema_editor) -> bool:
+        try:
+            with transaction.atomic(using=schema_editor.connection.alias):
+                schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        except DatabaseError:
+            return False
+        return True
@@ -0,0 +1,47 @@
+from django.db.models import Q
+from django_filters import rest_framework as filters
+from rest_framework.exceptions import ValidationError
+
+from .models import Host, SSHCredential, WinRMCredential
+from .selectors import SelectorError, parse_selector
+
+
+class HostFilter(filters.FilterSet):
+    """
+    ?name=<подстрока имени>, ?ip=<начало IP-адреса>, ?search=<подстрока имени или начало IP-адреса>,
+    ?tag=<имя тега>, ?selector=<выражение выбора хостов> (см. core.selectors).
+    """
+    name = filters.CharFilter(lookup_expr='icontains')
+    ip = filters.CharFilter(lookup_expr='startswith')
+    tag = filters.CharFilter(field_name='tags__name')
+    search = filters.CharFilter(method='filter_search')
+    selector = filters.CharFilter(method='filter_selector')
+
+    def filter_search(self, queryset, name, value):
+        return queryset.filter(Q(name__icontains=value) | Q(ip__startswith=value))
+
+    def filter_selector(self, queryset, name, value):
+        try:
+            return queryset.filter(parse_selector(value))
+        except SelectorError as e:
+            raise ValidationError({'selector': [str(e)]})
+
+    class Meta:
+        model = Host
+        fields = ['name', 'ip', 'os', 'tag', 'search', 'selector']
+
+
+class SSHCredentialFilter(filters.FilterSet):
+    username = filters.CharFilter(lookup_expr='icontains')
+
+    class Meta:
+        model = SSHCredential
+        fields = ['username', 'host']
+
+
+class WinRMCredentialFilter(filters.FilterSet):
+    username = filters.CharFilter(lookup_expr='icontains')
+
+    class Meta:
+        model = WinRMCredential
+        fields = ['username', 'host']
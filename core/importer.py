@@ -0,0 +1,164 @@
+import csv
+import io
+import json
+from itertools import islice
+from typing import Iterable, Iterator
+
+from django.conf import settings
+from django.db import transaction
+
+from .credentials import resolver_cache
+from .models import Host, SSHCredential, WinRMCredential
+from .serializers import HostImportSerializer
+
+CREDENTIAL_FIELDS = {
+    'ssh_credentials': SSHCredential,
+    'winrm_credentials': WinRMCredential,
+}
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+def import_format(upload) -> str:
+    """
+    Формат загруженного файла импорта по расширению имени, а если оно не csv и не json - по типу содержимого.
+    """
+    suffix = upload.name.rsplit('.', 1)[-1].lower()
+    if suffix in ('csv', 'json'):
+        return suffix
+    return {'text/csv': 'csv', 'application/json': 'json'}.get(upload.content_type, suffix)
+
+
+def read_rows(stream, format: str) -> Iterator[dict]:
+    """
+    Читает строки импорта из бинарного потока: CSV с заголовком (name, ip, os, ssh_credentials,
+    winrm_credentials) построчно, JSON - массив объектов либо объект с ключом hosts.
+    """
+    if format == 'csv':
+        reader = csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+        if not reader.fieldnames:
+            raise ImportFormatError('Пустой файл CSV.')
+        # Пустые ячейки учетных записей означают отсутствие учетных записей, пропущенные колонки - без изменений
+        return ({key: value for key, value in row.items() if key is not None} for row in reader)
+    if format == 'json':
+        try:
+            data = json.load(stream)
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            raise ImportFormatError(f'Некорректный JSON: {e}')
+        return rows_from_data(data)
+    raise ImportFormatError(f'Неподдерживаемый формат импорта: {format}.')
+
+
+def rows_from_data(data) -> Iterator[dict]:
+    if isinstance(data, dict):
+        data = data.get('hosts')
+    if not isinstance(data, list):
+        raise ImportFormatError('Ожидается массив хостов.')
+    return iter(data)
+
+
+class HostImporter:
+    """
+    Массовый импорт хостов с обновлением существующих по имени. Строки обрабатываются пачками
+    по settings.HOST_IMPORT_BATCH_SIZE: каждая пачка проверяется, записывается одним
+    INSERT ... ON CONFLICT (name) DO UPDATE, а связи с учетными записями заменяются
+    одним DELETE и одним INSERT на тип учетной записи.
+    Если в строке указан список учетных записей, связи хоста заменяются им, иначе не изменяются.
+    Результат - отчет по каждой строке (нумерация с 1).
+    """
+
+    def __init__(self, batch_size: int | None = None):
+        self.batch_size = batch_size or settings.HOST_IMPORT_BATCH_SIZE
+        self.results: list[dict] = []
+        self._seen: dict[str, int] = {}
+
+    def run(self, rows: Iterable) -> list[dict]:
+        rows = enumerate(rows, start=1)
+        with transaction.atomic():
+            while batch := list(islice(rows, self.batch_size)):
+                self._import_batch(batch)
+        resolver_cache.clear()
+        self.results.sort(key=lambda result: result['row'])
+        return self.results
+
+    @property
+    def summary(self) -> dict:
+        summary = {'created': 0, 'updated': 0, 'error': 0}
+        for result in self.results:
+            summary[result['status']] += 1
+        return summary
+
+    def _import_batch(self, batch: list[tuple[int, object]]) -> None:
+        valid = []
+        for number, row in batch:
+            if not isinstance(row, dict):
+                self._error(number, None, {'non_field_errors': ['Ожидается объект.']})
+                continue
+            serializer = HostImportSerializer(data=row)
+            if not serializer.is_valid():
+                self._error(number, row.get('name'), serializer.errors)
+                continue
+            data = serializer.validated_data
+            if data['name'] in self._seen:
+                self._error(number, data['name'],
+                            {'name': [f'Хост с этим именем уже указан в строке {self._seen[data["name"]]}.']})
+                continue
+            self._seen[data['name']] = number
+            valid.append((number, data))
+
+        valid = self._check_credentials(valid)
+        if not valid:
+            return
+
+        existing = set(Host.objects.filter(name__in=[data['name'] for _, data in valid]).values_list('name', flat=True))
+        hosts = Host.objects.bulk_create(
+            [Host(name=data['name'], ip=data['ip'], os=data['os']) for _, data in valid],
+            update_conflicts=True, unique_fields=['name'], update_fields=['ip', 'os'],
+        )
+        for (number, data), host in zip(valid, hosts):
+            self.results.append({
+                'row': number, 'name': host.name, 'id': host.pk,
+                'status': 'updated' if host.name in existing else 'created',
+            })
+        for field, model in CREDENTIAL_FIELDS.items():
+            links = {host.pk: data[field] for (_, data), host in zip(valid, hosts) if field in data}
+            if links:
+                self._set_links(model, links)
+
+    def _check_credentials(self, valid: list[tuple[int, dict]]) -> list[tuple[int, dict]]:
+        """
+        Отбрасывает строки со ссылками на несуществующие учетные записи: по одному запросу на тип учетной записи.
+        """
+        missing_rows = {}
+        for field, model in CREDENTIAL_FIELDS.items():
+            ids = {pk for _, data in valid for pk in data.get(field, [])}
+            if not ids:
+                continue
+            missing = ids - set(model.objects.filter(pk__in=ids).values_list('pk', flat=True))
+            for number, data in valid:
+                unknown = sorted(missing.intersection(data.get(field, [])))
+                if unknown:
+                    missing_rows.setdefault(number, {})[field] = [
+                        f'Учетная запись с id {pk} не найдена.' for pk in unknown]
+        for number, data in valid:
+            if number in missing_rows:
+                self._seen.pop(data['name'])
+                self._error(number, data['name'], missing_rows[number])
+        return [(number, data) for number, data in valid if number not in missing_rows]
+
+    @staticmethod
+    def _set_links(model, links: dict[int, list[int]]) -> None:
+        field = model._meta.get_field('host')
+        through = field.remote_field.through
+        credential_field = f'{field.m2m_field_name()}_id'
+        through.objects.filter(host_id__in=links).delete()
+        through.objects.bulk_create(
+            [through(host_id=host_id, **{credential_field: pk})
+             for host_id, credentials in links.items() for pk in dict.fromkeys(credentials)],
+            ignore_conflicts=True,
+        )
+
+    def _error(self, number: int, name, errors) -> None:
+        self.results.append({'row': number, 'name': name, 'status': 'error', 'errors': errors})
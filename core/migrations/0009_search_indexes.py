@@ -0,0 +1,24 @@
+# Generated by Django 5.1.6 on 2026-10-18 11:27
+
+import core.db
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_alter_host_options'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='host',
+            index=models.Index(django.contrib.postgres.indexes.OpClass(models.Func(models.F('ip'), function='HOST', output_field=models.TextField()), name='text_pattern_ops'), name='core_host_ip_prefix'),
+        ),
+        core.db.AddTrigramIndex(
+            model_name='host',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('name'), name='gin_trgm_ops'), name='core_host_name_trgm'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.6 on 2026-10-18 11:32
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HostTag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True, validators=[django.core.validators.RegexValidator('^[\\w.-]+$', 'Имя тега может содержать только буквы, цифры, "_", "." и "-".')])),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='host',
+            name='tags',
+            field=models.ManyToManyField(blank=True, related_name='hosts', to='core.hosttag'),
+        ),
+    ]
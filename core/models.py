@@ -2,9 +2,14 @@ import base64
 import hashlib
 from cryptography.fernet import Fernet
 
+from django.contrib.postgres.indexes import GinIndex, OpClass
 from django.db import models
+from django.db.models import F, Func
+from django.db.models.functions import Upper
 from django.conf import settings
-from django.core.validators import MaxValueValidator
+from django.core.validators import MaxValueValidator, RegexValidator
+
+from .credentials import evict_credential, get_secret
 
 key_material = hashlib.sha256(
     settings.SECRET_KEY[len('django-insecure-'):].encode()).digest()
@@ -12,6 +17,20 @@ fernet_key = base64.urlsafe_b64encode(key_material[:32])
 fernet = Fernet(fernet_key)
 
 
+class HostTag(models.Model):
+    """
+    Тег (группа) хостов для выбора хостов операций выражением tag=<имя>.
+    """
+    name = models.CharField(max_length=50, unique=True, validators=[
+        RegexValidator(r'^[\w.-]+$', 'Имя тега может содержать только буквы, цифры, "_", "." и "-".')])
+
+    def __str__(self):
+        return self.name
+
+    class Meta:
+        ordering = ['name']
+
+
 class Host(models.Model):
     OS_CHOICES = (
         ('linux', 'Linux'),
@@ -21,12 +40,20 @@ class Host(models.Model):
     name = models.CharField(max_length=80, unique=True)
     ip = models.GenericIPAddressField()
     os = models.CharField(max_length=10, choices=OS_CHOICES)
+    tags = models.ManyToManyField(HostTag, blank=True, related_name='hosts')
 
     def __str__(self):
         return self.name
 
     class Meta:
         ordering = ['id']
+        indexes = [
+            # Поиск по началу IP-адреса: ip__startswith выполняется как HOST(ip) LIKE '...%'
+            models.Index(OpClass(Func(F('ip'), function='HOST', output_field=models.TextField()),
+                                 name='text_pattern_ops'), name='core_host_ip_prefix'),
+            # Поиск по подстроке имени: name__icontains выполняется как UPPER(name) LIKE '%...%'
+            GinIndex(OpClass(Upper('name'), name='gin_trgm_ops'), name='core_host_name_trgm'),
+        ]
 
 class Credential(models.Model):
     username = models.CharField(max_length=100)
@@ -37,7 +64,21 @@ class Credential(models.Model):
         self._password = fernet.encrypt(password.encode())
 
     def get_password(self) -> str:
-        return fernet.decrypt(bytes(self._password)).decode()
+        """
+        Пароль расшифровывается один раз и хранится в памяти процесса не дольше settings.CREDENTIAL_CACHE_TTL секунд.
+        """
+        encrypted = bytes(self._password)
+        if self.pk is None:
+            return fernet.decrypt(encrypted).decode()
+        return get_secret((self._meta.label, self.pk), encrypted, lambda value: fernet.decrypt(value).decode())
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        evict_credential(self)
+
+    def delete(self, *args, **kwargs):
+        evict_credential(self)
+        return super().delete(*args, **kwargs)
 
     def __str__(self):
         return f"{self.username}_{self.id}"
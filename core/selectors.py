@@ -0,0 +1,145 @@
+import ipaddress
+import re
+from functools import reduce
+from operator import and_, or_
+
+from django.db.models import Q, QuerySet
+
+from .models import Host
+
+TOKEN_RE = re.compile(r'''\s*(?:(?P<paren>[()])|(?P<op>!=|=)|"(?P<quoted>[^"]*)"|'(?P<squoted>[^']*)'|(?P<word>[^\s()=!"']+))''')
+KEYWORDS = ('AND', 'OR', 'NOT')
+FIELDS = {
+    'id': 'pk',
+    'name': 'name',
+    'ip': 'ip',
+    'os': 'os',
+    'tag': 'tags__name',
+}
+
+
+class SelectorError(ValueError):
+    pass
+
+
+class SelectorParser:
+    """
+    Разбирает выражение выбора хостов в условие Q, по которому хосты выбираются одним запросом.
+    Условие: <поле>=<значение> или <поле>!=<значение>, где поле - id, name, ip, os или tag.
+    Несколько значений перечисляются через запятую (любое из них), * в значении - любая подстрока.
+    Условия объединяются AND, OR, NOT и скобками, AND связывает сильнее OR. Ключевые слова без учета регистра.
+    Пример: os=linux AND (tag=prod OR name=web-*) AND NOT ip=10.0.0.1,10.0.0.2
+    """
+
+    def __init__(self, expression: str):
+        self.tokens = self.tokenize(expression)
+        self.position = 0
+
+    @staticmethod
+    def tokenize(expression: str) -> list[tuple[str, str]]:
+        tokens, position = [], 0
+        expression = expression.rstrip()
+        while position < len(expression):
+            match = TOKEN_RE.match(expression, position)
+            if match is None:
+                raise SelectorError(f'Некорректный символ в позиции {position + 1}.')
+            kind = match.lastgroup
+            value = match.group(kind)
+            if kind in ('quoted', 'squoted'):
+                kind = 'value'
+            elif kind == 'word' and value.upper() in KEYWORDS:
+                kind, value = 'keyword', value.upper()
+            tokens.append((kind, value))
+            position = match.end()
+        return tokens
+
+    def parse(self) -> Q:
+        if not self.tokens:
+            raise SelectorError('Пустое выражение.')
+        q = self.parse_or()
+        if self.position < len(self.tokens):
+            raise SelectorError(f'Неожиданный элемент "{self.tokens[self.position][1]}".')
+        return q
+
+    def peek(self) -> tuple[str, str] | None:
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def take(self, *kinds: str, value: str | None = None) -> str:
+        token = self.peek()
+        if token is None or token[0] not in kinds or (value is not None and token[1] != value):
+            found = f'"{token[1]}"' if token else 'конец выражения'
+            raise SelectorError(f'Ожидалось {value or "значение"}, найдено {found}.')
+        self.position += 1
+        return token[1]
+
+    def accept(self, kind: str, value: str) -> bool:
+        if self.peek() == (kind, value):
+            self.position += 1
+            return True
+        return False
+
+    def parse_or(self) -> Q:
+        items = [self.parse_and()]
+        while self.accept('keyword', 'OR'):
+            items.append(self.parse_and())
+        return reduce(or_, items)
+
+    def parse_and(self) -> Q:
+        items = [self.parse_not()]
+        while self.accept('keyword', 'AND'):
+            items.append(self.parse_not())
+        return reduce(and_, items)
+
+    def parse_not(self) -> Q:
+        if self.accept('keyword', 'NOT'):
+            return ~self.parse_not()
+        if self.accept('paren', '('):
+            q = self.parse_or()
+            self.take('paren', value=')')
+            return q
+        return self.parse_condition()
+
+    def parse_condition(self) -> Q:
+        field = self.take('word').lower()
+        if field not in FIELDS:
+            raise SelectorError(f'Неизвестное поле "{field}", допустимы: {", ".join(FIELDS)}.')
+        negate = self.take('op') == '!='
+        token = self.peek()
+        raw = self.take('word', 'value')
+        values = [value.strip() for value in raw.split(',')] if token[0] == 'word' else [raw]
+        if not all(values):
+            raise SelectorError(f'Пустое значение поля "{field}".')
+        q = self.condition(field, values)
+        return ~q if negate else q
+
+    @staticmethod
+    def condition(field: str, values: list[str]) -> Q:
+        lookup = FIELDS[field]
+        exact = [value for value in values if '*' not in value]
+        for value in exact:
+            if field == 'id' and not value.isdigit():
+                raise SelectorError(f'Некорректный id хоста "{value}".')
+            if field == 'ip':
+                try:
+                    ipaddress.ip_address(value)
+                except ValueError:
+                    raise SelectorError(f'Некорректный IP-адрес "{value}".')
+        items = [Q(**{f'{lookup}__in': exact})] if exact else []
+        items += [Q(**{f'{lookup}__regex': '^' + '.*'.join(map(re.escape, value.split('*'))) + '$'})
+                  for value in values if '*' in value]
+        q = reduce(or_, items)
+        if field == 'tag':
+            # Подзапрос вместо соединения: tag=a AND tag=b выбирает хосты с обоими тегами
+            return Q(pk__in=Host.objects.filter(q).values('pk'))
+        return q
+
+
+def parse_selector(expression: str) -> Q:
+    return SelectorParser(expression).parse()
+
+
+def select_hosts(expression: str) -> QuerySet:
+    """
+    Хосты, выбранные выражением (см. SelectorParser).
+    """
+    return Host.objects.filter(parse_selector(expression))
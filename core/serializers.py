@@ -1,7 +1,9 @@
+import re
+
 from rest_framework import serializers
 from django.contrib.auth.models import User
 
-from .models import Host, SSHCredential, WinRMCredential
+from .models import Host, HostTag, SSHCredential, WinRMCredential
 
 class UserShortSerializer(serializers.ModelSerializer):
     class Meta:
@@ -72,6 +74,11 @@ class WinRMCredentialSerializer(CredentialSerializer):
         model = WinRMCredential
         fields = CredentialSerializer.Meta.fields + ['port', 'ssl']
 
+class HostTagSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = HostTag
+        fields = ['id', 'name']
+
 class HostSerializer(serializers.ModelSerializer):
     ssh_credentials = serializers.PrimaryKeyRelatedField(
         many=True,
@@ -87,10 +94,16 @@ class HostSerializer(serializers.ModelSerializer):
         required=False,
         allow_empty=True
     )
+    tags = serializers.SlugRelatedField(
+        many=True,
+        slug_field='name',
+        queryset=HostTag.objects.all(),
+        required=False,
+    )
 
     class Meta:
         model = Host
-        fields = ['id', 'name', 'ip', 'os', 'ssh_credentials', 'winrm_credentials']
+        fields = ['id', 'name', 'ip', 'os', 'tags', 'ssh_credentials', 'winrm_credentials']
 
     def create(self, validated_data):
         ssh_credentials = validated_data.pop('sshcredential_set', [])
@@ -108,4 +121,28 @@ class HostSerializer(serializers.ModelSerializer):
             host.sshcredential_set.set(ssh_credentials)
         if winrm_credentials is not None:
             host.winrmcredential_set.set(winrm_credentials)
-        return host
\ No newline at end of file
+        return host
+
+
+class CredentialIdsField(serializers.ListField):
+    """
+    Список id учетных записей: массив JSON либо строка CSV с id через ';', ',' или пробел.
+    """
+    child = serializers.IntegerField(min_value=1)
+
+    def to_internal_value(self, data):
+        if isinstance(data, str):
+            data = [item for item in re.split(r'[;,\s]+', data) if item]
+        return super().to_internal_value(data)
+
+
+class HostImportSerializer(serializers.Serializer):
+    """
+    Строка массового импорта хостов. Уникальность имени и существование учетных записей
+    проверяются HostImporter сразу для всей пачки строк.
+    """
+    name = serializers.CharField(max_length=Host._meta.get_field('name').max_length)
+    ip = serializers.IPAddressField()
+    os = serializers.ChoiceField(choices=Host.OS_CHOICES)
+    ssh_credentials = CredentialIdsField(required=False, allow_empty=True)
+    winrm_credentials = CredentialIdsField(required=False, allow_empty=True)
@@ -1,9 +1,18 @@
+from unittest import mock
+
 from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework.test import APITestCase
 from rest_framework_simplejwt.tokens import AccessToken
 
-from .models import SSHCredential, WinRMCredential
+from . import models
+from .credentials import CredentialResolver
+from .models import Host, HostTag, SSHCredential, WinRMCredential
+from .selectors import SelectorError, select_hosts
 
 
 class BaseTestCase(APITestCase):
@@ -13,6 +22,19 @@ class BaseTestCase(APITestCase):
         self.token = AccessToken.for_user(self.user)
         self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
 
+class ListQueriesMixin:
+    """
+    Проверка числа запросов списка: оно одинаково для страницы из нескольких записей и из большего их числа,
+    то есть связанные объекты загружаются предвыборкой, а не отдельным запросом на запись.
+    """
+    def assertListQueries(self, url: str, create, queries: int, **params):
+        for numbers in (range(2), range(2, 8)):
+            create(numbers)
+            with self.assertNumQueries(queries):
+                response = self.client.get(url, {'page_size': 100, **params})
+            self.assertEqual(response.status_code, 200)
+        self.assertGreaterEqual(len(response.data['results']), 8)
+
 class UserTestCase(BaseTestCase):
     def test_list_users(self):
         response = self.client.get(reverse('user-list'))
@@ -154,3 +176,193 @@ class CoreTestCase(BaseTestCase):
         data = {'name': 'edited_host', 'ip': '192.168.99.99'}
         response = self.client.put(reverse('host-detail', args=[host_id]), data)
         self.assertEqual(response.status_code, 400)
+
+
+class CredentialResolverTestCase(TestCase):
+    def setUp(self):
+        self.hosts = [Host.objects.create(name=f'resolver_{number}', ip='127.0.0.1', os='linux')
+                      for number in range(3)]
+        self.credentials = []
+        for username in ('first', 'second'):
+            credential = SSHCredential(username=username)
+            credential.set_password(f'{username}_password')
+            credential.save()
+            self.credentials.append(credential)
+        self.credentials[1].host.add(*self.hosts[:2])
+        self.credentials[0].host.add(self.hosts[0])
+
+    def test_resolve(self):
+        with self.assertNumQueries(1):
+            resolver = CredentialResolver(SSHCredential, Host.objects.filter(name__startswith='resolver_'))
+            self.assertEqual(resolver.get(self.hosts[0].id), self.credentials[0])
+            self.assertEqual(resolver.get(self.hosts[1].id), self.credentials[1])
+        self.assertIsNone(resolver.get(self.hosts[2].id))
+
+    def test_secret_cache(self):
+        with mock.patch.object(models.fernet, 'decrypt', wraps=models.fernet.decrypt) as decrypt:
+            for _ in range(3):
+                self.assertEqual(SSHCredential.objects.get(username='first').get_password(), 'first_password')
+            self.assertEqual(decrypt.call_count, 1)
+
+            credential = SSHCredential.objects.get(username='first')
+            credential.set_password('changed')
+            credential.save()
+            self.assertEqual(SSHCredential.objects.get(username='first').get_password(), 'changed')
+            self.assertEqual(decrypt.call_count, 2)
+
+
+class HostFilterTestCase(BaseTestCase):
+    def test_search(self):
+        Host.objects.bulk_create([
+            Host(name='web-01', ip='10.0.0.1', os='linux'),
+            Host(name='db-01', ip='10.0.1.1', os='linux'),
+            Host(name='dc-01', ip='192.168.1.10', os='windows'),
+        ])
+
+        def names(**params):
+            response = self.client.get(reverse('host-list'), {'page_size': 100, **params})
+            return {host['name'] for host in response.data['results']}
+
+        self.assertEqual(names(ip='10.0.'), {'web-01', 'db-01'})
+        self.assertEqual(names(name='WEB'), {'web-01'})
+        self.assertEqual(names(search='192.168.'), {'dc-01'})
+        self.assertEqual(names(search='db'), {'db-01'})
+        self.assertEqual(names(os='windows'), {'dc-01'})
+
+
+class HostImportTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.ssh = SSHCredential.objects.create(username='ssh', _password=b'')
+        self.winrm = WinRMCredential.objects.create(username='winrm', _password=b'')
+        self.host = Host.objects.create(name='existing', ip='10.0.0.1', os='linux')
+        self.ssh.host.add(self.host)
+
+    def import_hosts(self, data, **kwargs):
+        return self.client.post(reverse('host-import-hosts'), data, **kwargs)
+
+    def test_json_import(self):
+        response = self.import_hosts([
+            {'name': 'existing', 'ip': '10.0.0.2', 'os': 'windows', 'ssh_credentials': [],
+             'winrm_credentials': [self.winrm.id]},
+            {'name': 'new', 'ip': '10.0.0.3', 'os': 'linux', 'ssh_credentials': [self.ssh.id]},
+            {'name': 'bad_ip', 'ip': '10.0.0', 'os': 'linux'},
+            {'name': 'new', 'ip': '10.0.0.4', 'os': 'linux'},
+            {'name': 'unknown', 'ip': '10.0.0.5', 'os': 'linux', 'ssh_credentials': [0, 999]},
+            {'name': 'unknown', 'ip': '10.0.0.5', 'os': 'linux', 'ssh_credentials': [999]},
+        ], format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['created'], response.data['updated'], response.data['error']), (1, 1, 4))
+        self.assertEqual([result['status'] for result in response.data['results']],
+                         ['updated', 'created', 'error', 'error', 'error', 'error'])
+        self.assertIn('ip', response.data['results'][2]['errors'])
+        self.assertIn('ssh_credentials', response.data['results'][5]['errors'])
+
+        self.host.refresh_from_db()
+        self.assertEqual((self.host.ip, self.host.os), ('10.0.0.2', 'windows'))
+        self.assertFalse(self.host.sshcredential_set.exists())
+        self.assertEqual(list(self.host.winrmcredential_set.all()), [self.winrm])
+        self.assertEqual(list(Host.objects.get(name='new').sshcredential_set.all()), [self.ssh])
+        self.assertFalse(Host.objects.filter(name__in=['bad_ip', 'unknown']).exists())
+
+    def test_csv_import(self):
+        content = f'name,ip,os,winrm_credentials\nexisting,10.0.0.9,linux,{self.winrm.id}\ncsv,10.0.1.1,windows,\n'
+        response = self.import_hosts({'file': SimpleUploadedFile('hosts.csv', content.encode())}, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['created'], response.data['updated'], response.data['error']), (1, 1, 0))
+        # Колонки ssh_credentials нет: SSH-учетные записи хоста не изменяются
+        self.assertEqual(list(self.host.sshcredential_set.all()), [self.ssh])
+        self.assertEqual(list(self.host.winrmcredential_set.all()), [self.winrm])
+
+        response = self.import_hosts({'file': SimpleUploadedFile('hosts.txt', b'name')}, format='multipart')
+        self.assertEqual(response.status_code, 400)
+
+    def test_queries_independent_of_rows(self):
+        def count(names):
+            rows = [{'name': name, 'ip': '10.1.0.1', 'os': 'linux', 'ssh_credentials': [self.ssh.id]} for name in names]
+            with CaptureQueriesContext(connection) as queries:
+                response = self.import_hosts(rows, format='json')
+            self.assertEqual(response.data['error'], 0)
+            return len(queries)
+
+        self.assertEqual(count([f'a{i}' for i in range(5)]), count([f'b{i}' for i in range(100)]))
+
+
+class SelectorTestCase(TestCase):
+    def setUp(self):
+        prod, web = HostTag.objects.bulk_create([HostTag(name='prod'), HostTag(name='web')])
+        self.web1 = Host.objects.create(name='web-01', ip='10.0.0.1', os='linux')
+        self.web2 = Host.objects.create(name='web-02', ip='10.0.0.2', os='linux')
+        self.db = Host.objects.create(name='db-01', ip='10.0.1.1', os='linux')
+        self.dc = Host.objects.create(name='dc-01', ip='192.168.1.10', os='windows')
+        prod.hosts.add(self.web1, self.db, self.dc)
+        web.hosts.add(self.web1, self.web2)
+
+    def select(self, expression):
+        return set(select_hosts(expression))
+
+    def test_select(self):
+        self.assertEqual(self.select('os=linux AND tag=prod'), {self.web1, self.db})
+        self.assertEqual(self.select('tag=prod and tag=web'), {self.web1})
+        self.assertEqual(self.select('tag!=web'), {self.db, self.dc})
+        self.assertEqual(self.select('name=web-* OR ip=192.168.*'), {self.web1, self.web2, self.dc})
+        self.assertEqual(self.select('NOT (os=windows OR name=db-01,web-02)'), {self.web1})
+        self.assertEqual(self.select(f'id={self.db.id},{self.dc.id} AND ip="10.0.1.1"'), {self.db})
+
+    def test_invalid(self):
+        for expression in ['', 'os', 'os=', 'os=linux AND', '(os=linux', 'color=red', 'ip=10.0', 'id=abc', 'os=linux)']:
+            with self.assertRaises(SelectorError, msg=expression):
+                self.select(expression)
+
+
+class CoreListQueriesTestCase(ListQueriesMixin, BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.tag = HostTag.objects.create(name='prod')
+        self.ssh = SSHCredential.objects.create(username='ssh', _password=b'')
+        self.winrm = WinRMCredential.objects.create(username='winrm', _password=b'')
+
+    def create_hosts(self, numbers):
+        hosts = Host.objects.bulk_create(
+            [Host(name=f'host-{number}', ip=f'10.3.0.{number}', os='linux') for number in numbers])
+        self.tag.hosts.add(*hosts)
+        self.ssh.host.add(*hosts)
+        self.winrm.host.add(*hosts)
+        return hosts
+
+    def create_credentials(self, model):
+        def create(numbers):
+            host = Host.objects.create(name=f'{model.__name__}-{numbers[0]}', ip='10.3.1.1', os='linux')
+            for credential in model.objects.bulk_create([model(username=f'user{number}', _password=b'')
+                                                         for number in numbers]):
+                credential.host.add(host)
+        return create
+
+    def test_host_list(self):
+        # аутентификация, COUNT(*), страница, теги, SSH- и WinRM-учетные записи
+        self.assertListQueries(reverse('host-list'), self.create_hosts, 6)
+
+    def test_ssh_credential_list(self):
+        # аутентификация, COUNT(*), страница, хосты
+        self.assertListQueries(reverse('ssh-credential-list'), self.create_credentials(SSHCredential), 4)
+
+    def test_winrm_credential_list(self):
+        self.assertListQueries(reverse('winrm-credential-list'), self.create_credentials(WinRMCredential), 4)
+
+    def test_host_tag_list(self):
+        def create(numbers):
+            HostTag.objects.bulk_create([HostTag(name=f'tag{number}') for number in numbers])
+        self.assertListQueries(reverse('host-tag-list'), create, 3)
+
+    def test_user_list(self):
+        User.objects.filter(id=self.user.id).update(is_staff=True)
+
+        def create(numbers):
+            User.objects.bulk_create([User(username=f'user{number}') for number in numbers])
+        # список пользователей выводится без постраничного вывода
+        for numbers in (range(2), range(2, 8)):
+            create(numbers)
+            with self.assertNumQueries(2):
+                response = self.client.get(reverse('user-list'))
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 9)
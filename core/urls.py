@@ -1,6 +1,6 @@
 from rest_framework.routers import DefaultRouter
 
-from .views import SSHCredentialViewSet, WinRMCredentialViewSet, HostViewSet, UserViewSet
+from .views import SSHCredentialViewSet, WinRMCredentialViewSet, HostViewSet, HostTagViewSet, UserViewSet
 
 
 router = DefaultRouter()
@@ -11,5 +11,6 @@ router.register('ssh-credential', SSHCredentialViewSet,
 router.register('winrm-credential', WinRMCredentialViewSet,
                 basename='winrm-credential')
 router.register('host', HostViewSet, basename='host')
+router.register('host-tag', HostTagViewSet, basename='host-tag')
 
 urlpatterns = router.urls
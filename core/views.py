@@ -1,12 +1,23 @@
+import base64
+import json
+from datetime import datetime
+
 from rest_framework import viewsets
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.exceptions import NotFound, ParseError
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.parsers import JSONParser, MultiPartParser
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.db.models import Prefetch
 
-from .models import SSHCredential, WinRMCredential, Host
-from .serializers import SSHCredentialSerializer, WinRMCredentialSerializer, HostSerializer, UserSerializer
+from .filters import HostFilter, SSHCredentialFilter, WinRMCredentialFilter
+from .importer import HostImporter, ImportFormatError, import_format, read_rows, rows_from_data
+from .models import SSHCredential, WinRMCredential, Host, HostTag
+from .serializers import (SSHCredentialSerializer, WinRMCredentialSerializer, HostSerializer, HostTagSerializer,
+                          UserSerializer)
 
 class CorePageNumberPagination(PageNumberPagination):
     page_size = 5
@@ -26,6 +37,84 @@ class CorePageNumberPagination(PageNumberPagination):
             'results': data
         })
 
+class KeysetPagination(BasePagination):
+    """
+    Постраничный вывод по ключу (created_at, id) от новых записей к старым: страница выбирается условием
+    по ключу последней записи предыдущей страницы (индекс (created_at, id)), без COUNT(*) и OFFSET.
+    Включается параметром cursor (пустой - первая страница), курсоры next и previous передаются в нем же.
+    Без параметра cursor используется прежний постраничный вывод CorePageNumberPagination.
+    """
+    page_size = CorePageNumberPagination.page_size
+    page_size_query_param = 'page_size'
+    max_page_size = CorePageNumberPagination.max_page_size
+    cursor_query_param = 'cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.legacy = None
+        if self.cursor_query_param not in request.query_params:
+            self.legacy = CorePageNumberPagination()
+            return self.legacy.paginate_queryset(queryset, request, view)
+
+        page_size = self.get_page_size(request)
+        position = self.decode_cursor(request)
+        reverse = bool(position and position['reverse'])
+        if position:
+            created_at = position['created_at']
+            try:
+                pk = queryset.model._meta.pk.to_python(position['id'])
+            except ValidationError:
+                raise NotFound('Некорректный курсор.')
+            if reverse:
+                queryset = queryset.filter(created_at__gte=created_at).exclude(created_at=created_at, id__lte=pk)
+            else:
+                queryset = queryset.filter(created_at__lte=created_at).exclude(created_at=created_at, id__gte=pk)
+        ordering = ('created_at', 'id') if reverse else ('-created_at', '-id')
+        items = list(queryset.order_by(*ordering)[:page_size + 1])
+        has_more, items = len(items) > page_size, items[:page_size]
+        if reverse:
+            items.reverse()
+
+        self.next = self.previous = None
+        if items:
+            has_next, has_previous = (position is not None, has_more) if reverse else (has_more, position is not None)
+            self.next = self.encode_cursor(items[-1], reverse=False) if has_next else None
+            self.previous = self.encode_cursor(items[0], reverse=True) if has_previous else None
+        return items
+
+    def get_paginated_response(self, data):
+        if self.legacy:
+            return self.legacy.get_paginated_response(data)
+        return Response({
+            'next': self.next,
+            'previous': self.previous,
+            'results': data,
+        })
+
+    def get_page_size(self, request) -> int:
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(page_size, self.max_page_size) if page_size > 0 else self.page_size
+
+    def decode_cursor(self, request) -> dict | None:
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            position['created_at'] = datetime.fromisoformat(position['created_at'])
+            position['id'], position['reverse'] = str(position['id']), bool(position['reverse'])
+        except (TypeError, ValueError, KeyError):
+            raise NotFound('Некорректный курсор.')
+        return position
+
+    @staticmethod
+    def encode_cursor(item, reverse: bool) -> str:
+        position = {'created_at': item.created_at.isoformat(), 'id': str(item.pk), 'reverse': reverse}
+        return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+
 class UserViewSet(viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
@@ -37,18 +126,51 @@ class UserViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 class SSHCredentialViewSet(viewsets.ModelViewSet):
-    queryset = SSHCredential.objects.all()
+    # Сериализатор выводит только id хостов
+    queryset = SSHCredential.objects.prefetch_related(Prefetch('host', queryset=Host.objects.only('id')))
     serializer_class = SSHCredentialSerializer
     pagination_class = CorePageNumberPagination
+    filterset_class = SSHCredentialFilter
 
 
 class WinRMCredentialViewSet(viewsets.ModelViewSet):
-    queryset = WinRMCredential.objects.all()
+    queryset = WinRMCredential.objects.prefetch_related(Prefetch('host', queryset=Host.objects.only('id')))
     serializer_class = WinRMCredentialSerializer
     pagination_class = CorePageNumberPagination
+    filterset_class = WinRMCredentialFilter
+
+
+class HostTagViewSet(viewsets.ModelViewSet):
+    queryset = HostTag.objects.all()
+    serializer_class = HostTagSerializer
+    pagination_class = CorePageNumberPagination
 
 
 class HostViewSet(viewsets.ModelViewSet):
-    queryset = Host.objects.all()
+    # Сериализатор выводит только id учетных записей, без зашифрованных паролей
+    queryset = Host.objects.prefetch_related(
+        'tags',
+        Prefetch('sshcredential_set', queryset=SSHCredential.objects.only('id')),
+        Prefetch('winrmcredential_set', queryset=WinRMCredential.objects.only('id')),
+    )
     serializer_class = HostSerializer
     pagination_class = CorePageNumberPagination
+    filterset_class = HostFilter
+
+    @action(detail=False, methods=['post'], url_path='import', parser_classes=[JSONParser, MultiPartParser])
+    def import_hosts(self, request):
+        """
+        Массовый импорт хостов: файл CSV или JSON в поле file (формат по расширению либо типу содержимого)
+        или массив хостов в теле запроса JSON. Существующие хосты обновляются по имени.
+        """
+        try:
+            upload = request.FILES.get('file')
+            if upload is not None:
+                rows = read_rows(upload.file, import_format(upload))
+            else:
+                rows = rows_from_data(request.data)
+            importer = HostImporter()
+            importer.run(rows)
+        except ImportFormatError as e:
+            raise ParseError(str(e))
+        return Response({**importer.summary, 'results': importer.results})
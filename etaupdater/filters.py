@@ -0,0 +1,20 @@
+from django_filters import rest_framework as filters
+
+from ops.filters import OperationFilter
+from .models import EtalonInstance, EtalonUpdate
+
+
+class EtalonInstanceFilter(filters.FilterSet):
+    stand = filters.CharFilter(lookup_expr='icontains')
+
+    class Meta:
+        model = EtalonInstance
+        fields = ['host', 'stand', 'version', 'is_valid']
+
+
+class EtalonUpdateFilter(OperationFilter):
+    host = filters.NumberFilter(field_name='instances__host', distinct=True)
+
+    class Meta:
+        model = EtalonUpdate
+        fields = ['status', 'created_by', 'created_at', 'host', 'distribution']
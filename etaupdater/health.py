@@ -0,0 +1,201 @@
+import asyncio
+import json
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Callable
+from urllib.parse import urljoin, urlsplit
+
+import aiohttp
+import redis
+from django.conf import settings
+from django.utils import timezone
+
+HEALTH_PATH = '/csp/sou/rest/dev/main/actuator/health'
+CACHE_KEY = 'etaupdater:health'
+HISTORY_KEY_PREFIX = 'etaupdater:health-history:'
+
+
+@dataclass
+class HealthResult:
+    instance_id: int
+    url: str
+    healthy: bool
+    status: str | None = None
+    error: str = ''
+    latency: float | None = None
+
+
+class HealthChecker:
+    """
+    Проверка здоровья площадок Эталона. Все запросы выполняются в одном цикле событий asyncio
+    через одну сессию aiohttp: соединения с площадками переиспользуются (keep-alive),
+    одновременно выполняется не более concurrency запросов.
+    Между повторными проверками одного хоста выдерживается пауза, растущая экспоненциально
+    от backoff до max_backoff секунд и сбрасываемая после успешной проверки.
+    Используется как контекстный менеджер: цикл событий работает в отдельном потоке, поэтому один
+    экземпляр можно использовать из нескольких потоков (площадки одного хоста обновляются параллельно),
+    а в вызывающих потоках по-прежнему можно обращаться к БД.
+    """
+
+    def __init__(self, concurrency: int | None = None, timeout: float | None = None,
+                 backoff: float | None = None, max_backoff: float | None = None):
+        self.concurrency = concurrency or settings.ETALON_HEALTH_CONCURRENCY
+        self.timeout = timeout or settings.ETALON_HEALTH_TIMEOUT
+        self.backoff = backoff or settings.ETALON_HEALTH_BACKOFF
+        self.max_backoff = max_backoff or settings.ETALON_UPDATE_OPERATION_WAIT_INTERVAL
+        self._delays: dict[str, float] = {}
+        self._delays_lock = threading.Lock()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+        self._session: aiohttp.ClientSession | None = None
+
+    def __enter__(self) -> 'HealthChecker':
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='health-checker', daemon=True)
+        self._thread.start()
+        self._session = self._run(self._open())
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        try:
+            self._run(self._session.close())
+        finally:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+            self._loop = self._thread = self._session = None
+
+    def _run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    async def _open(self) -> aiohttp.ClientSession:
+        connector = aiohttp.TCPConnector(limit=self.concurrency, keepalive_timeout=self.max_backoff + self.timeout)
+        return aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=self.timeout))
+
+    def check(self, instances) -> list[HealthResult]:
+        """
+        Однократно проверяет все площадки одновременно. Площадки без URL считаются неисправными.
+        """
+        return self._run(self._check(instances))
+
+    def wait_healthy(self, instance, timeout: int,
+                     on_retry: Callable[[HealthResult, float], None] | None = None) -> HealthResult:
+        """
+        Проверяет площадку до получения статуса UP или истечения timeout секунд.
+        Перед каждой повторной попыткой вызывается on_retry(результат, пауза).
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            result, = self.check([instance])
+            if result.healthy or time.monotonic() >= deadline:
+                return result
+            delay = min(self._next_delay(result.url), max(deadline - time.monotonic(), 0))
+            if on_retry:
+                on_retry(result, delay)
+            time.sleep(delay)
+
+    def _next_delay(self, url: str) -> float:
+        host = urlsplit(url).netloc
+        with self._delays_lock:
+            delay = self._delays.get(host, self.backoff / 2) * 2
+            self._delays[host] = min(delay, self.max_backoff)
+            return self._delays[host]
+
+    async def _check(self, instances) -> list[HealthResult]:
+        return list(await asyncio.gather(*(self._probe(instance) for instance in instances)))
+
+    async def _probe(self, instance) -> HealthResult:
+        if not instance.url:
+            return HealthResult(instance.id, '', False, error='URL площадки не определен')
+        url = urljoin(instance.url, HEALTH_PATH)
+        started = time.monotonic()
+        try:
+            async with self._session.get(url) as response:
+                response.raise_for_status()
+                status = (await response.json(content_type=None)).get('status')
+        except Exception as e:
+            return HealthResult(instance.id, url, False, error=str(e) or e.__class__.__name__)
+        result = HealthResult(instance.id, url, status == 'UP', status, latency=time.monotonic() - started)
+        if result.healthy:
+            with self._delays_lock:
+                self._delays.pop(urlsplit(url).netloc, None)
+        else:
+            result.error = 'Статус площадки отличен от UP'
+        return result
+
+
+def get_redis() -> redis.Redis | None:
+    """
+    Клиент Redis брокера Celery. Если брокер не Redis, кэш состояния площадок не используется.
+    """
+    url = settings.CELERY_BROKER_URL
+    if not url or not url.startswith(('redis://', 'rediss://', 'unix://')):
+        return None
+    return redis.Redis.from_url(url)
+
+
+def store_health(instances, results: list[HealthResult]) -> bool:
+    """
+    Сохраняет результаты проверки площадок в Redis: текущее состояние всех площадок одним хешем
+    со сроком жизни settings.ETALON_HEALTH_CACHE_TTL и историю каждой площадки кольцевым буфером
+    из settings.ETALON_HEALTH_HISTORY_SIZE последних результатов. Возвращает False, если Redis недоступен.
+    """
+    client = get_redis()
+    if client is None:
+        return False
+    checked_at = timezone.now().isoformat()
+    stands = {instance.id: instance.stand for instance in instances}
+    entries = {result.instance_id: json.dumps({**asdict(result), 'stand': stands[result.instance_id],
+                                               'checked_at': checked_at})
+               for result in results}
+    try:
+        with client.pipeline() as pipe:
+            pipe.delete(CACHE_KEY)
+            if entries:
+                pipe.hset(CACHE_KEY, mapping=entries)
+                pipe.expire(CACHE_KEY, settings.ETALON_HEALTH_CACHE_TTL)
+            for instance_id, entry in entries.items():
+                key = f'{HISTORY_KEY_PREFIX}{instance_id}'
+                pipe.lpush(key, entry)
+                pipe.ltrim(key, 0, settings.ETALON_HEALTH_HISTORY_SIZE - 1)
+                # История удаленных площадок истекает сама
+                pipe.expire(key, settings.ETALON_HEALTH_CACHE_TTL * settings.ETALON_HEALTH_HISTORY_SIZE)
+            pipe.execute()
+    except redis.RedisError:
+        return False
+    finally:
+        client.close()
+    return True
+
+
+def load_health() -> list[dict] | None:
+    """
+    Последнее сохраненное состояние всех площадок, отсортированное по id площадки, либо None, если Redis недоступен.
+    """
+    client = get_redis()
+    if client is None:
+        return None
+    try:
+        entries = client.hgetall(CACHE_KEY)
+    except redis.RedisError:
+        return None
+    finally:
+        client.close()
+    return sorted((json.loads(entry) for entry in entries.values()), key=lambda entry: entry['instance_id'])
+
+
+def load_health_history(instance_id: int) -> list[dict] | None:
+    """
+    История проверок площадки, начиная с последней, либо None, если Redis недоступен.
+    """
+    client = get_redis()
+    if client is None:
+        return None
+    try:
+        entries = client.lrange(f'{HISTORY_KEY_PREFIX}{instance_id}', 0, -1)
+    except redis.RedisError:
+        return None
+    finally:
+        client.close()
+    return [json.loads(entry) for entry in entries]
@@ -0,0 +1,50 @@
+# Generated by Django 5.1.6 on 2026-10-18 10:50
+
+from datetime import datetime
+
+from django.db import migrations
+from django.utils import timezone
+
+
+def copy_log_to_entries(apps, schema_editor):
+    """
+    Переносит JSON-лог {timestamp: message} обновлений в таблицу OperationLogEntry.
+    """
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    OperationLogEntry = apps.get_model('ops', 'OperationLogEntry')
+    EtalonUpdate = apps.get_model('etaupdater', 'EtalonUpdate')
+    content_type, _ = ContentType.objects.get_or_create(
+        app_label='etaupdater', model='etalonupdate')
+
+    for etalon_update in EtalonUpdate.objects.exclude(log={}).iterator():
+        entries = []
+        for key, message in (etalon_update.log or {}).items():
+            try:
+                created_at = timezone.make_aware(
+                    datetime.strptime(key[:26], '%Y-%m-%d %H:%M:%S.%f'))
+            except ValueError:
+                created_at = etalon_update.created_at
+            entries.append(OperationLogEntry(
+                content_type=content_type,
+                operation_id=etalon_update.id,
+                created_at=created_at,
+                message=message,
+            ))
+        OperationLogEntry.objects.bulk_create(entries)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('etaupdater', '0011_delete_prepareupdate'),
+        ('ops', '0008_operationlogentry'),
+    ]
+
+    operations = [
+        migrations.RunPython(copy_log_to_entries, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='etalonupdate',
+            name='log',
+        ),
+    ]
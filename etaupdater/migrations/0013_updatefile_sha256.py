@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-18 11:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('etaupdater', '0012_remove_etalonupdate_log'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='updatefile',
+            name='sha256',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+    ]
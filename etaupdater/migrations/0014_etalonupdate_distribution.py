@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-18 11:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('etaupdater', '0013_updatefile_sha256'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='etalonupdate',
+            name='distribution',
+            field=models.CharField(choices=[('direct', 'Direct'), ('relay', 'Relay')], default='direct', max_length=10),
+        ),
+    ]
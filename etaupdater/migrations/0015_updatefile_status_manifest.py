@@ -0,0 +1,43 @@
+# Generated by Django 5.1.6 on 2026-10-18 11:08
+
+import django.core.validators
+from django.db import migrations, models
+
+
+def mark_existing_ready(apps, schema_editor):
+    """
+    Ранее загруженные файлы обновления прошли проверку при загрузке.
+    """
+    UpdateFile = apps.get_model('etaupdater', 'UpdateFile')
+    UpdateFile.objects.update(status='ready')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('etaupdater', '0014_etalonupdate_distribution'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='updatefile',
+            name='error',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='updatefile',
+            name='manifest',
+            field=models.JSONField(default=list, editable=False),
+        ),
+        migrations.AddField(
+            model_name='updatefile',
+            name='status',
+            field=models.CharField(choices=[('processing', 'Processing'), ('ready', 'Ready'), ('invalid', 'Invalid')], default='processing', editable=False, max_length=20),
+        ),
+        migrations.RunPython(mark_existing_ready, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='updatefile',
+            name='file',
+            field=models.FileField(upload_to='updates/%Y/%m/', validators=[django.core.validators.FileExtensionValidator(allowed_extensions=['gz'])]),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-18 11:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('etaupdater', '0015_updatefile_status_manifest'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='etalonupdate',
+            name='callback',
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+    ]
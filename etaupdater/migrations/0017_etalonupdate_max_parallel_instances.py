@@ -0,0 +1,19 @@
+# Generated by Django 5.1.6 on 2026-10-18 11:14
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('etaupdater', '0016_etalonupdate_callback'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='etalonupdate',
+            name='max_parallel_instances',
+            field=models.PositiveSmallIntegerField(default=1, validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+    ]
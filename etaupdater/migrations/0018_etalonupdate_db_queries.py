@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-18 11:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('etaupdater', '0017_etalonupdate_max_parallel_instances'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='etalonupdate',
+            name='db_queries',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
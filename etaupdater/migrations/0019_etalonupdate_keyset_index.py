@@ -0,0 +1,23 @@
+# Generated by Django 5.1.6 on 2026-10-18 11:25
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('etaupdater', '0018_etalonupdate_db_queries'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='etalonupdate',
+            options={'ordering': ['-created_at', '-id']},
+        ),
+        migrations.AddIndex(
+            model_name='etalonupdate',
+            index=models.Index(fields=['created_at', 'id'], name='etaupdater_etalonupdate_keyset'),
+        ),
+    ]
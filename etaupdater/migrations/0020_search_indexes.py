@@ -0,0 +1,19 @@
+# Generated by Django 5.1.6 on 2026-10-18 11:27
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('etaupdater', '0019_etalonupdate_keyset_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='etalonupdate',
+            index=models.Index(fields=['status', 'created_at'], name='etaupdater_etalonupdate_status'),
+        ),
+    ]
@@ -1,21 +1,27 @@
-import time
+import logging
 import os
-import tarfile
-import requests
+import shlex
+import threading
+import uuid
 
-from urllib.parse import urljoin
+from celery import Signature
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from django.db import models
-from django.core.validators import FileExtensionValidator
+from typing import Any, Callable
+from django.db import models, connections
+from django.core.validators import FileExtensionValidator, MinValueValidator
+from django.core.exceptions import ValidationError
 from django.contrib.auth.models import User
 from django.conf import settings
+from django.utils import timezone
 
-from core.models import Host
+from core.models import Host, SSHCredential
 from ops.models import ExecuteCommand, BaseOperation, SendFile
-from .validators import path_validator, update_file_validator
+from ops.ssh import file_sha256, relay_file, remote_sha256, run_channel, ssh_pool
+from .health import HealthChecker, HealthResult
+from .validators import path_validator, inspect_update_archive
 
-class UnhealthException(Exception):
-    pass
+logger = logging.getLogger(__name__)
 
 
 class EtalonInstance(models.Model):
@@ -47,7 +53,17 @@ class EtalonInstance(models.Model):
         Получаем на вход stdout команды cat .env и парсим его, чтобы заполнить
         поля url, version, tag, stand
         """
-        params = UpdateFile.parse_config(stdout)
+        self.set_params(stdout)
+        self.save()
+
+    def set_params(self, stdout: str) -> None:
+        """
+        Заполняем поля url, version, tag, stand и is_valid из содержимого .env без сохранения
+        """
+        try:
+            params = UpdateFile.parse_config(stdout)
+        except ValueError:
+            params = {}
 
         stand = params.get('STAND')
         version = params.get('BRANCH')
@@ -56,7 +72,6 @@ class EtalonInstance(models.Model):
 
         if None in (stand, version, tag, url):
             self.is_valid = False
-            self.save()
             return
 
         self.url = url
@@ -64,17 +79,90 @@ class EtalonInstance(models.Model):
         self.tag = tag
         self.stand = stand
         self.is_valid = True
-        self.save()
 
-    def create_execute_command(self) -> ExecuteCommand:
+    @classmethod
+    def discover(cls, instances: models.QuerySet) -> dict:
+        """
+        Обновляет параметры площадок из их .env файлов. Площадки группируются по хостам,
+        все .env одного хоста читаются одной командой через соединение из пула SSH, хосты
+        опрашиваются параллельно (settings.ETALON_DISCOVERY_CONCURRENCY), результаты сохраняются
+        одним bulk_update. Площадки недоступных хостов не изменяются.
+        """
+        by_host: dict[int, list[EtalonInstance]] = {}
+        for instance in instances.select_related('host').prefetch_related('host__sshcredential_set'):
+            by_host.setdefault(instance.host_id, []).append(instance)
+
+        with ThreadPoolExecutor(max_workers=settings.ETALON_DISCOVERY_CONCURRENCY) as executor:
+            outputs = list(executor.map(cls.read_env_files, by_host.values()))
+
+        updated, now = [], timezone.now()
+        for host_instances, output in zip(by_host.values(), outputs):
+            if output is None:
+                continue
+            for instance in host_instances:
+                instance.set_params(output.get(instance.id, ''))
+                instance.updated_at = now
+                updated.append(instance)
+
+        cls.objects.bulk_update(updated, ['url', 'version', 'tag', 'stand', 'is_valid', 'updated_at'])
+        return {
+            'hosts': len(by_host),
+            'unreachable_hosts': outputs.count(None),
+            'updated': len(updated),
+            'valid': sum(instance.is_valid for instance in updated),
+        }
+
+    @staticmethod
+    def read_env_files(instances: list['EtalonInstance']) -> dict[int, str] | None:
+        """
+        Читает .env файлы площадок одного хоста одной командой. Возвращает {id площадки: содержимое .env},
+        либо None, если хост недоступен.
+        """
+        host = instances[0].host
+        credentials = sorted(host.sshcredential_set.all(), key=lambda credential: credential.pk)
+        if not credentials:
+            logger.warning('Нет учетных записей SSH для чтения .env площадок хоста %s (%s).', host.name, host.ip)
+            return None
+
+        marker = f'### {uuid.uuid4().hex}'
+        script = '; '.join(
+            f'echo {shlex.quote(f"{marker} {instance.id}")}; cat {shlex.quote(f"{instance.path_to_instance}/.env")}; echo'
+            for instance in instances
+        )
+        connect_params = credentials[0].create_connect_params(host.ip)
+        password = connect_params.get('password')
+        if password:
+            command = f'echo {shlex.quote(password)} | sudo -S bash -c {shlex.quote(script)}'
+        else:
+            command = f'bash -c {shlex.quote(script)}'
+
+        try:
+            with ssh_pool.connection(connect_params) as client:
+                output = run_channel(client.get_transport(), command)
+        except Exception as e:
+            logger.warning('Не удалось прочитать .env площадок хоста %s (%s): %s', host.name, host.ip, e)
+            return None
+
+        contents, current = {}, None
+        for line in output.stdout.splitlines():
+            if line.startswith(marker):
+                current = int(line[len(marker):])
+                contents[current] = []
+            elif current is not None:
+                contents[current].append(line)
+        return {instance_id: '\n'.join(lines) for instance_id, lines in contents.items()}
+
+    def create_execute_command(self, callback: Signature | None = None) -> ExecuteCommand:
         """
-        Создаем задачу на выполнение команды cat .env для получения параметров площадки
+        Создаем задачу на выполнение команды cat .env для получения параметров площадки.
+        callback - задача Celery, которая будет запущена с id операции после ее завершения
         """
         execute_command = ExecuteCommand.objects.create(
             command=[f'cat {self.path_to_instance}/.env'],
             protocol='ssh',
             sudo=True,
             created_by=self.created_by,
+            callback=callback,
         )
         execute_command.hosts.add(self.host)
         return execute_command
@@ -82,16 +170,25 @@ class EtalonInstance(models.Model):
 
 class UpdateFile(models.Model):
     """
-    Файл обновления Эталона 3
+    Файл обновления Эталона 3. Содержимое архива проверяется фоновой задачей после загрузки (status).
     """
+    STATUS_CHOICES = (
+        ('processing', 'Processing'),
+        ('ready', 'Ready'),
+        ('invalid', 'Invalid'),
+    )
+
     file = models.FileField(upload_to='updates/%Y/%m/',
                             validators=[
                                 FileExtensionValidator(
-                                    allowed_extensions=['gz']),
-                                update_file_validator
-                            ]) # Файл архива обновления в формате .tar.gz с валидацией
+                                    allowed_extensions=['gz'])
+                            ]) # Файл архива обновления в формате .tar.gz
+    status = models.CharField(choices=STATUS_CHOICES, default='processing', max_length=20, editable=False) # Статус проверки архива
+    error = models.TextField(editable=False, blank=True) # Причина, по которой архив не прошел проверку
+    manifest = models.JSONField(editable=False, default=list) # Список файлов архива: [{"name": ..., "size": ...}]
     version = models.CharField(max_length=100, editable=False) # Версия Эталона, берется из файла version.env внутри архива обновления
     tag = models.CharField(max_length=20, editable=False) # Тег Эталона, берется из файла version.env внутри архива обновления
+    sha256 = models.CharField(max_length=64, editable=False, blank=True) # SHA-256 архива, вычисляется один раз после загрузки
     loaded_by = models.ForeignKey(
         User, on_delete=models.SET_NULL, null=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -111,31 +208,59 @@ class UpdateFile(models.Model):
                 variables[key.strip()] = value.strip()
         return variables
 
-    def set_version(self):
+    def process(self):
+        """
+        Проверяем архив обновления за один потоковый проход: валидируем состав архива,
+        извлекаем version.env для заполнения полей version и tag, вычисляем SHA-256
+        и сохраняем список файлов архива.
+        """
+        try:
+            with self.file.open('rb') as file:
+                archive = inspect_update_archive(file)
+        except ValidationError as e:
+            self.status = 'invalid'
+            self.error = ' '.join(e.messages)
+            self.save(update_fields=['status', 'error'])
+            return
+
+        variables = self.parse_config(archive['version_env'] or '')
+        self.version, self.tag = variables.get('BRANCH', ''), variables.get('TAG', '')
+        self.sha256 = archive['sha256']
+        self.manifest = archive['members']
+        self.status = 'ready'
+        self.save(update_fields=['version', 'tag', 'sha256', 'manifest', 'status'])
+
+    def set_checksum(self):
+        """
+        Вычисляем SHA-256 архива обновления
+        """
+        self.sha256 = file_sha256(self.file.path)
+        self.save(update_fields=['sha256'])
+
+    @property
+    def remote_path(self) -> str:
         """
-        Извлекаем из архива обновления файл version.env и парсим его, чтобы заполнить
-        поля version и tag
+        Путь архива на хосте. Имя содержит контрольную сумму, поэтому уже отправленный
+        на хост архив переиспользуется повторными и прерванными обновлениями. Архивы предыдущих
+        обновлений удаляются после подготовки площадок хоста.
         """
-        with tarfile.open(self.file.path, 'r:gz') as archive:
-            member = archive.getmember('./version.env')
-            version_env = archive.extractfile(member)
-            content = version_env.read().decode('utf-8')
-            variables = self.parse_config(content)
-            self.version, self.tag = variables.get(
-                'BRANCH'), variables.get('TAG')
-            self.save()
+        return f'/tmp/update_jetalon_{self.sha256}.tar.gz'
 
     def save(self, *args, **kwargs):
         """
         Переопределяем метод save, чтобы при создании нового объекта
         проставить имя файла с текущей датой и временем для уникальности наименования.
         Проверяем, что объект создается впервые с помощью self._state.adding.
+        Файл, уже перенесенный в хранилище (загрузка по частям), получает имя при переносе.
         """
-        if self._state.adding:
-            self.file.name = f'{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}_' + \
-                self.file.name
+        if self._state.adding and not self.file._committed:
+            self.file.name = self.unique_name(self.file.name)
         super().save(*args, **kwargs)
 
+    @staticmethod
+    def unique_name(name: str) -> str:
+        return f'{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}_' + name
+
     def delete(self, *args, **kwargs):
         """
         Переопределяем метод delete, чтобы при удалении объекта
@@ -155,19 +280,31 @@ class EtalonUpdate(BaseOperation):
             при удалении связанного объекта UpdateFile здесь устанавливается значение NULL.
 
     """
+    DISTRIBUTION_CHOICES = (
+        ('direct', 'Direct'),
+        ('relay', 'Relay'),
+    )
+
     instances = models.ManyToManyField(EtalonInstance)
     update_file = models.ForeignKey(UpdateFile, on_delete=models.SET_NULL, null=True)
+    distribution = models.CharField(choices=DISTRIBUTION_CHOICES, default='direct', max_length=10) # Способ доставки архива на хосты: с сервера на каждый хост или по цепочке между хостами
+    max_parallel_instances = models.PositiveSmallIntegerField(default=1, validators=[MinValueValidator(1)]) # Сколько площадок одного хоста обновляются одновременно
+
+    def credential_hosts(self) -> models.QuerySet:
+        return Host.objects.filter(id__in=self.instances.values('host_id'))
 
     def run(self, host_id: int) -> bool:
         """
         Запускает процесс обновления площадок Эталона на указанном хосте.
-        При неудаче на любом этапе процесс прерывается и возвращается False, это означает, 
-        что воркер работающий на данном хосте дальше не пойдет и оставшиеся площадки обновлены не будут.
+        При неудаче проверки места или отправки файла процесс прерывается и возвращается False.
+        Площадки обновляются параллельно (не более max_parallel_instances одновременно), неудача
+        обновления одной площадки не прерывает обновление остальных; если хотя бы одна площадка
+        не обновлена, возвращается False.
         """
 
         # Получаем хост и связанные площадки
         host = Host.objects.get(id=host_id)
-        instances = self.instances.filter(host=host, is_valid=True)
+        instances = list(self.instances.filter(host=host, is_valid=True).select_related('host'))
 
         # Проверка свободного места на хосте для загрузки образов
         if not self.__check_free_space(host):
@@ -177,54 +314,128 @@ class EtalonUpdate(BaseOperation):
         if not self.__send_file_to_host(host):
             return False
 
-        # Для каждой площадки создаем задачу на выполнение команд по обновлению и следим за ее выполнением
-        # Если на каком-то этапе неудачно - выходим
-        for instance in instances:
+        # Распаковка архива и prepare_update.sh нагружают диск хоста, поэтому выполняются по одной площадке за раз
+        prepare_lock = threading.Lock()
+        # Одна сессия проверки здоровья на все площадки хоста: соединения переиспользуются между проверками
+        with HealthChecker() as checker, ThreadPoolExecutor(max_workers=self.max_parallel_instances) as executor:
+            results = list(executor.map(
+                lambda instance: self.__in_thread(self.__update_instance, instance, prepare_lock, checker), instances))
+        self.__remove_old_archives(host)
+        return all(results)
+
+    def __update_instance(self, instance: EtalonInstance, prepare_lock: threading.Lock,
+                          checker: HealthChecker) -> bool:
+        """
+        Обновляет одну площадку: проверка здоровья, подготовка и перезапуск площадки, повторная проверка здоровья.
+        """
+        try:
             # Защита от обновления с анонимной версии на не анонимную и наоборот
             instance_is_anon = 'anonymous' in instance.version
             update_file_is_anon = 'anonymous' in self.update_file.version
 
             if instance_is_anon and not update_file_is_anon:
-                self.add_log(f"[{instance.stand}] пропуск обновления с анонимной версии на не анонимную")
-                continue
+                self.add_log(f"[{instance.stand}] пропуск обновления с анонимной версии на не анонимную", host=instance.host)
+                return True
 
             if not instance_is_anon and update_file_is_anon:
-                self.add_log(f"[{instance.stand}] пропуск обновления с не анонимной версии на анонимную")
-                continue
+                self.add_log(f"[{instance.stand}] пропуск обновления с не анонимной версии на анонимную", host=instance.host)
+                return True
 
             self.__copy_last_backup(instance)
 
-            if not self.__check_health(instance, f"[{instance.stand}] health check before update"):
+            if not self.__check_health(instance, f"[{instance.stand}] health check before update", checker):
                 return False
-            if not self.__process_update(instance):
+            with prepare_lock:
+                if not self.__prepare_update(instance):
+                    return False
+            if not self.__restart_instance(instance):
                 return False
-            if not self.__check_health(instance, f"[{instance.stand}] health check after update"):
+            if not self.__check_health(instance, f"[{instance.stand}] health check after update", checker):
                 return False
             instance.version = self.update_file.version
             instance.tag = self.update_file.tag
             instance.save(update_fields=["version", "tag", "updated_at"])
+            return True
+        except Exception as e:
+            self.add_log(f"[{instance.stand}] обновление прервано ошибкой: {e}", host=instance.host)
+            return False
 
-        return True
+    def distribute_update_file(self, hosts: list[Host]) -> None:
+        """
+        Раздает архив обновления по дереву: сервер отправляет архив на settings.ETALON_UPDATE_RELAY_SEEDS
+        хостов, затем в каждом раунде каждый хост с архивом передает его следующему хосту без архива,
+        так что число источников удваивается. Одновременно выполняется не более
+        settings.ETALON_UPDATE_RELAY_CONCURRENCY передач. Хосты без достаточного свободного места
+        в раздаче не участвуют. Хосты, на которые архив доставить не удалось, получат его напрямую
+        с сервера на этапе обновления хоста.
+        """
+        if not self.update_file.sha256:
+            self.update_file.set_checksum()
+
+        with ThreadPoolExecutor(max_workers=settings.ETALON_UPDATE_RELAY_CONCURRENCY) as executor:
+            # Архив раздается только на хосты с достаточным местом, иначе раздача заполнит их диск
+            checked = executor.map(lambda host: self.__in_thread(self.__check_free_space, host), hosts)
+            targets = [host for host, enough in zip(hosts, checked) if enough]
+            seeds = targets[:settings.ETALON_UPDATE_RELAY_SEEDS]
+            pending = targets[settings.ETALON_UPDATE_RELAY_SEEDS:]
+            sent = executor.map(lambda host: self.__in_thread(self.__send_file_to_host, host), seeds)
+            sources = [host for host, host_sent in zip(seeds, sent) if host_sent]
+            while pending and sources:
+                pairs = list(zip(sources, pending))
+                pending = pending[len(pairs):]
+                relayed = executor.map(lambda pair: self.__in_thread(self.__relay_update_file, *pair), pairs)
+                sources += [target for (_, target), sent in zip(pairs, relayed) if sent]
+
+        self.add_log(f"Архив обновления доставлен через хосты на {len(sources)} из {len(hosts)} хостов")
+
+    def __in_thread(self, func: Callable, *args) -> Any:
+        """
+        Выполняет func в потоке пула: запросы потока учитываются в db_queries, соединение потока с БД закрывается.
+        """
+        try:
+            with self.track_queries():
+                return func(*args)
+        finally:
+            connections.close_all()
 
-    def __wait_operation(self, op: BaseOperation, ctx: str) -> bool:
+    def __relay_update_file(self, source: Host, target: Host) -> bool:
         """
-        Универсальный метод ожидания завершения операции. С помощью переменных
-        settings.ETALON_UPDATE_OPERATION_TIMEOUT и settings.ETALON_UPDATE_OPERATION_WAIT_INTERVAL
-        можно настроить таймаут ожидания и интервал между проверками статуса операции.
+        Передает архив обновления с хоста source на хост target и проверяет его контрольную сумму на target.
         """
-        started = datetime.now()
-        while True:
-            op.refresh_from_db()
-            if op.status == 'completed':
-                self.add_log(f"{ctx}: успешно")
-                return True
-            if op.status == 'error':
-                self.add_log(f"{ctx}: завершилось ошибкой")
-                return False
-            if (datetime.now() - started).seconds > settings.ETALON_UPDATE_OPERATION_TIMEOUT:
-                self.add_log(f"{ctx}: завершилось по таймауту")
+        ctx = f"[{source.ip} -> {target.ip}] передача архива между хостами"
+        try:
+            source_credential = self.get_credential(SSHCredential, source)
+            target_credential = self.get_credential(SSHCredential, target)
+            if not source_credential or not target_credential:
+                self.add_log(f"{ctx}: нет учетных записей SSH", host=target)
                 return False
-            time.sleep(settings.ETALON_UPDATE_OPERATION_WAIT_INTERVAL)
+
+            target_params = target_credential.create_connect_params(target.ip)
+            path = self.update_file.remote_path
+            with ssh_pool.connection(source_credential.create_connect_params(source.ip)) as source_client, \
+                    ssh_pool.connection(target_params) as target_client:
+                result = relay_file(source_client, target_client, target_params, path)
+                if result.exit_code != 0:
+                    self.add_log(f"{ctx}: {result.stderr.strip()}", host=target)
+                    return False
+                if remote_sha256(target_client, path) != self.update_file.sha256:
+                    self.add_log(f"{ctx}: контрольная сумма не совпадает", host=target)
+                    return False
+            self.add_log(f"{ctx}: успешно", host=target)
+            return True
+        except Exception as e:
+            self.add_log(f"{ctx}: {e}", host=target)
+            return False
+
+    def __check_operation(self, op: BaseOperation, ctx: str) -> bool:
+        """
+        Фиксирует в логе обновления результат выполненной подоперации.
+        """
+        if op.status == 'completed':
+            self.add_log(f"{ctx}: успешно")
+            return True
+        self.add_log(f"{ctx}: завершилось ошибкой")
+        return False
 
     def __copy_last_backup(self, instance: EtalonInstance):
         """
@@ -258,83 +469,106 @@ class EtalonUpdate(BaseOperation):
 
     def __check_free_space(self, host: Host) -> bool:
         """
-        Проверяет, что на хосте достаточно свободного места для загрузки образов. Предварительно
-        создает задачу на выполнение команды df -m /var/lib/docker и парсит результат stdout команды.
+        Проверяет, что на хосте достаточно свободного места для загрузки образов. Выполняет
+        команду df -m /var/lib/docker и парсит результат stdout команды.
         """
-        df_command = ExecuteCommand.objects.create(
+        df_command = ExecuteCommand.run_inline(
+            host,
             created_by=self.created_by,
             protocol='ssh',
             command=['df -m /var/lib/docker'],
             sudo=True
         )
-        df_command.hosts.add(host)
 
-        if not self.__wait_operation(df_command, f"[{host.ip}] проверка свободного места"):
+        if not self.__check_operation(df_command, f"[{host.ip}] проверка свободного места"):
             return False
         try:
             free_space_mb = int(list(df_command.stdout.values())[-1].splitlines()[1].split()[3])
-            self.add_log(f"[{host.ip}] свободного места в /var/lib/docker: {free_space_mb} MB")
+            self.add_log(f"[{host.ip}] свободного места в /var/lib/docker: {free_space_mb} MB", host=host)
         except Exception as e:
-            self.add_log(f"[{host.ip}] не удалось определить свободное место: {e}")
+            self.add_log(f"[{host.ip}] не удалось определить свободное место: {e}", host=host)
             return False
         
         if free_space_mb < settings.ETALON_UPDATE_MIN_FREE_SPACE_MB:
-            self.add_log(f"[{host.ip}] недостаточно свободного места на хосте: {free_space_mb} MB")
+            self.add_log(f"[{host.ip}] недостаточно свободного места на хосте: {free_space_mb} MB", host=host)
             return False
         return True
 
     def __send_file_to_host(self, host: Host) -> bool:
         """
-        Создает задачу на отправку файла обновления на указанный хост.
+        Отправляет файл обновления на указанный хост. Если архив с той же контрольной суммой
+        уже есть на хосте, повторная отправка не выполняется.
         """
-        send_file = SendFile.objects.create(
+        if not self.update_file.sha256:
+            self.update_file.set_checksum()
+        send_file = SendFile.run_inline(
+            host,
             created_by=self.created_by,
             protocol='sftp',
             local_path=self.update_file.file.path,
-            target_path='/tmp/update_jetalon.tar.gz'
+            target_path=self.update_file.remote_path,
+            checksum=self.update_file.sha256
+        )
+        return self.__check_operation(send_file, f"[{host.ip}] отправка файла")
+
+    def __remove_old_archives(self, host: Host) -> None:
+        """
+        Удаляет с хоста архивы предыдущих обновлений, оставляя архив текущего: на хосте хранится
+        не более одного архива. Ошибка удаления не влияет на результат обновления.
+        """
+        name = os.path.basename(self.update_file.remote_path)
+        execute_command = ExecuteCommand.run_inline(
+            host,
+            created_by=self.created_by,
+            protocol='ssh',
+            command=[f'find /tmp -maxdepth 1 -type f -name "update_jetalon_*.tar.gz" ! -name "{name}" -delete'],
+            sudo=True
         )
-        send_file.hosts.add(host)
-        return self.__wait_operation(send_file, f"[{host.ip}] отправка файла")
+        self.__check_operation(execute_command, f"[{host.ip}] удаление архивов предыдущих обновлений")
 
-    def __process_update(self, instance: EtalonInstance) -> bool:
+    def __prepare_update(self, instance: EtalonInstance) -> bool:
         """
-        Создает задачу на выполнение команд по обновлению площадки Эталона.
-        Распаковывает архив обновления, запускает скрипт prepare_update.sh и перезапускает контейнеры Docker.
+        Распаковывает архив обновления в каталог площадки и запускает скрипт prepare_update.sh.
         """
-        fp = "/tmp/update_jetalon.tar.gz"
+        fp = self.update_file.remote_path
         path = instance.path_to_instance
-        execute_command = ExecuteCommand.objects.create(
+        execute_command = ExecuteCommand.run_inline(
+            instance.host,
             created_by=self.created_by,
             protocol='ssh',
             command=[
                 f'tar -xzf {fp} -C {path}',
                 f'cd {path} && ./prepare_update.sh',
-                f'cd {path} && {instance.docker_command} up -d'
             ],
             sudo=True
         )
-        execute_command.hosts.add(instance.host)
+        return self.__check_operation(execute_command, f"[{instance.stand}] подготовка обновления")
 
-        return self.__wait_operation(execute_command, f"[{instance.stand}] выполнение команд обновления")
+    def __restart_instance(self, instance: EtalonInstance) -> bool:
+        """
+        Перезапускает контейнеры Docker площадки.
+        """
+        path = instance.path_to_instance
+        execute_command = ExecuteCommand.run_inline(
+            instance.host,
+            created_by=self.created_by,
+            protocol='ssh',
+            command=[f'cd {path} && {instance.docker_command} up -d'],
+            sudo=True
+        )
+        return self.__check_operation(execute_command, f"[{instance.stand}] перезапуск площадки")
     
-    def __check_health(self, instance: EtalonInstance, ctx: str) -> bool:
+    def __check_health(self, instance: EtalonInstance, ctx: str, checker: HealthChecker) -> bool:
         """
-        Проверяет здоровье площадки Эталона, опрашивая эндпоинт /csp/sou/rest/dev/main/actuator/health
+        Проверяет здоровье площадки Эталона, опрашивая эндпоинт health
         до тех пор, пока не получит статус "UP" или не истечет таймаут.
         """
-        url = urljoin(instance.url, "/csp/sou/rest/dev/main/actuator/health")
-        started = datetime.now()
-        while True:
-            try:
-                response = requests.get(url, timeout=15)
-                response.raise_for_status()
-                if response.json().get("status") != "UP":
-                    raise UnhealthException("Статус площадки отличен от UP")
-                self.add_log(f"{ctx}: успешно")
-                return True
-            except Exception as e:
-                if (datetime.now() - started).seconds > settings.ETALON_UPDATE_OPERATION_TIMEOUT:
-                    self.add_log(f"{ctx}: завершилось по таймауту")
-                    return False
-                self.add_log(f"{ctx}: {e}. Следующая попытка через {settings.ETALON_UPDATE_OPERATION_WAIT_INTERVAL}")
-                time.sleep(settings.ETALON_UPDATE_OPERATION_WAIT_INTERVAL)
\ No newline at end of file
+        def on_retry(result: HealthResult, delay: float) -> None:
+            self.add_log(f"{ctx}: {result.error}. Следующая попытка через {delay:.0f}")
+
+        result = checker.wait_healthy(instance, settings.ETALON_UPDATE_OPERATION_TIMEOUT, on_retry)
+        if result.healthy:
+            self.add_log(f"{ctx}: успешно")
+            return True
+        self.add_log(f"{ctx}: завершилось по таймауту")
+        return False
\ No newline at end of file
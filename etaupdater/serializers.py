@@ -1,6 +1,8 @@
 from rest_framework import serializers
 
-from ops.serializers import BaseOperationSerializer
+from django.core.files import File
+
+from ops.serializers import BaseOperationSerializer, ChunkedUploadField
 from core.serializers import UserShortSerializer
 from .models import EtalonInstance, UpdateFile, EtalonUpdate
 
@@ -34,21 +36,42 @@ class EtalonInstancesSerializer(serializers.ModelSerializer):
 class UpdateFileSerializer(serializers.ModelSerializer):
     loaded_by = UserShortSerializer(read_only=True)
     created_at = serializers.DateTimeField(format='%d.%m.%Y %H:%M:%S', read_only=True)
+    upload = ChunkedUploadField()
     class Meta:
         model = UpdateFile
         fields = [
             'id',
             'file',
+            'upload',
             'version',
             'tag',
+            'sha256',
+            'status',
+            'error',
+            'manifest',
             'loaded_by',
             'created_at'
         ]
+        extra_kwargs = {'file': {'required': False}}
+
+    def validate_upload(self, value):
+        for validator in UpdateFile._meta.get_field('file').validators:
+            validator(File(None, name=value.filename))
+        return value
+
+    def validate(self, attrs):
+        if bool(attrs.get('file')) == bool(attrs.get('upload')):
+            raise serializers.ValidationError('Необходимо передать либо файл, либо завершенную загрузку upload.')
+        return super().validate(attrs)
 
     def create(self, validated_data):
         request = self.context.get('request')
         if request and hasattr(request, 'user'):
             validated_data['loaded_by'] = request.user
+        upload = validated_data.pop('upload', None)
+        if upload:
+            validated_data['file'] = upload.store(
+                UpdateFile._meta.get_field('file'), UpdateFile.unique_name(upload.filename))
         return super().create(validated_data)
 
 class EtalonInstanceShortSerializer(serializers.ModelSerializer):
@@ -76,10 +99,22 @@ class EtalonUpdateSerializer(BaseOperationSerializer):
     update_file_display = UpdateFileShortSerializer(read_only=True, source='update_file')
     class Meta:
         model = EtalonUpdate
-        fields = BaseOperationSerializer.Meta.fields + ['instances', 'update_file', 'instances_display', 'update_file_display']
+        fields = BaseOperationSerializer.Meta.fields + ['instances', 'update_file', 'distribution', 'max_parallel_instances', 'instances_display', 'update_file_display']
+
+    def validate_update_file(self, value):
+        if value.status != 'ready':
+            raise serializers.ValidationError('Файл обновления еще не проверен или не прошел проверку.')
+        return value
 
     def to_representation(self, instance):
         rep = super().to_representation(instance)
         rep['instances'] = rep.pop('instances_display', [])
         rep['update_file'] = rep.pop('update_file_display', None)
-        return rep
\ No newline at end of file
+        return rep
+
+class EtalonUpdateListSerializer(EtalonUpdateSerializer):
+    """
+    Обновление в списке: без лога, он возвращается только детальным представлением.
+    """
+    class Meta(EtalonUpdateSerializer.Meta):
+        fields = [field for field in EtalonUpdateSerializer.Meta.fields if field != 'log']
@@ -2,7 +2,7 @@ from django.dispatch import receiver
 from django.db.models.signals import post_save, m2m_changed
 
 from .models import EtalonInstance, UpdateFile, EtalonUpdate
-from .tasks import check_execute_command, run_etalon_update
+from .tasks import apply_etalon_instance_params, process_update_file, run_etalon_update
 
 
 @receiver(post_save, sender=EtalonInstance)
@@ -14,22 +14,19 @@ def etalon_instance_post_save(sender, instance: EtalonInstance, created, **kwarg
     _ = sender, kwargs
     if not created:
         return
-    execute_command = instance.create_execute_command()
-
-    check_execute_command.apply_async(
-        args=[execute_command.id, instance.id], countdown=10)
+    instance.create_execute_command(callback=apply_etalon_instance_params.s(instance.id))
 
 
 @receiver(post_save, sender=UpdateFile)
 def update_file_post_save(sender, instance: UpdateFile, created, **kwargs):
     """
-    При создании нового файла обновления парсим его и валидируем.
+    При создании нового файла обновления запускаем его проверку и разбор в фоне.
     """
     _ = sender, kwargs
     if not created:
         return
 
-    instance.set_version()
+    process_update_file.delay(instance.id)
 
 @receiver(m2m_changed, sender=EtalonUpdate.instances.through)
 def etalon_update_post_save(sender, instance: EtalonUpdate, action, **kwargs):
@@ -39,6 +36,6 @@ def etalon_update_post_save(sender, instance: EtalonUpdate, action, **kwargs):
     т.к. площадки связанные ManyToMany добавляются позже чем сам объект.
     """
     _ = sender, kwargs
-    if action != "post_add" or instance.log:
+    if action != "post_add" or instance.status != 'queue':
         return
     run_etalon_update.delay(instance.id)
\ No newline at end of file
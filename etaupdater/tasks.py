@@ -1,48 +1,70 @@
 import uuid
 from celery import shared_task, chord, group
-from celery.exceptions import MaxRetriesExceededError
 
 from core.models import Host
 from ops.models import ExecuteCommand
-from .models import EtalonInstance, EtalonUpdate
+from .health import HealthChecker, store_health
+from .models import EtalonInstance, EtalonUpdate, UpdateFile
 
 
-@shared_task(bind=True, max_retries=3)
-def check_execute_command(self, execute_command_id: uuid, etalon_instance_id: int):
+@shared_task
+def apply_etalon_instance_params(execute_command_id: uuid, etalon_instance_id: int):
     """
-    Проверка выполнения операции получения данных о площадке при создании EtalonInstance.
+    Разбор результата операции получения данных о площадке (cat .env).
+    Вызывается операцией сразу после ее завершения (ExecuteCommand.callback).
     """
     execute_command = ExecuteCommand.objects.get(id=execute_command_id)
     etalon_instance = EtalonInstance.objects.get(id=etalon_instance_id)
-    try:
-        if execute_command.status not in ('completed', 'error'):
-            raise self.retry(exc=Exception(
-                'Имеются не завершенные задачи.'), countdown=10)
+    stdout = list(execute_command.stdout.values())
 
-        if not len(execute_command.stdout.values()):
-            etalon_instance.is_valid = False
-            return
+    if execute_command.status != 'completed' or not stdout:
+        etalon_instance.is_valid = False
+        etalon_instance.save(update_fields=['is_valid', 'updated_at'])
+        return
 
-        etalon_instance.apply_params(list(execute_command.stdout.values())[-1])
+    etalon_instance.apply_params(stdout[-1])
 
-    except MaxRetriesExceededError:
-        etalon_instance.is_valid = False
+@shared_task
+def discover_etalon_instances(etalon_instance_ids: list[int] | None = None) -> dict:
+    """
+    Обновление параметров площадок Эталона из .env файлов (по умолчанию всех площадок).
+    Запускается периодически Celery beat (CELERY_BEAT_SCHEDULE).
+    """
+    instances = EtalonInstance.objects.all()
+    if etalon_instance_ids is not None:
+        instances = instances.filter(id__in=etalon_instance_ids)
+    return EtalonInstance.discover(instances)
 
 @shared_task
-def finalize_update(results, etalon_update_id: uuid):
+def refresh_etalon_health() -> dict:
+    """
+    Проверка здоровья всех площадок Эталона и сохранение результатов в кэш (etaupdater.health.store_health).
+    Запускается периодически Celery beat (CELERY_BEAT_SCHEDULE).
+    """
+    instances = list(EtalonInstance.objects.only('id', 'url', 'stand'))
+    with HealthChecker() as checker:
+        results = checker.check(instances)
+    store_health(instances, results)
+    return {'instances': len(results), 'healthy': sum(result.healthy for result in results)}
+
+@shared_task
+def process_update_file(update_file_id: int):
+    """
+    Проверка загруженного файла обновления, выполняется вне запроса загрузки.
+    """
+    UpdateFile.objects.get(id=update_file_id).process()
+
+@shared_task
+def finalize_update(results, etalon_update_id: uuid, db_queries: int = 0):
     """
     Завершение обновления, анализ результатов.
     Если хотя бы на одном хосте была ошибка, то считаем что обновление завершилось с ошибкой.
+    Запросы к БД хостов и запуска обновления (db_queries) добавляются к db_queries вместе со сменой статуса.
     """
     etalon_update = EtalonUpdate.objects.get(id=etalon_update_id)
-    if False in results:
-        etalon_update.status = "error"
-        etalon_update.save(update_fields=["status"])
-        etalon_update.add_log("Обновление завершилось с ошибками.")
-        return
-    etalon_update.status = "completed"
-    etalon_update.save(update_fields=["status"])
-    etalon_update.add_log("Обновление успешно выполнено.")
+    etalon_update.count_queries(db_queries + sum(result['db_queries'] for result in results))
+    success = False not in [result['result'] for result in results]
+    etalon_update.finish(success, "Обновление успешно выполнено." if success else "Обновление завершилось с ошибками.")
 
 @shared_task
 def run_etalon_update(etalon_update_id: uuid):
@@ -51,23 +73,31 @@ def run_etalon_update(etalon_update_id: uuid):
     Создаём по одному подпроцессу на каждый уникальный хост.
     """
     etalon_update = EtalonUpdate.objects.get(id=etalon_update_id)
-    etalon_update.status = 'progress'
-    etalon_update.save(update_fields=['status'])
-    etalon_update.add_log("Начинается обновление")
+    with etalon_update.track_queries():
+        if not etalon_update.start("Начинается обновление"):
+            return
+
+        hosts = list(Host.objects.filter(id__in=etalon_update.instances.values_list('host_id', flat=True).distinct()))
 
-    hosts = Host.objects.filter(id__in=etalon_update.instances.values_list('host_id', flat=True).distinct())
+        # при раздаче через хосты архив заранее доставляется на все хосты, а на этапе обновления хоста
+        # проверяется его контрольная сумма (при несовпадении архив отправляется напрямую)
+        if etalon_update.distribution == 'relay':
+            etalon_update.distribute_update_file(hosts)
 
     # создаем группу задач для каждого хоста, 1 воркер 1 хост
     subtasks = group(
         run_host_update.s(etalon_update_id, host.id) for host in hosts
     )
     # создаем цепочку, которая после завершения всех задач вызовет finalize_update и передаст ей результаты
-    chord(subtasks)(finalize_update.s(etalon_update_id))
+    chord(subtasks)(finalize_update.s(etalon_update_id, etalon_update.pop_queries()))
 
 @shared_task
-def run_host_update(etalon_update_id: uuid, host_id: int):
+def run_host_update(etalon_update_id: uuid, host_id: int) -> dict:
     """
     Запускается параллельно по количеству уникальных хостов.
+    Число запросов к БД возвращается вместе с результатом и записывается в finalize_update.
     """
     etalon_update = EtalonUpdate.objects.get(id=etalon_update_id)
-    return etalon_update.run(host_id)
\ No newline at end of file
+    with etalon_update.track_queries():
+        result = etalon_update.run(host_id)
+    return {'result': result, 'db_queries': etalon_update.pop_queries()}
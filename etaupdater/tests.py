@@ -1,11 +1,25 @@
+import contextlib
+import hashlib
+import io
+import json
 import os
+import tarfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
 
+from django.test import TestCase, TransactionTestCase
 from django.urls import reverse
+from django.core.files.base import ContentFile
 from django.core.files.uploadedfile import SimpleUploadedFile
 
 from core.models import Host, SSHCredential
-from core.tests import BaseTestCase
-from .models import UpdateFile, EtalonInstance
+from core.tests import BaseTestCase, ListQueriesMixin
+from ops.models import ExecuteCommand, ExecuteCommandResult
+from .health import HealthChecker
+from .models import UpdateFile, EtalonInstance, EtalonUpdate
+from .tasks import apply_etalon_instance_params, refresh_etalon_health
 
 
 class EtaupdaterTestCase(BaseTestCase):
@@ -81,4 +95,355 @@ class EtaupdaterTestCase(BaseTestCase):
             "instances": [instance.id, instance_new.id],
             "update_file": update_file.id,
         })
-        self.assertEqual(response.status_code, 201)
\ No newline at end of file
+        self.assertEqual(response.status_code, 201)
+
+
+class RelayDistributionTestCase(TestCase):
+    def setUp(self):
+        self.hosts = [Host.objects.create(name=f'relay_{number}', ip=f'10.0.0.{number}', os='linux')
+                      for number in range(1, 10)]
+        update_file, = UpdateFile.objects.bulk_create([
+            UpdateFile(file='updates/update.tar.gz', version='1', tag='1', sha256='abc')])
+        self.etalon_update = EtalonUpdate.objects.create(update_file=update_file, distribution='relay')
+
+    def test_fan_out_tree(self):
+        relayed = []
+
+        def relay(source, target):
+            relayed.append((source.name, target.name))
+            return target.name != 'relay_4'
+
+        with self.settings(ETALON_UPDATE_RELAY_SEEDS=2), \
+                mock.patch.object(EtalonUpdate, '_EtalonUpdate__check_free_space',
+                                  side_effect=lambda host: host.name != 'relay_9') as check_free_space, \
+                mock.patch.object(EtalonUpdate, '_EtalonUpdate__send_file_to_host', return_value=True) as send, \
+                mock.patch.object(EtalonUpdate, '_EtalonUpdate__relay_update_file', side_effect=relay):
+            self.etalon_update.distribute_update_file(self.hosts)
+
+        # место проверяется на всех хостах до раздачи, хост без места в раздаче не участвует
+        self.assertEqual(check_free_space.call_count, 9)
+        # сервер отправляет архив только на два хоста, остальные получают его по цепочке
+        self.assertEqual(send.call_count, 2)
+        self.assertEqual(relayed, [
+            ('relay_1', 'relay_3'), ('relay_2', 'relay_4'),
+            ('relay_1', 'relay_5'), ('relay_2', 'relay_6'), ('relay_3', 'relay_7'),
+            ('relay_1', 'relay_8'),
+        ])
+        self.assertIn('на 7 из 9 хостов', self.etalon_update.log_entries.last().message)
+
+
+class UpdateFileProcessTestCase(TestCase):
+    @staticmethod
+    def make_archive(files: dict) -> bytes:
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode='w:gz') as archive:
+            for name, content in files.items():
+                info = tarfile.TarInfo(name)
+                info.size = len(content)
+                archive.addfile(info, io.BytesIO(content))
+        return buffer.getvalue()
+
+    def create_update_file(self, content: bytes) -> UpdateFile:
+        with mock.patch('etaupdater.signals.process_update_file.delay') as delay:
+            update_file = UpdateFile.objects.create(file=ContentFile(content, name='update.tar.gz'))
+        delay.assert_called_once_with(update_file.id)
+        self.addCleanup(os.remove, update_file.file.path)
+        self.assertEqual(update_file.status, 'processing')
+        return update_file
+
+    def test_process(self):
+        content = self.make_archive({
+            './version.env': b'BRANCH=3.1.0\nTAG=42\n',
+            './jetalon.env': b'',
+            './images.tar': b'x' * 1000,
+        })
+        update_file = self.create_update_file(content)
+        update_file.process()
+        update_file.refresh_from_db()
+
+        self.assertEqual(update_file.status, 'ready')
+        self.assertEqual((update_file.version, update_file.tag), ('3.1.0', '42'))
+        self.assertEqual(update_file.sha256, hashlib.sha256(content).hexdigest())
+        self.assertIn({'name': './images.tar', 'size': 1000}, update_file.manifest)
+
+    def test_process_invalid(self):
+        update_file = self.create_update_file(self.make_archive({
+            './version.env': b'BRANCH=3.1.0\nTAG=42\n',
+            './jetalon.env': b'',
+            './stand.env': b'',
+        }))
+        update_file.process()
+        update_file.refresh_from_db()
+
+        self.assertEqual(update_file.status, 'invalid')
+        self.assertEqual(update_file.error, 'Файл stand.env не должен присутствовать в архиве.')
+
+
+class DiscoveryTestCase(TestCase):
+    def test_discover(self):
+        host, unreachable = (Host.objects.create(name=name, ip='127.0.0.1', os='linux')
+                             for name in ('discovery_host', 'unreachable_host'))
+        with mock.patch('ops.signals.run_operation.delay'):
+            valid, invalid, skipped = (
+                EtalonInstance.objects.create(path_to_instance=path, host=instance_host)
+                for path, instance_host in (('/opt/one', host), ('/opt/two', host), ('/opt/one', unreachable)))
+        env = 'STAND=one\nBRANCH=3.1\nTAG=10\nEXTERNAL_HOST_ADDRESS=https://one.example'
+
+        def read_env_files(instances):
+            if instances[0].host == unreachable:
+                return None
+            return {valid.id: env}
+
+        with mock.patch.object(EtalonInstance, 'read_env_files', side_effect=read_env_files), \
+                self.assertNumQueries(3):
+            result = EtalonInstance.discover(EtalonInstance.objects.all())
+
+        self.assertEqual(result, {'hosts': 2, 'unreachable_hosts': 1, 'updated': 2, 'valid': 1})
+        valid.refresh_from_db()
+        self.assertEqual((valid.stand, valid.version, valid.tag, valid.is_valid), ('one', '3.1', '10', True))
+        self.assertFalse(EtalonInstance.objects.get(id=invalid.id).is_valid)
+        self.assertEqual(EtalonInstance.objects.get(id=skipped.id).updated_at, skipped.updated_at)
+
+    def test_read_env_files_unreachable(self):
+        host = Host.objects.create(name='unreachable_host', ip='127.0.0.1', os='linux')
+        credential = SSHCredential(username='user')
+        credential.set_password('password')
+        credential.save()
+        credential.host.add(host)
+        with mock.patch('ops.signals.run_operation.delay'):
+            instance = EtalonInstance.objects.create(path_to_instance='/opt/one', host=host)
+
+        with mock.patch('etaupdater.models.ssh_pool.connection', side_effect=OSError('connection refused')), \
+                self.assertLogs('etaupdater.models', level='WARNING') as logs:
+            self.assertIsNone(EtalonInstance.read_env_files([instance]))
+        self.assertIn('unreachable_host (127.0.0.1): connection refused', logs.output[0])
+
+
+class ApplyParamsCallbackTestCase(TestCase):
+    def setUp(self):
+        self.host = Host.objects.create(name='callback_host', ip='127.0.0.1', os='linux')
+        with mock.patch('ops.signals.run_operation.delay'):
+            self.instance = EtalonInstance.objects.create(path_to_instance='/opt/jetalon', host=self.host)
+        self.execute_command = ExecuteCommand.objects.get()
+
+    def test_callback_on_finish(self):
+        ExecuteCommandResult.objects.create(
+            operation=self.execute_command, host=self.host, command_index=0, exit_code=0,
+            stdout='STAND=one\nBRANCH=3.1\nTAG=10\nEXTERNAL_HOST_ADDRESS=https://one.example')
+        with mock.patch('celery.canvas.Signature.apply_async') as apply_async:
+            self.execute_command.finish(True)
+        apply_async.assert_called_once_with((self.execute_command.id,), {})
+        self.assertEqual(self.execute_command.callback['args'], [self.instance.id])
+
+        apply_etalon_instance_params(self.execute_command.id, self.instance.id)
+        self.instance.refresh_from_db()
+        self.assertEqual((self.instance.stand, self.instance.is_valid), ('one', True))
+
+    def test_failed_operation_marks_instance_invalid(self):
+        EtalonInstance.objects.filter(id=self.instance.id).update(is_valid=True)
+        with mock.patch('celery.canvas.Signature.apply_async'):
+            self.execute_command.finish(False)
+
+        apply_etalon_instance_params(self.execute_command.id, self.instance.id)
+        self.assertFalse(EtalonInstance.objects.get(id=self.instance.id).is_valid)
+
+
+class ParallelInstancesTestCase(TransactionTestCase):
+    def test_parallel_instances(self):
+        host = Host.objects.create(name='parallel_host', ip='127.0.0.1', os='linux')
+        with mock.patch('ops.signals.run_operation.delay'):
+            instances = [EtalonInstance.objects.create(path_to_instance=f'/opt/stand{number}', host=host)
+                         for number in range(4)]
+        EtalonInstance.objects.update(is_valid=True, version='3.0')
+        update_file, = UpdateFile.objects.bulk_create([
+            UpdateFile(file='updates/update.tar.gz', version='3.1', tag='1', sha256='abc', status='ready')])
+        etalon_update = EtalonUpdate.objects.create(update_file=update_file, max_parallel_instances=3)
+        etalon_update.instances.through.objects.bulk_create([
+            etalon_update.instances.through(etalonupdate_id=etalon_update.id, etaloninstance_id=instance.id)
+            for instance in instances])
+
+        preparing, max_preparing, lock = 0, 0, threading.Lock()
+
+        def prepare(instance):
+            nonlocal preparing, max_preparing
+            with lock:
+                preparing += 1
+                max_preparing = max(max_preparing, preparing)
+            time.sleep(0.05)
+            with lock:
+                preparing -= 1
+            return True
+
+        checkers = set()
+
+        def health(instance, ctx, checker):
+            checkers.add(checker)
+            time.sleep(0.2)
+            return True
+
+        private = 'etaupdater.models.EtalonUpdate._EtalonUpdate__'
+        with mock.patch(f'{private}check_free_space', return_value=True), \
+                mock.patch(f'{private}send_file_to_host', return_value=True), \
+                mock.patch(f'{private}copy_last_backup'), \
+                mock.patch(f'{private}check_health', side_effect=health), \
+                mock.patch(f'{private}prepare_update', side_effect=prepare), \
+                mock.patch(f'{private}restart_instance', side_effect=lambda instance: instance != instances[0]), \
+                mock.patch(f'{private}remove_old_archives') as remove_old_archives:
+            started = time.monotonic()
+            self.assertFalse(etalon_update.run(host.id))
+
+        # 4 площадки по 0.4 с проверок здоровья при 3 одновременных обновлениях
+        self.assertLess(time.monotonic() - started, 4 * 0.4)
+        self.assertEqual(max_preparing, 1)
+        # все площадки хоста проверяются одним HealthChecker
+        self.assertEqual(len(checkers), 1)
+        remove_old_archives.assert_called_once_with(host)
+        # ошибка первой площадки не прерывает обновление остальных
+        self.assertEqual(list(EtalonInstance.objects.order_by('id').values_list('version', flat=True)),
+                         ['3.0', '3.1', '3.1', '3.1'])
+
+
+class FakeRedis:
+    """
+    Хранилище в памяти с подмножеством команд Redis, используемых кэшем состояния площадок.
+    """
+    def __init__(self):
+        self.data = {}
+
+    def pipeline(self):
+        return contextlib.nullcontext(self)
+
+    def execute(self):
+        pass
+
+    def close(self):
+        pass
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+    def expire(self, key, ttl):
+        pass
+
+    def hset(self, key, mapping):
+        self.data.setdefault(key, {}).update(mapping)
+
+    def hgetall(self, key):
+        return self.data.get(key, {})
+
+    def lpush(self, key, value):
+        self.data.setdefault(key, []).insert(0, value)
+
+    def ltrim(self, key, start, end):
+        self.data[key] = self.data[key][start:end + 1]
+
+    def lrange(self, key, start, end):
+        return self.data.get(key, [])[start:None if end == -1 else end + 1]
+
+
+class HealthCheckTestCase(BaseTestCase):
+    def start_server(self, statuses: list[str]) -> str:
+        """
+        Локальная площадка: отвечает статусами statuses по очереди, последний повторяется,
+        каждый ответ задерживается на 0.2 с.
+        """
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                time.sleep(0.2)
+                body = json.dumps({'status': statuses.pop(0) if len(statuses) > 1 else statuses[0]}).encode()
+                self.send_response(200)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return f'http://127.0.0.1:{server.server_port}'
+
+    def create_instance(self, url: str) -> EtalonInstance:
+        with mock.patch('ops.signals.run_operation.delay'):
+            instance = EtalonInstance.objects.create(path_to_instance='/opt/jetalon', host=self.host)
+        EtalonInstance.objects.filter(id=instance.id).update(url=url, stand=url)
+        instance.url = url
+        return instance
+
+    def setUp(self):
+        super().setUp()
+        self.host = Host.objects.create(name='health_host', ip='127.0.0.1', os='linux')
+
+    def test_health_endpoint(self):
+        up, down = self.start_server(['UP']), self.start_server(['DOWN'])
+        instances = [self.create_instance(up) for _ in range(5)] + [self.create_instance(down),
+                                                                   self.create_instance('')]
+        fake_redis = FakeRedis()
+        with mock.patch('etaupdater.health.get_redis', return_value=fake_redis):
+            started = time.monotonic()
+            self.assertEqual(refresh_etalon_health(), {'instances': 7, 'healthy': 5})
+            # площадки проверяются одновременно, а не по 0.2 с каждая
+            self.assertLess(time.monotonic() - started, 0.2 * 3)
+            refresh_etalon_health()
+
+            # площадки не проверяются и не читаются из БД, запросы только аутентификации
+            with self.assertNumQueries(2):
+                response = self.client.get(reverse('etalon-instance-health'))
+                history = self.client.get(reverse('etalon-instance-health-history', args=[instances[5].id]))
+
+        self.assertEqual(response.status_code, 200)
+        results = {result['instance_id']: result for result in response.data}
+        self.assertEqual(len(results), len(instances))
+        self.assertEqual(sum(result['healthy'] for result in results.values()), 5)
+        self.assertEqual((results[instances[5].id]['status'], results[instances[5].id]['stand']), ('DOWN', down))
+        self.assertEqual(results[instances[6].id]['error'], 'URL площадки не определен')
+        self.assertEqual([entry['status'] for entry in history.data], ['DOWN', 'DOWN'])
+
+    def test_health_endpoint_without_cache(self):
+        with mock.patch('etaupdater.health.get_redis', return_value=None):
+            response = self.client.get(reverse('etalon-instance-health'))
+        self.assertEqual(response.status_code, 503)
+
+    def test_wait_healthy_backoff(self):
+        instance = self.create_instance(self.start_server(['DOWN', 'DOWN', 'UP']))
+        retries = []
+        with HealthChecker(backoff=0.1, max_backoff=0.15) as checker:
+            result = checker.wait_healthy(instance, 10, lambda result, delay: retries.append(delay))
+        self.assertTrue(result.healthy)
+        self.assertEqual(retries, [0.1, 0.15])
+
+
+class EtaupdaterListQueriesTestCase(ListQueriesMixin, BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.host = Host.objects.create(name='list_host', ip='127.0.0.1', os='linux')
+        # bulk_create не отправляет post_save: площадки и файлы не проверяются в фоне
+        self.update_file, = UpdateFile.objects.bulk_create([UpdateFile(file='updates/list.tar.gz', loaded_by=self.user)])
+
+    def create_instances(self, numbers):
+        return EtalonInstance.objects.bulk_create([
+            EtalonInstance(path_to_instance=f'/opt/stand{number}', host=self.host, created_by=self.user)
+            for number in numbers])
+
+    def test_etalon_instance_list(self):
+        # аутентификация, COUNT(*), страница площадок с пользователями
+        self.assertListQueries(reverse('etalon-instance-list'), self.create_instances, 3)
+
+    def test_update_file_list(self):
+        def create(numbers):
+            UpdateFile.objects.bulk_create([UpdateFile(file=f'updates/{number}.tar.gz', loaded_by=self.user)
+                                            for number in numbers])
+        self.assertListQueries(reverse('update-file-list'), create, 3)
+
+    def test_etalon_update_list(self):
+        def create(numbers):
+            instances = self.create_instances(numbers)
+            for etalon_update in EtalonUpdate.objects.bulk_create(
+                    [EtalonUpdate(update_file=self.update_file, created_by=self.user) for _ in numbers]):
+                etalon_update.instances.through.objects.bulk_create([
+                    etalon_update.instances.through(etalonupdate_id=etalon_update.id, etaloninstance_id=instance.id)
+                    for instance in instances])
+        # аутентификация, COUNT(*), страница обновлений с пользователями и файлами, площадки
+        self.assertListQueries(reverse('etalon-update-list'), create, 4)
@@ -1,7 +1,10 @@
+import hashlib
 import tarfile
 from django.core.validators import RegexValidator
 from django.core.exceptions import ValidationError
 
+from ops.ssh import HASH_CHUNK_SIZE
+
 path_validator = RegexValidator(
     regex=r'^(/[a-zA-Z0-9._\-/]+)$',
     message='Путь должен начинаться с / и содержать только буквы, цифры, точки, подчеркивания, дефисы и слеши.',
@@ -9,30 +12,64 @@ path_validator = RegexValidator(
 )
 
 
-def update_file_validator(file):
+class HashingReader:
+    """
+    Обертка над файлом, вычисляющая SHA-256 всех прочитанных из него байт.
+    """
+
+    def __init__(self, file):
+        self.file = file
+        self.digest = hashlib.sha256()
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.file.read(size)
+        self.digest.update(data)
+        return data
+
+
+def inspect_update_archive(file) -> dict:
     """
-    Валидатор файла обновления Эталона. 
-    Проверяет, что в архиве присутствуют файлы version.env и jetalon.env - означает, что это корректный файл обновления.
-    Проверяет, что в архиве отсутствует файл stand.env - проврека на возможную ошибку использования файла install_jetalon.tar.gz вместо update_jetalon.tar.gz.
+    Проверяет архив обновления Эталона за один потоковый проход по файлу:
+    в архиве должны присутствовать файлы version.env и jetalon.env - означает, что это корректный файл обновления,
+    и отсутствовать файл stand.env - проверка на возможную ошибку использования файла install_jetalon.tar.gz
+    вместо update_jetalon.tar.gz. Попутно извлекается содержимое version.env и вычисляется SHA-256 файла.
+    Возвращает {'version_env': str, 'sha256': str, 'members': [{'name': str, 'size': int}, ...]}.
     """
-    check_result = 0
     targets = ("./version.env", "./jetalon.env")
-    
+    reader = HashingReader(file)
+    members, version_env = [], None
+
     try:
-        with tarfile.open(fileobj=file, mode='r:gz') as archive:
-            members = archive.getmembers()
-            for member in members:
+        with tarfile.open(fileobj=reader, mode='r|gz') as archive:
+            for member in archive:
                 if member.path == "./stand.env":
                     raise ValidationError(
                         'Файл stand.env не должен присутствовать в архиве.')
-                if member.path in targets:
-                    check_result += 1
+                if member.path == "./version.env":
+                    version_env = archive.extractfile(member).read().decode('utf-8')
+                members.append({'name': member.path, 'size': member.size})
+        # Дочитываем выравнивание после конца архива, чтобы контрольная сумма покрывала весь файл
+        while reader.read(HASH_CHUNK_SIZE):
+            pass
+    except ValidationError:
+        raise
     except (tarfile.ReadError, tarfile.CompressionError, EOFError) as e:
         raise ValidationError(
             'Загруженный файл не является корректным tar.gz архивом.')
     except Exception as e:
         raise ValidationError(
             'Ошибка при обработке файла архива.')
-    
-    if check_result != len(targets):
+
+    names = {member['name'] for member in members}
+    if not all(target in names for target in targets):
         raise ValidationError('Файл обновления не прошел валидацию.')
+
+    return {'version_env': version_env, 'sha256': reader.digest.hexdigest(), 'members': members}
+
+
+def update_file_validator(file):
+    """
+    Валидатор файла обновления Эталона (см. inspect_update_archive).
+    Файл обновления проверяется фоновой задачей после загрузки, валидатор сохранен для старых миграций.
+    """
+    inspect_update_archive(file)
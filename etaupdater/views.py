@@ -2,31 +2,51 @@ from rest_framework import viewsets, mixins, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
-from core.views import CorePageNumberPagination
+from core.views import CorePageNumberPagination, KeysetPagination
+from .filters import EtalonInstanceFilter, EtalonUpdateFilter
+from .health import load_health, load_health_history
 from .models import EtalonInstance, UpdateFile, EtalonUpdate
-from .serializers import EtalonInstancesSerializer, UpdateFileSerializer, EtalonUpdateSerializer
-from .tasks import check_execute_command
+from .serializers import EtalonInstancesSerializer, UpdateFileSerializer, EtalonUpdateListSerializer, EtalonUpdateSerializer
+from .tasks import apply_etalon_instance_params
 
 
 class EtalonInstanceViewSet(viewsets.ModelViewSet):
-    queryset = EtalonInstance.objects.all().order_by('-created_at')
+    queryset = EtalonInstance.objects.select_related('created_by').order_by('-created_at')
     serializer_class = EtalonInstancesSerializer
     pagination_class = CorePageNumberPagination
+    filterset_class = EtalonInstanceFilter
 
     @action(methods=["GET"], detail=True)
     def check(self, request, pk=None):
         instance = self.get_object()
-        execute_command = instance.create_execute_command()
-        check_execute_command.apply_async(args=[execute_command.id, instance.id], countdown=10)
+        instance.create_execute_command(callback=apply_etalon_instance_params.s(instance.id))
         return Response(status=status.HTTP_200_OK)
 
+    @action(methods=["GET"], detail=False)
+    def health(self, request):
+        """
+        Состояние всех площадок из кэша, который обновляет задача refresh_etalon_health.
+        """
+        return self.cached_health_response(load_health())
+
+    @action(methods=["GET"], detail=True, url_path='health-history')
+    def health_history(self, request, pk=None):
+        return self.cached_health_response(load_health_history(pk))
+
+    @staticmethod
+    def cached_health_response(entries: list[dict] | None) -> Response:
+        if entries is None:
+            return Response({'detail': 'Кэш состояния площадок недоступен.'},
+                            status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return Response(entries)
+
 
 class UpdateFileViewSet(mixins.CreateModelMixin,
                         mixins.RetrieveModelMixin,
                         mixins.DestroyModelMixin,
                         mixins.ListModelMixin,
                         viewsets.GenericViewSet):
-    queryset = UpdateFile.objects.all()
+    queryset = UpdateFile.objects.select_related('loaded_by')
     serializer_class = UpdateFileSerializer
     pagination_class = CorePageNumberPagination
 
@@ -35,6 +55,18 @@ class EtalonUpdateViewSet(mixins.CreateModelMixin,
                         mixins.DestroyModelMixin,
                         mixins.ListModelMixin,
                         viewsets.GenericViewSet):
-    queryset = EtalonUpdate.objects.prefetch_related('instances', 'update_file').order_by('-created_at')
+    queryset = EtalonUpdate.objects.prefetch_related('instances', 'update_file', 'log_entries').order_by('-created_at')
     serializer_class = EtalonUpdateSerializer
-    pagination_class = CorePageNumberPagination
\ No newline at end of file
+    pagination_class = KeysetPagination
+    filterset_class = EtalonUpdateFilter
+
+    def get_queryset(self):
+        if self.action == 'list':
+            # Лог в списке не выводится
+            return EtalonUpdate.objects.select_related('created_by', 'update_file').prefetch_related('instances').defer('callback')
+        return super().get_queryset()
+
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return EtalonUpdateListSerializer
+        return super().get_serializer_class()
\ No newline at end of file
@@ -0,0 +1,150 @@
+import asyncio
+import time
+
+import asyncssh
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import connections
+from django.utils import timezone
+
+from core.credentials import CredentialResolver
+from core.models import Host, SSHCredential
+from .metrics import QueryCounter
+from .models import ExecuteCommand, ExecuteCommandResult, OperationLogEntry
+
+
+def asyncssh_connect_params(connect_params: dict) -> dict:
+    """
+    Преобразует параметры подключения paramiko (SSHCredential.create_connect_params) в параметры asyncssh.
+    """
+    params = {
+        'host': connect_params['hostname'],
+        'port': connect_params['port'],
+        'username': connect_params['username'],
+        'connect_timeout': connect_params.get('timeout'),
+        'known_hosts': None,
+    }
+    if 'key_filename' in connect_params:
+        params['client_keys'] = [connect_params['key_filename']]
+        params['passphrase'] = connect_params.get('passphrase')
+        params['password'] = None
+    else:
+        params['password'] = connect_params['password']
+        params['client_keys'] = None
+    return params
+
+
+class AsyncSSHEngine:
+    """
+    Выполняет ExecuteCommand по SSH на всех хостах операции внутри одного воркера:
+    хосты обрабатываются в одном цикле событий asyncio, одновременно не более concurrency
+    соединений. Результаты и записи лога копятся в очереди и пишутся в БД пачками
+    по batch_size строк или раз в flush_interval секунд.
+    Поддерживается только протокол SSH; команды одного хоста выполняются последовательно,
+    операции с parallel не выполняются.
+    """
+
+    def __init__(self, operation: ExecuteCommand, concurrency: int | None = None,
+                 batch_size: int | None = None, flush_interval: float | None = None):
+        self.operation = operation
+        self.concurrency = concurrency or settings.OPS_ASYNC_CONCURRENCY
+        self.batch_size = batch_size or settings.OPS_ASYNC_BATCH_SIZE
+        self.flush_interval = flush_interval or settings.OPS_ASYNC_FLUSH_INTERVAL
+        self.content_type = ContentType.objects.get_for_model(operation)
+        # Запросы записи пачек выполняются в отдельном потоке и учитываются отдельно
+        self.queries = QueryCounter()
+
+    def run(self) -> list[bool]:
+        """
+        Возвращает список результатов по хостам, как результаты операции на хостах (run).
+        """
+        if self.operation.parallel:
+            self.operation.add_log('Движок asyncio не поддерживает параллельное выполнение команд хоста.',
+                                   level='error')
+            return [False]
+        hosts = list(self.operation.hosts.all())
+        resolver = CredentialResolver.for_operation(SSHCredential, self.operation)
+        # Учетные записи определяются до запуска цикла событий: в нем обращения к БД недопустимы
+        self.credentials = {host.id: resolver.get(host.id) for host in hosts}
+        results = asyncio.run(self._run(hosts))
+        self.operation.count_queries(self.queries.count)
+        return results
+
+    async def _run(self, hosts: list[Host]) -> list[bool]:
+        queue: asyncio.Queue = asyncio.Queue()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        writer = asyncio.create_task(self._writer(queue))
+        try:
+            results = await asyncio.gather(
+                *(self._run_host(semaphore, queue, host) for host in hosts))
+        finally:
+            await queue.put(None)
+            await writer
+            # Соединение с БД потока, в котором выполнялась запись пачек
+            await sync_to_async(connections.close_all)()
+        return list(results)
+
+    async def _run_host(self, semaphore: asyncio.Semaphore, queue: asyncio.Queue, host: Host) -> bool:
+        credential = self.credentials.get(host.id)
+        if not credential:
+            await queue.put(self._log(host, f'[{host.ip}] Нет учетных записей для выполнения команды.'))
+            return False
+
+        connect_params = credential.create_connect_params(host.ip)
+        commands = self.operation.prepare_commands(connect_params.get('password'))
+        async with semaphore:
+            try:
+                async with asyncssh.connect(**asyncssh_connect_params(connect_params)) as connection:
+                    for index, command in enumerate(commands):
+                        started_at = timezone.now()
+                        started = time.monotonic()
+                        completed = await connection.run(command, check=False)
+                        await queue.put(ExecuteCommandResult(
+                            operation=self.operation,
+                            host=host,
+                            command_index=index,
+                            started_at=started_at,
+                            duration=time.monotonic() - started,
+                            exit_code=completed.exit_status,
+                            stdout=completed.stdout or '',
+                            stderr=completed.stderr or '',
+                        ))
+            except Exception as e:
+                await queue.put(self._log(
+                    host, f'[{host.ip}] В результате выполнения команды возникла следующая ошибка: {e}'))
+                return False
+
+        await queue.put(self._log(host, f'[{host.ip}]Команда выполнена.'))
+        return True
+
+    def _log(self, host: Host, message: str) -> OperationLogEntry:
+        return OperationLogEntry(content_type=self.content_type, operation_id=self.operation.id,
+                                 host=host, message=message)
+
+    async def _writer(self, queue: asyncio.Queue) -> None:
+        finished = False
+        while not finished:
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    finished = True
+                    break
+                batch.append(item)
+            if batch:
+                await sync_to_async(self._flush)(batch)
+
+    def _flush(self, batch: list) -> None:
+        with self.queries.track():
+            ExecuteCommandResult.objects.bulk_create(
+                [item for item in batch if isinstance(item, ExecuteCommandResult)])
+            OperationLogEntry.objects.bulk_create(
+                [item for item in batch if isinstance(item, OperationLogEntry)])
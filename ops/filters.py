@@ -0,0 +1,38 @@
+from django.db.models import TextField
+from django.db.models.functions import Cast, Upper
+from django_filters import rest_framework as filters
+
+from .models import BaseOperation, ExecuteCommand, SendFile
+
+
+class OperationFilter(filters.FilterSet):
+    """
+    Фильтры истории операций: ?status=error&status=progress, ?created_by=<id пользователя>,
+    ?created_at_after=...&created_at_before=... (ISO 8601), ?host=<id хоста>.
+    """
+    status = filters.MultipleChoiceFilter(choices=BaseOperation.STATUS_CHOICES)
+    created_by = filters.NumberFilter(field_name='created_by')
+    created_at = filters.IsoDateTimeFromToRangeFilter()
+    host = filters.NumberFilter(field_name='hosts')
+
+
+class ExecuteCommandFilter(OperationFilter):
+    """
+    Дополнительно: ?protocol=ssh, ?command=<подстрока команды без учета регистра>.
+    """
+    command = filters.CharFilter(method='filter_command')
+
+    def filter_command(self, queryset, name, value):
+        # Выражение совпадает с триграммным индексом ops_command_trgm
+        return queryset.annotate(command_text=Upper(Cast('command', TextField()))).filter(
+            command_text__contains=value.upper())
+
+    class Meta:
+        model = ExecuteCommand
+        fields = ['status', 'protocol', 'created_by', 'created_at', 'host', 'command']
+
+
+class SendFileFilter(OperationFilter):
+    class Meta:
+        model = SendFile
+        fields = ['status', 'protocol', 'created_by', 'created_at', 'host']
@@ -0,0 +1,79 @@
+import asyncio
+
+import asyncssh
+from django.core.management.base import BaseCommand
+
+from core.models import Host, SSHCredential
+
+
+class StandinServer(asyncssh.SSHServer):
+    """
+    SSH-сервер заглушка: пускает любого пользователя с заданным паролем.
+    """
+
+    def __init__(self, password: str):
+        self.password = password
+
+    def begin_auth(self, username: str) -> bool:
+        return True
+
+    def password_auth_supported(self) -> bool:
+        return True
+
+    def validate_password(self, username: str, password: str) -> bool:
+        return password == self.password
+
+
+async def start_standin(host: str, port: int, password: str, latency: float) -> asyncssh.SSHAcceptor:
+    """
+    Запускает заглушку SSH-сервера. На любую команду она отвечает самой командой в stdout
+    через latency секунд и завершает ее с кодом 0.
+    """
+    async def handle(process: asyncssh.SSHServerProcess) -> None:
+        if latency:
+            await asyncio.sleep(latency)
+        process.stdout.write(f'{process.command}\n')
+        process.exit(0)
+
+    return await asyncssh.create_server(
+        lambda: StandinServer(password),
+        host,
+        port,
+        server_host_keys=[asyncssh.generate_private_key('ssh-ed25519')],
+        process_factory=handle,
+    )
+
+
+class Command(BaseCommand):
+    help = 'Запускает локальную заглушку SSH-сервера для нагрузочного тестирования движков выполнения команд.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bind', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=2222)
+        parser.add_argument('--password', default='standin')
+        parser.add_argument('--latency', type=float, default=0.0,
+                            help='Задержка ответа на каждую команду, секунды.')
+        parser.add_argument('--create-hosts', type=int, default=0,
+                            help='Создать указанное количество хостов standin-N, указывающих на заглушку.')
+
+    def handle(self, *args, **options):
+        if options['create_hosts']:
+            self.create_hosts(options['create_hosts'], options['bind'], options['port'], options['password'])
+
+        async def serve():
+            await start_standin(options['bind'], options['port'], options['password'], options['latency'])
+            self.stdout.write(f"Заглушка SSH слушает {options['bind']}:{options['port']}")
+            await asyncio.Future()
+
+        asyncio.run(serve())
+
+    def create_hosts(self, count: int, ip: str, port: int, password: str) -> None:
+        hosts = Host.objects.bulk_create(
+            [Host(name=f'standin-{number:05d}', ip=ip, os='linux') for number in range(1, count + 1)],
+            ignore_conflicts=True,
+        )
+        credential = SSHCredential(username='standin', port=port)
+        credential.set_password(password)
+        credential.save()
+        credential.host.set(Host.objects.filter(name__startswith='standin-'))
+        self.stdout.write(f'Создано хостов: {len(hosts)}, учетная запись: {credential}')
@@ -0,0 +1,24 @@
+from contextlib import ExitStack, contextmanager
+from typing import Iterator
+
+from django.db import connections
+
+
+class QueryCounter:
+    """
+    Счетчик запросов к БД (обращений к серверу), выполненных в текущем потоке внутри track().
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+    @contextmanager
+    def track(self) -> Iterator['QueryCounter']:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(self))
+            yield self
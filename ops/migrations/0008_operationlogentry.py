@@ -0,0 +1,81 @@
+# Generated by Django 5.1.6 on 2026-10-18 10:50
+
+from datetime import datetime
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def copy_log_to_entries(apps, model_name):
+    """
+    Переносит JSON-лог {timestamp: message} операций в таблицу OperationLogEntry.
+    """
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    OperationLogEntry = apps.get_model('ops', 'OperationLogEntry')
+    app_label, model = model_name.split('.')
+    content_type, _ = ContentType.objects.get_or_create(
+        app_label=app_label, model=model.lower())
+
+    for operation in apps.get_model(app_label, model).objects.exclude(log={}).iterator():
+        entries = []
+        for key, message in (operation.log or {}).items():
+            try:
+                created_at = timezone.make_aware(
+                    datetime.strptime(key[:26], '%Y-%m-%d %H:%M:%S.%f'))
+            except ValueError:
+                created_at = operation.created_at
+            level = 'info'
+            if message.startswith('[ERROR] '):
+                level, message = 'error', message[len('[ERROR] '):]
+            entries.append(OperationLogEntry(
+                content_type=content_type,
+                operation_id=operation.id,
+                created_at=created_at,
+                level=level,
+                message=message,
+            ))
+        OperationLogEntry.objects.bulk_create(entries)
+
+
+def forwards(apps, schema_editor):
+    for model_name in ('ops.ExecuteCommand', 'ops.SendFile'):
+        copy_log_to_entries(apps, model_name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('core', '0008_alter_host_options'),
+        ('ops', '0007_alter_executecommand_options_alter_sendfile_options'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OperationLogEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('operation_id', models.UUIDField()),
+                ('level', models.CharField(choices=[('info', 'Информация'), ('error', 'Ошибка')], default='info', max_length=10)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('message', models.TextField()),
+                ('content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.contenttype')),
+                ('host', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='core.host')),
+            ],
+            options={
+                'ordering': ['created_at', 'id'],
+                'indexes': [models.Index(fields=['content_type', 'operation_id', 'created_at'], name='ops_operati_content_3c2cd2_idx')],
+            },
+        ),
+        migrations.RunPython(forwards, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='executecommand',
+            name='log',
+        ),
+        migrations.RemoveField(
+            model_name='sendfile',
+            name='log',
+        ),
+    ]
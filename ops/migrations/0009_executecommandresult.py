@@ -0,0 +1,84 @@
+# Generated by Django 5.1.6 on 2026-10-18 10:51
+
+import re
+from datetime import datetime
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+from django.utils import timezone
+
+KEY_RE = re.compile(r'^(?P<timestamp>\S+ \S+) \[(?P<ip>[^\]]*)\]$')
+
+
+def copy_output_to_results(apps, schema_editor):
+    """
+    Переносит JSON-словари stdout/stderr {timestamp [ip]: output} в ExecuteCommandResult.
+    Вывод одной команды в stdout и stderr записывался под одним ключом.
+    """
+    ExecuteCommand = apps.get_model('ops', 'ExecuteCommand')
+    ExecuteCommandResult = apps.get_model('ops', 'ExecuteCommandResult')
+
+    operations = ExecuteCommand.objects.exclude(stdout={}, stderr={}).prefetch_related('hosts')
+    for operation in operations.iterator(chunk_size=100):
+        hosts = {host.ip: host for host in operation.hosts.all()}
+        keys = sorted(set(operation.stdout or {}) | set(operation.stderr or {}))
+        indexes = {}
+        results = []
+        for key in keys:
+            match = KEY_RE.match(key)
+            ip = match.group('ip') if match else ''
+            try:
+                started_at = timezone.make_aware(
+                    datetime.strptime(match.group('timestamp'), '%Y-%m-%d %H:%M:%S.%f'))
+            except (AttributeError, ValueError):
+                started_at = operation.created_at
+            index = indexes.get(ip, 0)
+            indexes[ip] = index + 1
+            results.append(ExecuteCommandResult(
+                operation=operation,
+                host=hosts.get(ip),
+                command_index=index,
+                started_at=started_at,
+                stdout=(operation.stdout or {}).get(key, ''),
+                stderr=(operation.stderr or {}).get(key, ''),
+            ))
+        ExecuteCommandResult.objects.bulk_create(results)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_alter_host_options'),
+        ('ops', '0008_operationlogentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExecuteCommandResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('command_index', models.PositiveIntegerField()),
+                ('exit_code', models.IntegerField(blank=True, null=True)),
+                ('duration', models.FloatField(blank=True, null=True)),
+                ('stdout', models.TextField(blank=True)),
+                ('stderr', models.TextField(blank=True)),
+                ('started_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('host', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='core.host')),
+                ('operation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='results', to='ops.executecommand')),
+            ],
+            options={
+                'ordering': ['started_at', 'id'],
+                'constraints': [models.UniqueConstraint(fields=('operation', 'host', 'command_index'), name='unique_execute_command_result')],
+            },
+        ),
+        migrations.RunPython(copy_output_to_results, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='executecommand',
+            name='stderr',
+        ),
+        migrations.RemoveField(
+            model_name='executecommand',
+            name='stdout',
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.6 on 2026-10-18 10:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ops', '0009_executecommandresult'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExecuteCommandOutput',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stream', models.CharField(choices=[('stdout', 'stdout'), ('stderr', 'stderr')], max_length=6)),
+                ('data', models.TextField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('operation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='output', to='ops.executecommand')),
+                ('result', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='ops.executecommandresult')),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['operation', 'id'], name='ops_execute_operati_35d8d9_idx')],
+            },
+        ),
+    ]
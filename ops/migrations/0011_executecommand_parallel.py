@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-18 10:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ops', '0010_executecommandoutput'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='executecommand',
+            name='parallel',
+            field=models.BooleanField(default=False),
+        ),
+    ]
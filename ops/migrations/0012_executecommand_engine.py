@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-18 10:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ops', '0011_executecommand_parallel'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='executecommand',
+            name='engine',
+            field=models.CharField(choices=[('celery', 'Celery'), ('asyncio', 'Asyncio')], default='celery', max_length=10),
+        ),
+    ]
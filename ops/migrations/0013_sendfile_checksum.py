@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-18 11:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ops', '0012_executecommand_engine'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sendfile',
+            name='checksum',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.1.6 on 2026-10-18 11:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_alter_host_options'),
+        ('ops', '0013_sendfile_checksum'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SendFileTransfer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('size', models.BigIntegerField(default=0)),
+                ('transferred', models.BigIntegerField(default=0)),
+                ('rate', models.FloatField(default=0)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('host', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='core.host')),
+                ('operation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transfers', to='ops.sendfile')),
+            ],
+            options={
+                'ordering': ['id'],
+                'constraints': [models.UniqueConstraint(fields=('operation', 'host'), name='unique_send_file_transfer')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.6 on 2026-10-18 11:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ops', '0015_chunkedupload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='executecommand',
+            name='callback',
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='sendfile',
+            name='callback',
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+    ]
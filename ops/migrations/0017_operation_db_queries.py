@@ -0,0 +1,23 @@
+# Generated by Django 5.1.6 on 2026-10-18 11:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ops', '0016_operation_callback'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='executecommand',
+            name='db_queries',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='sendfile',
+            name='db_queries',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
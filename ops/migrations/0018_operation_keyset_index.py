@@ -0,0 +1,32 @@
+# Generated by Django 5.1.6 on 2026-10-18 11:25
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_alter_host_options'),
+        ('ops', '0017_operation_db_queries'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='executecommand',
+            options={'ordering': ['-created_at', '-id']},
+        ),
+        migrations.AlterModelOptions(
+            name='sendfile',
+            options={'ordering': ['-created_at', '-id']},
+        ),
+        migrations.AddIndex(
+            model_name='executecommand',
+            index=models.Index(fields=['created_at', 'id'], name='ops_executecommand_keyset'),
+        ),
+        migrations.AddIndex(
+            model_name='sendfile',
+            index=models.Index(fields=['created_at', 'id'], name='ops_sendfile_keyset'),
+        ),
+    ]
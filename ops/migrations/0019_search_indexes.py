@@ -0,0 +1,32 @@
+# Generated by Django 5.1.6 on 2026-10-18 11:27
+
+import core.db
+import django.contrib.postgres.indexes
+import django.db.models.functions.comparison
+import django.db.models.functions.text
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_search_indexes'),
+        ('ops', '0018_operation_keyset_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='executecommand',
+            index=models.Index(fields=['status', 'created_at'], name='ops_executecommand_status'),
+        ),
+        core.db.AddTrigramIndex(
+            model_name='executecommand',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper(django.db.models.functions.comparison.Cast('command', models.TextField())), name='gin_trgm_ops'), name='ops_command_trgm'),
+        ),
+        migrations.AddIndex(
+            model_name='sendfile',
+            index=models.Index(fields=['status', 'created_at'], name='ops_sendfile_status'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.6 on 2026-10-18 11:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ops', '0019_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='executecommand',
+            name='selector',
+            field=models.CharField(blank=True, max_length=1000),
+        ),
+        migrations.AddField(
+            model_name='sendfile',
+            name='selector',
+            field=models.CharField(blank=True, max_length=1000),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-18 11:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ops', '0020_operation_selector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chunkedupload',
+            name='error',
+            field=models.TextField(blank=True, editable=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-18 11:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ops', '0021_upload_error'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chunkedupload',
+            name='processing',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -1,15 +1,38 @@
+import fcntl
+import logging
+import os
+import threading
 import uuid
 import winrm
 import paramiko
-from typing import Callable, Any
+from celery import signature
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+from typing import Callable, Any, Iterator
 
-from django.db import models, transaction
+from django.core.files.storage import default_storage
+from django.http import UnreadablePostError
+from django.db import connection, models
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.db.models import F, Q, TextField
+from django.db.models.functions import Cast, Upper
+from django.conf import settings
 from datetime import datetime
+from django.utils import timezone
 from django.contrib.auth.models import User
+from django.contrib.contenttypes.fields import GenericForeignKey, GenericRelation
+from django.contrib.contenttypes.models import ContentType
 
+from core.credentials import CredentialResolver
 from core.models import Host, WinRMCredential, SSHCredential
+from .metrics import QueryCounter
+from .ssh import HASH_CHUNK_SIZE, ssh_pool, file_sha256, remote_sha256, run_channel, sftp_upload, stream_channel
 from .validators import validate_command, path_validator
 
+logger = logging.getLogger(__name__)
+
 
 class BaseOperation(models.Model):
     STATUS_CHOICES = (
@@ -18,68 +41,284 @@ class BaseOperation(models.Model):
         ('error', 'Ошибка'),
         ('completed', 'Выполнено'),
     )
+    # Допустимые переходы: статус -> статусы, из которых в него можно перейти. Конечные статусы не меняются
+    TRANSITIONS = {
+        'progress': ('queue',),
+        'completed': ('queue', 'progress'),
+        'error': ('queue', 'progress'),
+    }
+    # Запросы к БД, еще не записанные в db_queries (track_queries)
+    _queries = 0
+    _queries_lock = threading.Lock()
 
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     created_by = models.ForeignKey(
         User, on_delete=models.SET_NULL, null=True, editable=False)
-    log = models.JSONField(blank=True, default=dict, editable=False)
+    log_entries = GenericRelation(
+        'ops.OperationLogEntry', object_id_field='operation_id')
     status = models.CharField(
         max_length=10, choices=STATUS_CHOICES, editable=False, default='queue')
+    callback = models.JSONField(null=True, blank=True, editable=False) # Задача Celery (signature), запускаемая после завершения операции
+    db_queries = models.PositiveIntegerField(default=0, editable=False) # Число запросов к БД при выполнении операции
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
-    def add_log(self, message: str, key_prefix: str = '') -> None:
-        cls = self.__class__
-        with transaction.atomic():
-            obj = cls.objects.select_for_update().get(id=self.id)
-            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
-            key = f'{timestamp} {key_prefix}' if key_prefix else timestamp
-            log = obj.log or {}
-            log[key] = message
-            obj.log = log
-            print(self.id, message)
-            obj.save(update_fields=["log", "updated_at"])
-
-    def error_log(self, message: str) -> None:
-        self.status = 'error'
-        self.save(update_fields=["status", "updated_at"])
-        self.add_log('[ERROR] ' + message)
+    @property
+    def log(self) -> dict:
+        """
+        Лог операции в прежнем формате {timestamp: message}, собирается из OperationLogEntry.
+        """
+        return {entry.key: entry.display_message for entry in self.log_entries.all()}
+
+    def add_log(self, message: str, host: Host | None = None, level: str = 'info') -> None:
+        OperationLogEntry.objects.create(
+            operation=self, host=host, level=level, message=message)
+        logger.debug('%s %s', self.id, message)
+
+    def transition(self, status: str, message: str, host: Host | None = None, level: str = 'info') -> bool:
+        """
+        Переводит операцию в статус status и добавляет запись лога одним запросом к БД:
+        UPDATE строки операции и INSERT записи лога выполняются одной командой (CTE), то есть атомарно.
+        Тем же UPDATE к db_queries добавляются накопленные запросы операции (track_queries).
+        Если текущий статус операции не допускает перехода (TRANSITIONS), ничего не меняется и возвращается False.
+        """
+        sources = self.TRANSITIONS[status]
+        now = timezone.now()
+        queries = self.pop_queries()
+        sql = (
+            f'WITH updated AS ('
+            f'UPDATE {connection.ops.quote_name(self._meta.db_table)} '
+            f'SET status = %s, updated_at = %s, db_queries = db_queries + %s '
+            f'WHERE id = %s AND status IN ({", ".join(["%s"] * len(sources))}) RETURNING id) '
+            f'INSERT INTO {connection.ops.quote_name(OperationLogEntry._meta.db_table)} '
+            f'(content_type_id, operation_id, host_id, level, created_at, message) '
+            f'SELECT %s, id, %s, %s, %s, %s FROM updated'
+        )
+        params = [status, now, queries, self.id, *sources,
+                  ContentType.objects.get_for_model(self).id, host.id if host else None, level, now, message]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            changed = cursor.rowcount == 1
+        if changed:
+            self.status, self.updated_at = status, now
+        else:
+            self.count_queries(queries)
+        return changed
+
+    def error_log(self, message: str, host: Host | None = None) -> None:
+        """
+        Завершает операцию с ошибкой. Если операция уже в конечном статусе, сообщение все равно
+        записывается в лог; учетные записи операции удаляются из кэша в любом случае.
+        """
+        if self.transition('error', message, host=host, level='error'):
+            self.notify_finished()
+        else:
+            self.add_log(message, host=host, level='error')
+        CredentialResolver.evict(self)
+
+    def start(self, message: str = 'Операция запущена.') -> bool:
+        return self.transition('progress', message)
+
+    def finish(self, success: bool, message: str | None = None) -> bool:
+        if message is None:
+            message = 'Операция успешно завершена.' if success else 'Операция завершена с ошибками.'
+        if not self.transition('completed' if success else 'error', message):
+            return False
+        CredentialResolver.evict(self)
+        self.notify_finished()
+        return True
+
+    def credential_hosts(self) -> models.QuerySet:
+        """
+        Хосты, учетные записи которых использует операция.
+        """
+        raise NotImplementedError
+
+    def get_credential(self, model: type[SSHCredential | WinRMCredential], host: Host) -> SSHCredential | WinRMCredential | None:
+        """
+        Учетная запись хоста операции. Учетные записи всех хостов операции загружаются одним запросом
+        при первом обращении (CredentialResolver).
+        """
+        return CredentialResolver.for_operation(model, self).get(host.id)
+
+    @contextmanager
+    def track_queries(self) -> Iterator[QueryCounter]:
+        """
+        Считает запросы к БД, выполненные в текущем потоке. Число запросов копится в памяти
+        (в том числе из потоков пула) и записывается в db_queries при смене статуса операции,
+        поэтому подоперации хостов не обновляют строку операции каждая своим запросом.
+        """
+        counter = QueryCounter()
+        try:
+            with counter.track():
+                yield counter
+        finally:
+            self.count_queries(counter.count)
+
+    def count_queries(self, count: int) -> None:
+        with self._queries_lock:
+            self._queries += count
+
+    def pop_queries(self) -> int:
+        """
+        Накопленное число запросов, не записанное в db_queries; счетчик обнуляется.
+        Подоперации, выполняемые в отдельных задачах, возвращают его в результате (run_suboperation).
+        """
+        with self._queries_lock:
+            count, self._queries = self._queries, 0
+        return count
+
+    def notify_finished(self) -> None:
+        """
+        Уведомляет о переходе операции в конечный статус: запускает задачу callback,
+        передавая ей первым аргументом id операции.
+        """
+        if self.callback:
+            signature(self.callback).delay(self.id)
 
     class Meta:
         abstract = True
-        ordering = ['-created_at']
+        ordering = ['-created_at', '-id']
+        indexes = [
+            # Постраничный вывод истории операций по ключу (created_at, id)
+            models.Index(fields=['created_at', 'id'], name='%(app_label)s_%(class)s_keyset'),
+            models.Index(fields=['status', 'created_at'], name='%(app_label)s_%(class)s_status'),
+        ]
+
+
+class HostOperation(BaseOperation):
+    """
+    Операция, выполняемая на наборе хостов (hosts) - по одной подоперации run(host_id) на хост.
+    Если хосты выбраны выражением (core.selectors), оно сохраняется в selector.
+    """
+    hosts = models.ManyToManyField(Host, blank=True)
+    selector = models.CharField(max_length=1000, blank=True)
+
+    @classmethod
+    def run_inline(cls, host: Host, **fields) -> 'HostOperation':
+        """
+        Создает операцию для одного хоста и сразу выполняет ее в текущем процессе, без Celery.
+        Строка операции с логом сохраняется для аудита; операция создается в статусе progress,
+        поэтому сигнал m2m_changed не отправляет ее повторно в run_operation. Если выполнение прервано
+        исключением, операция завершается с ошибкой, а исключение передается дальше.
+        """
+        operation = cls.objects.create(status='progress', **fields)
+        try:
+            with operation.track_queries():
+                operation.hosts.add(host)
+                operation.add_log('Операция запущена.')
+                success = bool(operation.run(host.id))
+        except Exception as e:
+            # Операция создана в статусе progress и без завершения осталась бы в нем навсегда
+            operation.error_log(f'Операция прервана ошибкой: {e}')
+            raise
+        operation.finish(success)
+        return operation
+
+    def run(self, host_id: int):
+        raise NotImplementedError
 
+    def credential_hosts(self) -> models.QuerySet:
+        return self.hosts.all()
 
-class ExecuteCommand(BaseOperation):
+    class Meta(BaseOperation.Meta):
+        abstract = True
+
+
+class OperationLogEntry(models.Model):
+    """
+    Запись лога операции. Лог только дополняется: одна строка - один INSERT, без блокировки
+    строки операции, поэтому параллельные воркеры не мешают друг другу.
+    """
+    LEVEL_CHOICES = (
+        ('info', 'Информация'),
+        ('error', 'Ошибка'),
+    )
+
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    operation_id = models.UUIDField()
+    operation = GenericForeignKey('content_type', 'operation_id')
+    host = models.ForeignKey(
+        Host, on_delete=models.SET_NULL, null=True, blank=True)
+    level = models.CharField(
+        max_length=10, choices=LEVEL_CHOICES, default='info')
+    created_at = models.DateTimeField(default=timezone.now)
+    message = models.TextField()
+
+    @property
+    def key(self) -> str:
+        return timezone.localtime(self.created_at).strftime("%Y-%m-%d %H:%M:%S.%f")
+
+    @property
+    def display_message(self) -> str:
+        return f'[ERROR] {self.message}' if self.level == 'error' else self.message
+
+    def __str__(self):
+        return f'{self.key} {self.display_message}'
+
+    class Meta:
+        ordering = ['created_at', 'id']
+        indexes = [
+            models.Index(fields=['content_type', 'operation_id', 'created_at']),
+        ]
+
+
+class ExecuteCommand(HostOperation):
     PROTOCOL_CHOICES = (
         ('winrm', 'WinRM'),
         ('ssh', 'SSH'),
     )
-    hosts = models.ManyToManyField(Host, blank=True)
+    ENGINE_CHOICES = (
+        ('celery', 'Celery'),
+        ('asyncio', 'Asyncio'),
+    )
     command = models.JSONField(validators=[validate_command])
     protocol = models.CharField(max_length=10, choices=PROTOCOL_CHOICES)
     sudo = models.BooleanField(default=False)
-    stdout = models.JSONField(blank=True, default=dict, editable=False)
-    stderr = models.JSONField(blank=True, default=dict, editable=False)
+    parallel = models.BooleanField(default=False)
+    engine = models.CharField(max_length=10, choices=ENGINE_CHOICES, default='celery')
+
+    @property
+    def stdout(self) -> dict:
+        """
+        stdout в прежнем формате {timestamp [ip]: output}, собирается из ExecuteCommandResult.
+        """
+        return {result.key: result.stdout for result in self.results.all() if result.stdout}
 
-    def run_winrm_command(self, session: winrm.Session, ip: str):
-        for command in self.command:
+    @property
+    def stderr(self) -> dict:
+        return {result.key: result.stderr for result in self.results.all() if result.stderr}
+
+    def add_result(self, host: Host, command_index: int, started_at: datetime,
+                   stdout: str, stderr: str, exit_code: int | None,
+                   duration: float | None = None) -> 'ExecuteCommandResult':
+        if duration is None:
+            duration = (timezone.now() - started_at).total_seconds()
+        return ExecuteCommandResult.objects.create(
+            operation=self,
+            host=host,
+            command_index=command_index,
+            started_at=started_at,
+            duration=duration,
+            exit_code=exit_code,
+            stdout=stdout,
+            stderr=stderr,
+        )
+
+    def run_winrm_command(self, session: winrm.Session, host: Host):
+        for index, command in enumerate(self.command):
+            started_at = timezone.now()
             result = session.run_ps(command)
-            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
-            stdout = result.std_out.decode('cp1251')
-            stderr = result.std_err.decode('cp1251')
-            key = f'{timestamp} [{ip}]'
-            if stdout:
-                self.stdout[key] = stdout
-            if stderr:
-                self.stderr[key] = stderr
-            self.save(update_fields=["stdout", "stderr", "updated_at"])
+            self.add_result(host, index, started_at,
+                            result.std_out.decode('cp1251'),
+                            result.std_err.decode('cp1251'),
+                            result.status_code)
 
     def run_winrm(self, host: Host) -> bool:
-        winrm_credential: WinRMCredential = host.winrmcredential_set.first()
+        winrm_credential: WinRMCredential = self.get_credential(WinRMCredential, host)
         if not winrm_credential:
             self.add_log(
-                f'[{host.ip}] Нет учетных записей для выполнения команды.')
+                f'[{host.ip}] Нет учетных записей для выполнения команды.', host=host)
             return False
 
         http = 'https' if winrm_credential.ssl else 'http'
@@ -87,51 +326,74 @@ class ExecuteCommand(BaseOperation):
         session = winrm.Session(server, auth=(
             winrm_credential.username, winrm_credential.get_password()), transport='ntlm')
         try:
-            self.run_winrm_command(session, host.ip)
-            self.add_log(f'[{host.ip}]Команда выполнена.')
+            self.run_winrm_command(session, host)
+            self.add_log(f'[{host.ip}]Команда выполнена.', host=host)
         except Exception as e:
             self.add_log(
-                f'[{host.ip}] В результате выполнения команды возникла следующая ошибка: {e}')
+                f'[{host.ip}] В результате выполнения команды возникла следующая ошибка: {e}', host=host)
             return False
 
         return True
 
-    def run_ssh_command(self, client: paramiko.SSHClient, ip: str, password: str | None = None):
-        for command in self.command:
-            if password and self.sudo:
-                command = f"echo '{password}' | sudo -S bash -c '{command}'"
-            stdin, stdout, stderr = client.exec_command(command)
-            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
-            key = f'{timestamp} [{ip}]'
-            stdout = stdout.read().decode('utf-8')
-            stderr = stderr.read().decode('utf-8')
-            if stdout:
-                self.stdout[key] = stdout
-            if stderr:
-                self.stderr[key] = stderr
-            self.save(update_fields=["stdout", "stderr", "updated_at"])
+    def prepare_commands(self, password: str | None = None) -> list[str]:
+        if password and self.sudo:
+            return [f"echo '{password}' | sudo -S bash -c '{command}'" for command in self.command]
+        return list(self.command)
+
+    def run_ssh_command(self, client: paramiko.SSHClient, host: Host, password: str | None = None):
+        commands = self.prepare_commands(password)
+        if self.parallel and len(commands) > 1:
+            self.run_ssh_command_parallel(client, host, commands)
+            return
+
+        for index, command in enumerate(commands):
+            result = ExecuteCommandResult.objects.create(
+                operation=self, host=host, command_index=index)
+            channel = client.get_transport().open_session()
+            try:
+                channel.exec_command(command)
+                exit_code = stream_channel(
+                    channel,
+                    result.append_output,
+                    settings.OPS_OUTPUT_FLUSH_INTERVAL,
+                    settings.OPS_OUTPUT_FLUSH_SIZE,
+                )
+            finally:
+                channel.close()
+            result.finish(exit_code)
+
+    def run_ssh_command_parallel(self, client: paramiko.SSHClient, host: Host, commands: list[str]):
+        """
+        Выполняет независимые команды одновременно в нескольких каналах одного SSH-транспорта,
+        не более settings.OPS_SSH_MAX_CHANNELS_PER_HOST за раз. Результаты записываются
+        в порядке команд.
+        """
+        transport = client.get_transport()
+        max_workers = min(settings.OPS_SSH_MAX_CHANNELS_PER_HOST, len(commands))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(run_channel, transport, command) for command in commands]
+            for index, future in enumerate(futures):
+                output = future.result()
+                self.add_result(host, index, output.started_at, output.stdout,
+                                output.stderr, output.exit_code, output.duration)
 
     def run_ssh(self, host: Host) -> bool | None:
-        ssh_credential = host.sshcredential_set.first()
+        ssh_credential = self.get_credential(SSHCredential, host)
         if not ssh_credential:
             self.add_log(
-                f'[{host.ip}] Нет учетных записей для выполнения команды.')
+                f'[{host.ip}] Нет учетных записей для выполнения команды.', host=host)
             return False
 
-        client = paramiko.SSHClient()
-        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
         connect_params = ssh_credential.create_connect_params(host.ip)
 
         try:
-            client.connect(**connect_params)
-            self.run_ssh_command(client, host.ip, connect_params.get('password'))
-            self.add_log(f'[{host.ip}]Команда выполнена.')
+            with ssh_pool.connection(connect_params) as client:
+                self.run_ssh_command(client, host, connect_params.get('password'))
+            self.add_log(f'[{host.ip}]Команда выполнена.', host=host)
         except Exception as e:
             self.add_log(
-                f'[{host.ip}] В результате выполнения команды возникла следующая ошибка: {e}')
+                f'[{host.ip}] В результате выполнения команды возникла следующая ошибка: {e}', host=host)
             return False
-        finally:
-            client.close()
 
         return True
 
@@ -143,27 +405,108 @@ class ExecuteCommand(BaseOperation):
         }
         return method[self.protocol](host)
 
+    class Meta(HostOperation.Meta):
+        indexes = HostOperation.Meta.indexes + [
+            # Поиск по подстроке команды (ExecuteCommandFilter.filter_command)
+            GinIndex(OpClass(Upper(Cast('command', TextField())), name='gin_trgm_ops'), name='ops_command_trgm'),
+        ]
+
+
+class ExecuteCommandResult(models.Model):
+    """
+    Результат выполнения одной команды ExecuteCommand на одном хосте.
+    Каждая команда пишется отдельной строкой, поэтому параллельные воркеры
+    не перезаписывают вывод друг друга.
+    """
+    operation = models.ForeignKey(
+        ExecuteCommand, on_delete=models.CASCADE, related_name='results')
+    host = models.ForeignKey(
+        Host, on_delete=models.SET_NULL, null=True, blank=True)
+    command_index = models.PositiveIntegerField()
+    exit_code = models.IntegerField(null=True, blank=True)
+    duration = models.FloatField(null=True, blank=True)
+    stdout = models.TextField(blank=True)
+    stderr = models.TextField(blank=True)
+    started_at = models.DateTimeField(default=timezone.now)
+
+    def append_output(self, stdout: str = '', stderr: str = '') -> None:
+        """
+        Сохраняет очередную порцию вывода выполняющейся команды отдельными чанками для чтения по курсору.
+        Полный вывод в строке результата собирается из чанков один раз, при завершении команды (finish).
+        """
+        ExecuteCommandOutput.objects.bulk_create([
+            ExecuteCommandOutput(operation_id=self.operation_id, result=self, stream=stream, data=data)
+            for stream, data in (('stdout', stdout), ('stderr', stderr)) if data
+        ])
 
-class SendFile(BaseOperation):
+    def finish(self, exit_code: int | None) -> None:
+        output = self.chunks.aggregate(
+            stdout=StringAgg('data', delimiter='', filter=Q(stream='stdout'), ordering='id'),
+            stderr=StringAgg('data', delimiter='', filter=Q(stream='stderr'), ordering='id'),
+        )
+        self.stdout = output['stdout'] or ''
+        self.stderr = output['stderr'] or ''
+        self.exit_code = exit_code
+        self.duration = (timezone.now() - self.started_at).total_seconds()
+        self.save(update_fields=['stdout', 'stderr', 'exit_code', 'duration'])
+
+    @property
+    def key(self) -> str:
+        timestamp = timezone.localtime(self.started_at).strftime("%Y-%m-%d %H:%M:%S.%f")
+        return f'{timestamp} [{self.host.ip if self.host else ""}]'
+
+    class Meta:
+        ordering = ['started_at', 'id']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['operation', 'host', 'command_index'],
+                name='unique_execute_command_result'),
+        ]
+
+
+class ExecuteCommandOutput(models.Model):
+    """
+    Порция вывода команды, записанная во время ее выполнения. Идентификатор чанка
+    служит курсором для получения вывода выполняющейся операции.
+    """
+    STREAM_CHOICES = (
+        ('stdout', 'stdout'),
+        ('stderr', 'stderr'),
+    )
+
+    operation = models.ForeignKey(
+        ExecuteCommand, on_delete=models.CASCADE, related_name='output')
+    result = models.ForeignKey(
+        ExecuteCommandResult, on_delete=models.CASCADE, related_name='chunks')
+    stream = models.CharField(max_length=6, choices=STREAM_CHOICES)
+    data = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['operation', 'id']),
+        ]
+
+
+class SendFile(HostOperation):
     PROTOCOL_CHOICES = (
         ('smb', 'SMB'),
         ('sftp', 'SFTP'),
     )
-    hosts = models.ManyToManyField(Host, blank=True)
     protocol = models.CharField(max_length=10, choices=PROTOCOL_CHOICES)
     local_path = models.TextField(validators=[path_validator], blank=True)
     target_path = models.TextField(validators=[path_validator])
     file = models.FileField(upload_to='files_to_send/%Y/%m/', blank=True)
+    checksum = models.CharField(max_length=64, blank=True) # SHA-256 файла: если на хосте уже лежит такой файл, отправка пропускается
 
     def send_sftp_file(self, host: Host) -> bool | None:
-        ssh_credential: SSHCredential = host.sshcredential_set.first()
+        ssh_credential: SSHCredential = self.get_credential(SSHCredential, host)
         if not ssh_credential:
             self.add_log(
-                f'[{host.ip}] Нет учетных записей для отправки файла.')
+                f'[{host.ip}] Нет учетных записей для отправки файла.', host=host)
             return False
 
-        client = paramiko.SSHClient()
-        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
         connect_params = ssh_credential.create_connect_params(host.ip)
 
         if self.file:
@@ -173,26 +516,221 @@ class SendFile(BaseOperation):
 
         if not local_path:
             self.add_log(
-                f'[{host.ip}] Не указан файл для отправки.')
+                f'[{host.ip}] Не указан файл для отправки.', host=host)
             return False
-        sftp = None
-        try:
-            client.connect(**connect_params)
-            sftp = client.open_sftp()
-            sftp.put(local_path, self.target_path)
-            self.add_log(f'[{host.ip}]Файл отправлен.')
-        except Exception as e:
-            self.add_log(
-                f'[{host.ip}] В результате отправки файла возникла следующая ошибка: {e}')
-            return False
-        finally:
-            if sftp:
-                sftp.close()
-            client.close()
 
+        attempts = settings.OPS_SFTP_RETRIES
+        for attempt in range(1, attempts + 1):
+            try:
+                return self.upload_sftp_file(host, connect_params, local_path)
+            except Exception as e:
+                if attempt < attempts:
+                    self.add_log(
+                        f'[{host.ip}] Ошибка отправки файла (попытка {attempt} из {attempts}): {e}', host=host)
+                    continue
+                self.add_log(
+                    f'[{host.ip}] В результате отправки файла возникла следующая ошибка: {e}', host=host)
+        return False
+
+    def upload_sftp_file(self, host: Host, connect_params: dict, local_path: str) -> bool:
+        """
+        Отправляет файл по SFTP с записью прогресса в SendFileTransfer. Файл пишется во временный файл
+        операции и переименовывается по завершении; прерванная отправка продолжается только с объема,
+        отправленного этой же операцией. Если задана контрольная сумма, уже лежащий на хосте файл
+        не отправляется повторно, а отправленный файл проверяется; при несовпадении после продолжения
+        файл отправляется заново.
+        """
+        transfer, _ = SendFileTransfer.objects.update_or_create(
+            operation=self, host=host, defaults={'size': os.path.getsize(local_path)})
+
+        with ssh_pool.connection(connect_params) as client:
+            if self.checksum and remote_sha256(client, self.target_path) == self.checksum:
+                transfer.set_progress(transfer.size, 0)
+                self.add_log(f'[{host.ip}] Файл уже есть на хосте, отправка пропущена.', host=host)
+                return True
+
+            upload = partial(sftp_upload, client, local_path, self.target_path,
+                             chunk_size=settings.OPS_SFTP_CHUNK_SIZE,
+                             window_size=settings.OPS_SFTP_WINDOW_SIZE,
+                             progress=transfer.set_progress,
+                             interval=settings.OPS_SFTP_PROGRESS_INTERVAL,
+                             part_path=f'{self.target_path}.{self.pk}.part')
+            offset = upload(offset=transfer.transferred)
+            if offset:
+                self.add_log(f'[{host.ip}] Отправка продолжена с {offset} байт.', host=host)
+
+            if self.checksum and remote_sha256(client, self.target_path) != self.checksum:
+                if offset:
+                    self.add_log(
+                        f'[{host.ip}] Контрольная сумма не совпадает, файл отправляется заново.', host=host)
+                    upload(offset=0)
+                if not offset or remote_sha256(client, self.target_path) != self.checksum:
+                    self.add_log(f'[{host.ip}] Контрольная сумма отправленного файла не совпадает.', host=host)
+                    return False
+
+        self.add_log(f'[{host.ip}]Файл отправлен.', host=host)
         return True
 
     def run(self, host_id: int):
         host = Host.objects.get(id=host_id)
         if self.protocol == 'sftp':
             return self.send_sftp_file(host)
+
+
+class SendFileTransfer(models.Model):
+    """
+    Прогресс отправки файла SendFile на один хост. Обновляется во время отправки
+    не чаще раза в settings.OPS_SFTP_PROGRESS_INTERVAL секунд.
+    """
+    operation = models.ForeignKey(
+        SendFile, on_delete=models.CASCADE, related_name='transfers')
+    host = models.ForeignKey(
+        Host, on_delete=models.SET_NULL, null=True, blank=True)
+    size = models.BigIntegerField(default=0) # Размер файла, байт
+    transferred = models.BigIntegerField(default=0) # Отправлено, байт
+    rate = models.FloatField(default=0) # Скорость отправки, байт/с
+    started_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def eta(self) -> float | None:
+        """
+        Оценка оставшегося времени отправки, секунды.
+        """
+        if self.transferred >= self.size:
+            return 0
+        if not self.rate:
+            return None
+        return (self.size - self.transferred) / self.rate
+
+    def set_progress(self, transferred: int, rate: float) -> None:
+        self.transferred = transferred
+        self.rate = rate
+        self.save(update_fields=['transferred', 'rate', 'updated_at'])
+
+    class Meta:
+        ordering = ['id']
+        constraints = [
+            models.UniqueConstraint(fields=['operation', 'host'], name='unique_send_file_transfer'),
+        ]
+
+
+class UploadOffsetMismatch(Exception):
+    """
+    Смещение части файла не совпадает с уже принятым объемом загрузки.
+    """
+
+    def __init__(self, offset: int):
+        super().__init__(f'Ожидается смещение {offset}')
+        self.offset = offset
+
+
+class ChunkedUpload(models.Model):
+    """
+    Файл, загружаемый по частям: загрузка создается с указанием имени и размера файла,
+    затем части дописываются по смещению (после обрыва соединения загрузка продолжается
+    с принятого сервером смещения) и загрузка завершается с вычислением SHA-256 фоновой задачей.
+    Части пишутся сразу в хранилище файлов, завершенный файл переносится в FileField
+    операции (UpdateFile, SendFile) без копирования.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField() # Ожидаемый размер файла, байт
+    offset = models.BigIntegerField(default=0) # Принято байт
+    sha256 = models.CharField(max_length=64, blank=True)
+    completed = models.BooleanField(default=False)
+    processing = models.BooleanField(default=False) # Выполняется проверка контрольной суммы
+    error = models.TextField(editable=False, blank=True) # Причина, по которой загрузка не завершена
+    created_by = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def path(self) -> str:
+        return default_storage.path(f'uploads/{self.id}.part')
+
+    def append(self, stream, offset: int) -> int:
+        """
+        Дописывает данные из stream начиная с offset и возвращает новое смещение. За один запрос
+        принимается не больше settings.OPS_UPLOAD_MAX_CHUNK_SIZE байт. Запись выполняется под блокировкой
+        файла загрузки, поэтому параллельные запросы не перемешивают данные, а в базе под условием
+        на прежнее смещение только сдвигается offset. При обрыве соединения сохраняется все, что успело прийти.
+        """
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600), 'r+b') as file:
+            try:
+                fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                # Часть с этого же смещения уже принимается другим запросом
+                raise UploadOffsetMismatch(ChunkedUpload.objects.values_list('offset', flat=True).get(pk=self.pk))
+
+            accepted, completed = ChunkedUpload.objects.filter(pk=self.pk).values_list('offset', 'completed').get()
+            if completed or offset != accepted:
+                raise UploadOffsetMismatch(accepted)
+
+            end = min(self.size, offset + settings.OPS_UPLOAD_MAX_CHUNK_SIZE)
+            file.seek(offset)
+            while offset < end:
+                try:
+                    data = stream.read(min(HASH_CHUNK_SIZE, end - offset))
+                except UnreadablePostError:
+                    # Клиент оборвал соединение: принятое до обрыва сохраняется
+                    break
+                if not data:
+                    break
+                file.write(data)
+                offset += len(data)
+            file.truncate()
+            file.flush()
+            ChunkedUpload.objects.filter(pk=self.pk, offset=accepted).update(offset=offset, updated_at=timezone.now())
+
+        self.offset = offset
+        return self.offset
+
+    def begin_complete(self) -> bool:
+        """
+        Помечает полностью принятую загрузку как проверяемую (processing). Возвращает False, если загрузка
+        принята не полностью, уже завершена или уже проверяется, чтобы проверка не запускалась дважды.
+        """
+        return bool(ChunkedUpload.objects.filter(
+            pk=self.pk, offset=F('size'), completed=False, processing=False,
+        ).update(processing=True, error='', updated_at=timezone.now()))
+
+    def complete(self, sha256: str = '') -> None:
+        """
+        Вычисляет SHA-256 загруженного файла (фоновая задача ops.tasks.complete_upload) и завершает загрузку.
+        Если файл не совпадает с ожидаемой контрольной суммой sha256 или не читается, он отбрасывается:
+        причина записывается в error, а offset сбрасывается, чтобы файл можно было загрузить заново.
+        """
+        try:
+            self.sha256 = file_sha256(self.path)
+        except OSError as e:
+            self.sha256, self.offset = '', 0
+            self.error = f'Не удалось прочитать загруженный файл: {e}'
+        else:
+            if sha256 and sha256 != self.sha256:
+                os.remove(self.path)
+                self.offset = 0
+                self.error = 'Контрольная сумма загруженного файла не совпадает.'
+            else:
+                self.completed = True
+        self.processing = False
+        self.save(update_fields=['sha256', 'offset', 'completed', 'processing', 'error', 'updated_at'])
+
+    def store(self, field: models.FileField, filename: str | None = None) -> str:
+        """
+        Переносит загруженный файл в каталог поля field (upload_to) и удаляет загрузку.
+        Возвращает имя файла в хранилище для присвоения полю.
+        """
+        name = default_storage.get_available_name(
+            field.generate_filename(None, filename or self.filename))
+        os.makedirs(os.path.dirname(default_storage.path(name)), exist_ok=True)
+        os.replace(self.path, default_storage.path(name))
+        super().delete()
+        return name
+
+    def delete(self, *args, **kwargs):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        super().delete(*args, **kwargs)
@@ -1,8 +1,10 @@
+from django.db.models import Q
 from rest_framework import serializers
 
 from core.serializers import UserShortSerializer, HostShortSerializer
 from core.models import Host
-from .models import ExecuteCommand, SendFile
+from core.selectors import SelectorError, parse_selector
+from .models import ChunkedUpload, ExecuteCommand, ExecuteCommandOutput, SendFile, SendFileTransfer
 
 
 class BaseOperationSerializer(serializers.ModelSerializer):
@@ -12,7 +14,7 @@ class BaseOperationSerializer(serializers.ModelSerializer):
     class Meta:
         model = None
         fields = ['id', 'created_by', 'log',
-                  'status', 'created_at', 'updated_at']
+                  'status', 'db_queries', 'created_at', 'updated_at']
 
     def create(self, validated_data):
         request = self.context.get('request')
@@ -20,36 +22,142 @@ class BaseOperationSerializer(serializers.ModelSerializer):
             validated_data['created_by'] = request.user
         return super().create(validated_data)
 
-class ExecuteCommandSerializer(BaseOperationSerializer):
-    hosts = serializers.PrimaryKeyRelatedField(
-        many=True,
+class HostOperationSerializer(BaseOperationSerializer):
+    """
+    Хосты операции задаются списком id (hosts), выражением выбора (selector, см. core.selectors) или обоими:
+    выбираются хосты из списка и хосты, подходящие под выражение. Хосты проверяются и выбираются
+    одним запросом, связи с операцией создаются одной вставкой.
+    """
+    hosts = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
         write_only=True,
-        queryset=Host.objects.all(),
+        required=False,
     )
     hosts_display = HostShortSerializer(many=True, read_only=True, source='hosts')
-    class Meta:
-        model = ExecuteCommand
-        fields = BaseOperationSerializer.Meta.fields + \
-            ['hosts', 'hosts_display', 'command', 'protocol', 'sudo', 'stdout', 'stderr']
+    class Meta(BaseOperationSerializer.Meta):
+        fields = BaseOperationSerializer.Meta.fields + ['hosts', 'hosts_display', 'selector']
+
+    def validate_selector(self, value):
+        if value:
+            try:
+                parse_selector(value)
+            except SelectorError as e:
+                raise serializers.ValidationError(str(e))
+        return value
+
+    def validate(self, attrs):
+        ids, selector = attrs.get('hosts', []), attrs.get('selector')
+        if not ids and not selector:
+            raise serializers.ValidationError({'hosts': 'Не указаны хосты или выражение выбора хостов.'})
+        condition = Q(pk__in=ids)
+        if selector:
+            condition |= parse_selector(selector)
+        found = set(Host.objects.filter(condition).values_list('pk', flat=True))
+        missing = sorted(set(ids) - found)
+        if missing:
+            message = serializers.PrimaryKeyRelatedField.default_error_messages['does_not_exist']
+            raise serializers.ValidationError({'hosts': [message.format(pk_value=pk) for pk in missing]})
+        if not found:
+            raise serializers.ValidationError({'selector': 'Выражение не выбрало ни одного хоста.'})
+        attrs['hosts'] = sorted(found)
+        return super().validate(attrs)
+
+    def create(self, validated_data):
+        hosts = validated_data.pop('hosts')
+        instance = super().create(validated_data)
+        # Вставка связей отправляет m2m_changed, по которому операция ставится в очередь
+        instance.hosts.add(*hosts)
+        return instance
 
     def to_representation(self, instance):
         rep = super().to_representation(instance)
         rep['hosts'] = rep.pop('hosts_display', [])
         return rep
 
-class SendFileSerializer(BaseOperationSerializer):
-    hosts = serializers.PrimaryKeyRelatedField(
-        many=True,
-        write_only=True,
-        queryset=Host.objects.all(),
-    )
-    hosts_display = HostShortSerializer(many=True, read_only=True, source='hosts')
+class ExecuteCommandSerializer(HostOperationSerializer):
+    class Meta(HostOperationSerializer.Meta):
+        model = ExecuteCommand
+        fields = HostOperationSerializer.Meta.fields + \
+            ['command', 'protocol', 'sudo', 'parallel', 'engine', 'stdout', 'stderr']
+
+    def validate(self, attrs):
+        if attrs.get('engine') == 'asyncio' and attrs.get('protocol') != 'ssh':
+            raise serializers.ValidationError(
+                {'engine': 'Движок asyncio поддерживает только протокол SSH.'})
+        if attrs.get('engine') == 'asyncio' and attrs.get('parallel'):
+            raise serializers.ValidationError(
+                {'parallel': 'Движок asyncio выполняет команды хоста последовательно.'})
+        return super().validate(attrs)
+
+class ExecuteCommandListSerializer(ExecuteCommandSerializer):
+    """
+    Операция в списке: без лога и вывода команд, они возвращаются только детальным представлением.
+    """
+    class Meta(ExecuteCommandSerializer.Meta):
+        fields = [field for field in ExecuteCommandSerializer.Meta.fields if field not in ('log', 'stdout', 'stderr')]
+
+class ExecuteCommandOutputSerializer(serializers.ModelSerializer):
+    host = HostShortSerializer(read_only=True, source='result.host')
+    command_index = serializers.IntegerField(read_only=True, source='result.command_index')
     class Meta:
+        model = ExecuteCommandOutput
+        fields = ['id', 'host', 'command_index', 'stream', 'data', 'created_at']
+
+class SendFileTransferSerializer(serializers.ModelSerializer):
+    host = HostShortSerializer(read_only=True)
+    class Meta:
+        model = SendFileTransfer
+        fields = ['host', 'size', 'transferred', 'rate', 'eta', 'updated_at']
+
+class ChunkedUploadSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ChunkedUpload
+        fields = ['id', 'filename', 'size', 'offset', 'sha256', 'completed', 'processing', 'error', 'created_at']
+        read_only_fields = ['offset', 'sha256', 'completed', 'processing', 'error']
+
+    def validate_size(self, value):
+        if value <= 0:
+            raise serializers.ValidationError('Размер файла должен быть больше нуля.')
+        return value
+
+    def create(self, validated_data):
+        request = self.context.get('request')
+        if request and hasattr(request, 'user'):
+            validated_data['created_by'] = request.user
+        return super().create(validated_data)
+
+class ChunkedUploadField(serializers.PrimaryKeyRelatedField):
+    """
+    Завершенная загрузка по частям текущего пользователя.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('write_only', True)
+        kwargs.setdefault('required', False)
+        super().__init__(**kwargs)
+
+    def get_queryset(self):
+        request = self.context.get('request')
+        return ChunkedUpload.objects.filter(completed=True, created_by=getattr(request, 'user', None))
+
+class SendFileSerializer(HostOperationSerializer):
+    transfers = SendFileTransferSerializer(many=True, read_only=True)
+    upload = ChunkedUploadField()
+    class Meta(HostOperationSerializer.Meta):
         model = SendFile
-        fields = BaseOperationSerializer.Meta.fields + \
-            ['hosts', 'hosts_display', 'protocol', 'local_path', 'target_path', 'file']
+        fields = HostOperationSerializer.Meta.fields + \
+            ['protocol', 'local_path', 'target_path', 'file', 'upload', 'checksum', 'transfers']
         
-    def to_representation(self, instance):
-        rep = super().to_representation(instance)
-        rep['hosts'] = rep.pop('hosts_display', [])
-        return rep
+    def create(self, validated_data):
+        upload = validated_data.pop('upload', None)
+        if upload:
+            validated_data['file'] = upload.store(SendFile._meta.get_field('file'))
+            validated_data['checksum'] = validated_data.get('checksum') or upload.sha256
+        return super().create(validated_data)
+
+class SendFileListSerializer(SendFileSerializer):
+    """
+    Операция в списке: без лога и состояния передач, они возвращаются только детальным представлением.
+    """
+    class Meta(SendFileSerializer.Meta):
+        fields = [field for field in SendFileSerializer.Meta.fields if field not in ('log', 'transfers')]
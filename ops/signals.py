@@ -7,7 +7,7 @@ from .tasks import run_operation
 
 @receiver(m2m_changed, sender=ExecuteCommand.hosts.through)
 def execute_command_post_save(sender, instance: ExecuteCommand, action, **kwargs):
-    if action != "post_add" or instance.log.keys():
+    if action != "post_add" or instance.status != 'queue':
         return
 
     run_operation.delay(instance.id, 'execute-command')
@@ -15,7 +15,7 @@ def execute_command_post_save(sender, instance: ExecuteCommand, action, **kwargs
 
 @receiver(m2m_changed, sender=SendFile.hosts.through)
 def send_file_post_save(sender, instance: SendFile, action, **kwargs):
-    if action != "post_add" or instance.log.keys():
+    if action != "post_add" or instance.status != 'queue':
         return
 
     run_operation.delay(instance.id, 'send-file')
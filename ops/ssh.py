@@ -0,0 +1,338 @@
+import atexit
+import codecs
+import hashlib
+import os
+import select
+import shlex
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Iterator
+
+import paramiko
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+from cryptography.hazmat.primitives.serialization import Encoding, NoEncryption, PrivateFormat, PublicFormat
+from django.conf import settings
+from django.utils import timezone
+
+RECV_SIZE = 32768
+HASH_CHUNK_SIZE = 1024 * 1024
+AUTHORIZED_KEYS_LOCK = 'flock ~/.ssh/.authorized_keys.lock'
+
+
+class SSHConnectionPool:
+    """
+    Пул SSH-соединений воркера. Соединения переиспользуются по ключу (хост, учетная запись),
+    поэтому повторные операции на одном хосте не проходят заново TCP-рукопожатие, KEX и аутентификацию.
+    Свободное соединение выдается только одному потребителю за раз; простаивающие дольше
+    idle_timeout соединения закрываются, а число свободных соединений ограничено max_size.
+    """
+
+    def __init__(self, max_size: int, idle_timeout: int, keepalive: int):
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.keepalive = keepalive
+        self._idle: OrderedDict[tuple, tuple[paramiko.SSHClient, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    @staticmethod
+    def make_key(connect_params: dict) -> tuple:
+        secret = '|'.join(str(connect_params.get(name, ''))
+                          for name in ('password', 'key_filename', 'passphrase'))
+        return (
+            connect_params['hostname'],
+            connect_params.get('port', 22),
+            connect_params.get('username'),
+            hashlib.sha256(secret.encode()).hexdigest(),
+        )
+
+    @contextmanager
+    def connection(self, connect_params: dict) -> Iterator[paramiko.SSHClient]:
+        """
+        Выдает соединение из пула или открывает новое. При исключении соединение закрывается,
+        иначе возвращается в пул.
+        """
+        key = self.make_key(connect_params)
+        client = self._acquire(key) or self._connect(connect_params)
+        try:
+            yield client
+        except BaseException:
+            client.close()
+            raise
+        self._release(key, client)
+
+    def close_all(self) -> None:
+        with self._lock:
+            idle, self._idle = list(self._idle.values()), OrderedDict()
+        for client, _ in idle:
+            client.close()
+
+    def _connect(self, connect_params: dict) -> paramiko.SSHClient:
+        client = paramiko.SSHClient()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        client.connect(**connect_params)
+        if self.keepalive:
+            client.get_transport().set_keepalive(self.keepalive)
+        return client
+
+    @staticmethod
+    def _is_alive(client: paramiko.SSHClient) -> bool:
+        transport = client.get_transport()
+        return transport is not None and transport.is_active()
+
+    def _acquire(self, key: tuple) -> paramiko.SSHClient | None:
+        with self._lock:
+            self._reset_after_fork()
+            expired = self._pop_expired()
+            for pool_key in reversed(self._idle):
+                if pool_key[0] == key:
+                    client, _ = self._idle.pop(pool_key)
+                    break
+            else:
+                client = None
+        for stale in expired:
+            stale.close()
+        if client is not None and not self._is_alive(client):
+            client.close()
+            return None
+        return client
+
+    def _release(self, key: tuple, client: paramiko.SSHClient) -> None:
+        if not self._is_alive(client):
+            client.close()
+            return
+        with self._lock:
+            self._reset_after_fork()
+            self._idle[(key, id(client))] = (client, time.monotonic())
+            expired = self._pop_expired()
+            while len(self._idle) > self.max_size:
+                _, (oldest, _) = self._idle.popitem(last=False)
+                expired.append(oldest)
+        for stale in expired:
+            stale.close()
+
+    def _pop_expired(self) -> list[paramiko.SSHClient]:
+        now = time.monotonic()
+        expired = [pool_key for pool_key, (_, last_used) in self._idle.items()
+                   if now - last_used > self.idle_timeout]
+        return [self._idle.pop(pool_key)[0] for pool_key in expired]
+
+    def _reset_after_fork(self) -> None:
+        # Соединения родительского процесса не используются в дочерних воркерах
+        if self._pid != os.getpid():
+            self._idle = OrderedDict()
+            self._pid = os.getpid()
+
+
+ssh_pool = SSHConnectionPool(
+    max_size=settings.OPS_SSH_POOL_MAX_SIZE,
+    idle_timeout=settings.OPS_SSH_POOL_IDLE_TIMEOUT,
+    keepalive=settings.OPS_SSH_KEEPALIVE,
+)
+atexit.register(ssh_pool.close_all)
+
+
+def stream_channel(channel: paramiko.Channel, flush: Callable[[str, str], None],
+                   interval: float, size: int) -> int:
+    """
+    Читает stdout и stderr канала по мере поступления данных и передает накопленный
+    вывод в flush(stdout, stderr) пачками: раз в interval секунд или по достижении size байт.
+    Возвращает код завершения команды.
+    """
+    decoders = {
+        'stdout': codecs.getincrementaldecoder('utf-8')(errors='replace'),
+        'stderr': codecs.getincrementaldecoder('utf-8')(errors='replace'),
+    }
+    buffers: dict[str, list[str]] = {'stdout': [], 'stderr': []}
+    buffered = 0
+    last_flush = time.monotonic()
+
+    def flush_buffers(final: bool = False) -> None:
+        nonlocal buffered, last_flush
+        if final:
+            for stream, decoder in decoders.items():
+                buffers[stream].append(decoder.decode(b'', final=True))
+        stdout, stderr = ''.join(buffers['stdout']), ''.join(buffers['stderr'])
+        if stdout or stderr:
+            flush(stdout, stderr)
+        buffers['stdout'].clear()
+        buffers['stderr'].clear()
+        buffered = 0
+        last_flush = time.monotonic()
+
+    while True:
+        received = False
+        if channel.recv_ready():
+            data = channel.recv(RECV_SIZE)
+            buffers['stdout'].append(decoders['stdout'].decode(data))
+            buffered += len(data)
+            received = True
+        if channel.recv_stderr_ready():
+            data = channel.recv_stderr(RECV_SIZE)
+            buffers['stderr'].append(decoders['stderr'].decode(data))
+            buffered += len(data)
+            received = True
+
+        if buffered >= size or (buffered and time.monotonic() - last_flush >= interval):
+            flush_buffers()
+
+        if received:
+            continue
+        if channel.exit_status_ready() and not channel.recv_ready() and not channel.recv_stderr_ready():
+            break
+        select.select([channel], [], [], interval)
+
+    flush_buffers(final=True)
+    return channel.recv_exit_status()
+
+
+@dataclass
+class ChannelOutput:
+    started_at: datetime
+    duration: float
+    stdout: str
+    stderr: str
+    exit_code: int
+
+
+def run_channel(transport: paramiko.Transport, command: str) -> ChannelOutput:
+    """
+    Выполняет команду в отдельном канале транспорта и возвращает весь ее вывод.
+    """
+    stdout, stderr = [], []
+
+    def collect(out: str, err: str) -> None:
+        stdout.append(out)
+        stderr.append(err)
+
+    started_at = timezone.now()
+    started = time.monotonic()
+    channel = transport.open_session()
+    try:
+        channel.exec_command(command)
+        exit_code = stream_channel(channel, collect, interval=1, size=RECV_SIZE)
+    finally:
+        channel.close()
+    return ChannelOutput(started_at, time.monotonic() - started,
+                         ''.join(stdout), ''.join(stderr), exit_code)
+
+
+def file_sha256(path: str) -> str:
+    """
+    SHA-256 локального файла, файл читается блоками без загрузки в память целиком.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        while chunk := file.read(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def remote_sha256(client: paramiko.SSHClient, path: str) -> str | None:
+    """
+    SHA-256 файла на удаленном хосте (sha256sum), либо None, если файла нет или его не удалось прочитать.
+    """
+    _, stdout, _ = client.exec_command(f'sha256sum {shlex.quote(path)}')
+    output = stdout.read().decode('utf-8', errors='replace')
+    if stdout.channel.recv_exit_status() != 0 or not output:
+        return None
+    return output.split()[0]
+
+
+def sftp_upload(client: paramiko.SSHClient, local_path: str, target_path: str, chunk_size: int,
+                window_size: int, progress: Callable[[int, float], None], interval: float,
+                offset: int = 0, part_path: str | None = None) -> int:
+    """
+    Загружает файл по SFTP блоками chunk_size с конвейерной записью: запросы на запись отправляются,
+    не дожидаясь подтверждения предыдущих, а окно канала задается window_size. Файл пишется
+    во временный файл part_path (по умолчанию <target_path>.part) и по завершении переименовывается
+    в target_path, так что файл по пути назначения всегда полный. offset - объем, уже отправленный этой операцией:
+    загрузка продолжается с него, но не дальше конца временного файла на хосте.
+    progress(transferred, rate) вызывается не чаще раза в interval секунд и по завершении загрузки,
+    rate - скорость текущей загрузки в байтах в секунду. Возвращает смещение, с которого начата загрузка.
+    """
+    total = os.path.getsize(local_path)
+    part_path = part_path or f'{target_path}.part'
+    sftp = paramiko.SFTPClient.from_transport(client.get_transport(), window_size=window_size)
+    try:
+        if offset:
+            try:
+                offset = min(offset, sftp.stat(part_path).st_size)
+            except IOError:
+                offset = 0
+            if offset > total:
+                offset = 0
+
+        transferred = offset
+        started = last_progress = time.monotonic()
+
+        def report() -> None:
+            elapsed = time.monotonic() - started
+            progress(transferred, (transferred - offset) / elapsed if elapsed else 0.0)
+
+        with open(local_path, 'rb') as local, sftp.open(part_path, 'r+' if offset else 'w') as remote:
+            local.seek(offset)
+            remote.seek(offset)
+            remote.set_pipelined(True)
+            while chunk := local.read(chunk_size):
+                remote.write(chunk)
+                transferred += len(chunk)
+                if time.monotonic() - last_progress >= interval:
+                    report()
+                    last_progress = time.monotonic()
+        # Файл закрыт только после подтверждения сервером всех запросов на запись
+        sftp.posix_rename(part_path, target_path)
+        report()
+    finally:
+        sftp.close()
+    return offset
+
+
+def relay_file(source: paramiko.SSHClient, target: paramiko.SSHClient, target_params: dict,
+               path: str) -> ChannelOutput:
+    """
+    Передает файл path с хоста source на тот же путь хоста target командой scp, выполняемой на source,
+    так что данные идут между хостами напрямую. Для передачи создается одноразовый ключ: открытая часть
+    временно дописывается в authorized_keys учетной записи target, закрытая - во временный каталог
+    с правами 700 на source. authorized_keys изменяется под flock, чтобы параллельные передачи
+    не теряли чужие ключи. После передачи оба удаляются, даже если одно из удалений не удалось.
+    """
+    key = Ed25519PrivateKey.generate()
+    marker = f'srvmanager-relay-{uuid.uuid4().hex}'
+    public_key = key.public_key().public_bytes(Encoding.OpenSSH, PublicFormat.OpenSSH).decode()
+    key_dir = f'/tmp/.{marker}'
+    key_path = f'{key_dir}/id_ed25519'
+
+    with ExitStack() as cleanup:
+        cleanup.callback(
+            run_channel, target.get_transport(),
+            f'{AUTHORIZED_KEYS_LOCK} sh -c \'umask 077; grep -v -F -- "$1" ~/.ssh/authorized_keys '
+            f'> ~/.ssh/authorized_keys.$$; [ $? -le 1 ] && mv ~/.ssh/authorized_keys.$$ ~/.ssh/authorized_keys '
+            f'|| rm -f ~/.ssh/authorized_keys.$$\' '
+            f'sh {shlex.quote(marker)}')
+        authorize = run_channel(
+            target.get_transport(),
+            'mkdir -p ~/.ssh && chmod 700 ~/.ssh && '
+            f'{AUTHORIZED_KEYS_LOCK} sh -c \'echo "$1" >> ~/.ssh/authorized_keys\' '
+            f'sh {shlex.quote(f"restrict {public_key} {marker}")}')
+        if authorize.exit_code != 0:
+            raise RuntimeError(f'Не удалось добавить ключ на хост назначения: {authorize.stderr.strip()}')
+
+        with source.open_sftp() as sftp:
+            # Каталог создается с правами 700, поэтому ключ недоступен другим пользователям с момента создания
+            sftp.mkdir(key_dir, 0o700)
+            cleanup.callback(run_channel, source.get_transport(), f'rm -rf {shlex.quote(key_dir)}')
+            with sftp.open(key_path, 'w') as key_file:
+                key_file.chmod(0o600)
+                key_file.write(key.private_bytes(Encoding.PEM, PrivateFormat.OpenSSH, NoEncryption()))
+        destination = f"{target_params['username']}@{target_params['hostname']}:{path}"
+        return run_channel(
+            source.get_transport(),
+            f'scp -q -i {shlex.quote(key_path)} -o BatchMode=yes -o StrictHostKeyChecking=no '
+            f'-o UserKnownHostsFile=/dev/null -P {target_params.get("port", 22)} '
+            f'{shlex.quote(path)} {shlex.quote(destination)}')
@@ -1,7 +1,8 @@
 import uuid
 from celery import shared_task, chord
 
-from .models import ExecuteCommand, SendFile
+from .engine import AsyncSSHEngine
+from .models import ChunkedUpload, ExecuteCommand, SendFile
 
 types = {
     'execute-command': ExecuteCommand,
@@ -10,20 +11,15 @@ types = {
 
 
 @shared_task
-def check_results(results, operation_id: uuid, operation_type: str):
+def check_results(results, operation_id: uuid, operation_type: str, db_queries: int = 0):
+    """
+    Завершение операции по результатам подопераций (run_suboperation). Запросы к БД подопераций
+    и запуска операции (db_queries) добавляются к db_queries операции вместе со сменой статуса.
+    """
     model = types.get(operation_type)
     operation = model.objects.get(id=operation_id)
-
-    for result in results:
-        if result == False:
-            operation.status = 'error'
-            operation.save(update_fields=['status'])
-            operation.add_log('Операция завершена с ошибками.')
-            return
-
-    operation.status = 'completed'
-    operation.save(update_fields=['status'])
-    operation.add_log('Операция успешно завершена.')
+    operation.count_queries(db_queries + sum(result['db_queries'] for result in results))
+    operation.finish(False not in [result['result'] for result in results])
 
 
 @shared_task
@@ -34,19 +30,44 @@ def run_operation(operation_id: uuid, operation_type: str):
         return
 
     operation = model.objects.get(id=operation_id)
-    operation.status = 'progress'
-    operation.save(update_fields=['status'])
-    operation.add_log('Операция запущена.')
+    engine = getattr(operation, 'engine', 'celery')
+    with operation.track_queries():
+        # Повторно доставленная задача не запускает операцию второй раз
+        if not operation.start():
+            return
+
+        if engine == 'asyncio':
+            success = False not in AsyncSSHEngine(operation).run()
+        else:
+            host_ids = list(operation.hosts.values_list('id', flat=True))
+
+    if engine == 'asyncio':
+        operation.finish(success)
+        return
 
     tasks = [
-        run_suboperation.s(operation_id, host.id, operation_type) for host in operation.hosts.all()
+        run_suboperation.s(operation_id, host_id, operation_type) for host_id in host_ids
     ]
 
-    chord(tasks)(check_results.s(operation_id, operation_type))
+    chord(tasks)(check_results.s(operation_id, operation_type, operation.pop_queries()))
 
 
 @shared_task
-def run_suboperation(operation_id: uuid, host_id: int, operation_type: str):
+def run_suboperation(operation_id: uuid, host_id: int, operation_type: str) -> dict:
+    """
+    Выполнение операции на одном хосте. Число запросов к БД возвращается вместе с результатом
+    и записывается один раз при завершении операции (check_results).
+    """
     model = types.get(operation_type)
     operation = model.objects.get(id=operation_id)
-    return operation.run(host_id)
+    with operation.track_queries():
+        result = operation.run(host_id)
+    return {'result': result, 'db_queries': operation.pop_queries()}
+
+
+@shared_task
+def complete_upload(upload_id: uuid, sha256: str = ''):
+    """
+    Вычисление SHA-256 файла, загруженного по частям, и завершение загрузки, выполняется вне запроса.
+    """
+    ChunkedUpload.objects.get(id=upload_id).complete(sha256)
@@ -1,8 +1,28 @@
+import asyncio
+import fcntl
+import hashlib
+import io
 import os
+import tempfile
+import threading
+import time
+from unittest import mock
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.http import UnreadablePostError
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 
-from core.models import Host, WinRMCredential, SSHCredential
-from core.tests import BaseTestCase
+from core.models import Host, HostTag, WinRMCredential, SSHCredential
+from core.tests import BaseTestCase, ListQueriesMixin
+from .engine import AsyncSSHEngine
+from .management.commands.ssh_standin import start_standin
+from .models import ChunkedUpload, ExecuteCommand, ExecuteCommandResult, OperationLogEntry, SendFile, SendFileTransfer
+from .ssh import ChannelOutput, SSHConnectionPool, relay_file, sftp_upload, stream_channel
+from .tasks import check_results, complete_upload
 
 
 class OpsTestCase(BaseTestCase):
@@ -104,3 +124,789 @@ class OpsTestCase(BaseTestCase):
 
         response_create = self.client.post(reverse('send-file-list'), data)
         self.assertEqual(response_create.status_code, 201)
+
+
+class OperationLogTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.host = Host.objects.create(
+            name='log_host', ip='192.168.0.10', os='linux')
+        self.operation = ExecuteCommand.objects.create(
+            command=['uptime'], protocol='ssh', created_by=self.user)
+
+    def test_add_log_appends_entries(self):
+        self.operation.add_log('first')
+        self.operation.add_log('second', host=self.host)
+        self.operation.error_log('failed', host=self.host)
+
+        entries = OperationLogEntry.objects.filter(operation_id=self.operation.id)
+        self.assertEqual(entries.count(), 3)
+        self.assertEqual(entries.filter(host=self.host).count(), 2)
+        self.assertEqual(list(self.operation.log.values()),
+                         ['first', 'second', '[ERROR] failed'])
+        self.operation.refresh_from_db()
+        self.assertEqual(self.operation.status, 'error')
+
+    def test_log_representation(self):
+        self.operation.add_log('Операция запущена.')
+        response = self.client.get(
+            reverse('execute-command-detail', args=[self.operation.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.data.get('log').values()),
+                         ['Операция запущена.'])
+
+    def test_log_deleted_with_operation(self):
+        self.operation.add_log('first')
+        self.operation.delete()
+        self.assertFalse(OperationLogEntry.objects.exists())
+
+
+class KeysetPaginationTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        host = Host.objects.create(name='keyset_host', ip='192.168.0.11', os='linux')
+        for number in range(7):
+            operation = ExecuteCommand.objects.create(command=[f'echo {number}'], protocol='ssh')
+            operation.hosts.through.objects.create(executecommand_id=operation.id, host_id=host.id)
+            operation.add_log('Операция запущена.')
+        # у части операций одинаковое время создания: порядок внутри них задает id
+        ExecuteCommand.objects.filter(command__in=[['echo 2'], ['echo 3'], ['echo 4']]).update(
+            created_at=timezone.now())
+        self.expected = [str(pk) for pk in ExecuteCommand.objects.order_by('-created_at', '-id')
+                         .values_list('id', flat=True)]
+
+    def get_page(self, **params):
+        response = self.client.get(reverse('execute-command-list'), {'page_size': 3, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_pages(self):
+        pages, cursor = [], ''
+        while True:
+            # аутентификация, страница операций, хосты; без COUNT(*)
+            with self.assertNumQueries(3):
+                page = self.get_page(cursor=cursor)
+            pages.append([operation['id'] for operation in page['results']])
+            self.assertNotIn('log', page['results'][0])
+            self.assertNotIn('stdout', page['results'][0])
+            cursor = page['next']
+            if not cursor:
+                break
+        self.assertEqual([len(ids) for ids in pages], [3, 3, 1])
+        self.assertEqual(sum(pages, []), self.expected)
+
+        previous = self.get_page(cursor=page['previous'])
+        self.assertEqual([operation['id'] for operation in previous['results']], pages[1])
+        first = self.get_page(cursor=previous['previous'])
+        self.assertEqual([operation['id'] for operation in first['results']], pages[0])
+        self.assertIsNone(first['previous'])
+
+    def test_legacy_page(self):
+        page = self.get_page(page=2)
+        self.assertEqual((page['count'], page['current']), (7, 2))
+        self.assertEqual([operation['id'] for operation in page['results']], self.expected[3:6])
+        # без параметра cursor - прежний постраничный вывод
+        self.assertEqual(self.get_page()['count'], 7)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('execute-command-list'), {'cursor': 'invalid'})
+        self.assertEqual(response.status_code, 404)
+
+
+class OpsListQueriesTestCase(ListQueriesMixin, BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.hosts = Host.objects.bulk_create([Host(name=f'list_host{number}', ip=f'10.4.0.{number}', os='linux')
+                                               for number in range(3)])
+
+    def create_operations(self, model, **fields):
+        def create(numbers):
+            for operation in model.objects.bulk_create([model(created_by=self.user, **fields) for _ in numbers]):
+                operation.hosts.through.objects.bulk_create(
+                    [operation.hosts.through(**{f'{model._meta.model_name}_id': operation.id, 'host_id': host.id})
+                     for host in self.hosts])
+                operation.add_log('Операция запущена.')
+        return create
+
+    def test_execute_command_list(self):
+        # аутентификация, COUNT(*), страница операций с пользователями, хосты
+        self.assertListQueries(reverse('execute-command-list'),
+                               self.create_operations(ExecuteCommand, command=['uptime'], protocol='ssh'), 4)
+
+    def test_send_file_list(self):
+        self.assertListQueries(reverse('send-file-list'),
+                               self.create_operations(SendFile, protocol='ssh', target_path='/tmp'), 4)
+
+
+class OperationFilterTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.host = Host.objects.create(name='filter_host', ip='10.1.0.1', os='linux')
+        self.operations = ExecuteCommand.objects.bulk_create([
+            ExecuteCommand(command=['Docker ps'], protocol='ssh', status='completed', created_by=self.user),
+            ExecuteCommand(command=['uptime'], protocol='ssh', status='error'),
+            ExecuteCommand(command=['Get-Service'], protocol='winrm', status='progress'),
+        ])
+        self.operations[0].hosts.add(self.host)
+        ExecuteCommand.objects.filter(id=self.operations[2].id).update(created_at=timezone.now() - timezone.timedelta(days=2))
+
+    def filter(self, **params) -> set[str]:
+        response = self.client.get(reverse('execute-command-list'), params)
+        self.assertEqual(response.status_code, 200)
+        return {operation['id'] for operation in response.data['results']}
+
+    def ids(self, *indexes) -> set[str]:
+        return {str(self.operations[index].id) for index in indexes}
+
+    def test_filters(self):
+        self.assertEqual(self.filter(status=['completed', 'error']), self.ids(0, 1))
+        self.assertEqual(self.filter(protocol='winrm'), self.ids(2))
+        self.assertEqual(self.filter(created_by=self.user.id), self.ids(0))
+        self.assertEqual(self.filter(host=self.host.id), self.ids(0))
+        self.assertEqual(self.filter(command='docker'), self.ids(0))
+        self.assertEqual(self.filter(created_at_before=(timezone.now() - timezone.timedelta(days=1)).isoformat()),
+                         self.ids(2))
+        self.assertEqual(self.filter(status='completed', protocol='winrm'), set())
+
+
+class HostSelectorTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        prod, web = HostTag.objects.bulk_create([HostTag(name='prod'), HostTag(name='web')])
+        self.hosts = Host.objects.bulk_create([
+            Host(name=f'host-{i}', ip=f'10.2.0.{i}', os='windows' if i % 5 == 0 else 'linux') for i in range(1, 51)])
+        prod.hosts.add(*self.hosts[:40])
+        web.hosts.add(*self.hosts[::2])
+
+    def create(self, **data):
+        with mock.patch('ops.tasks.run_operation.delay') as delay:
+            response = self.client.post(reverse('execute-command-list'),
+                                        {'command': ['uptime'], 'protocol': 'ssh', **data}, format='json')
+        return response, delay
+
+    def test_selector(self):
+        selector = 'os=linux AND tag=prod AND tag=web AND NOT name=host-1*'
+        response, delay = self.create(selector=selector, hosts=[self.hosts[-1].id])
+        self.assertEqual(response.status_code, 201)
+        operation = ExecuteCommand.objects.get(id=response.data['id'])
+        self.assertEqual(operation.selector, selector)
+        expected = {host.id for index, host in enumerate(self.hosts[:40])
+                    if index % 2 == 0 and host.os == 'linux' and not host.name.startswith('host-1')}
+        self.assertEqual(set(operation.hosts.values_list('id', flat=True)), expected | {self.hosts[-1].id})
+        delay.assert_called_once_with(operation.id, 'execute-command')
+
+    def test_queries_independent_of_hosts(self):
+        def count(**data):
+            with CaptureQueriesContext(connection) as queries:
+                response, _ = self.create(**data)
+            self.assertEqual(response.status_code, 201)
+            return len(queries)
+
+        self.assertEqual(count(hosts=[self.hosts[0].id]), count(hosts=[host.id for host in self.hosts]))
+        self.assertEqual(count(hosts=[self.hosts[0].id]), count(selector='tag=prod'))
+
+    def test_invalid(self):
+        response, _ = self.create(selector='os=linux AND')
+        self.assertIn('selector', response.data)
+        response, _ = self.create(selector='tag=missing')
+        self.assertIn('selector', response.data)
+        response, _ = self.create(hosts=[self.hosts[0].id, 999999])
+        self.assertIn('999999', str(response.data['hosts']))
+        response, delay = self.create()
+        self.assertIn('hosts', response.data)
+        delay.assert_not_called()
+
+
+class ExecuteCommandResultTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.host1 = Host.objects.create(
+            name='result_host1', ip='192.168.0.11', os='linux')
+        self.host2 = Host.objects.create(
+            name='result_host2', ip='192.168.0.12', os='linux')
+        self.operation = ExecuteCommand.objects.create(
+            command=['uptime', 'df -h'], protocol='ssh', created_by=self.user)
+
+    def test_results_from_parallel_hosts_are_kept(self):
+        # Два воркера с собственными копиями операции пишут результаты одновременно
+        first = ExecuteCommand.objects.get(id=self.operation.id)
+        second = ExecuteCommand.objects.get(id=self.operation.id)
+        first.add_result(self.host1, 0, timezone.now(), 'up 1 day', '', 0)
+        second.add_result(self.host2, 0, timezone.now(), 'up 2 days', '', 0)
+        second.add_result(self.host2, 1, timezone.now(), '', 'df: error', 1)
+
+        self.assertEqual(self.operation.results.count(), 3)
+        self.assertEqual(sorted(self.operation.stdout.values()),
+                         ['up 1 day', 'up 2 days'])
+        self.assertEqual(list(self.operation.stderr.values()), ['df: error'])
+        self.assertEqual(
+            self.operation.results.get(host=self.host2, command_index=1).exit_code, 1)
+
+    def test_output_representation(self):
+        self.operation.add_result(self.host1, 0, timezone.now(), 'up 1 day', '', 0)
+        response = self.client.get(
+            reverse('execute-command-detail', args=[self.operation.id]))
+        self.assertEqual(response.status_code, 200)
+        key, value = next(iter(response.data.get('stdout').items()))
+        self.assertTrue(key.endswith(f'[{self.host1.ip}]'))
+        self.assertEqual(value, 'up 1 day')
+
+
+class FakeChannel:
+    """
+    Канал paramiko, отдающий заранее подготовленный вывод порциями.
+    """
+    def __init__(self, stdout: list[bytes], stderr: list[bytes], exit_code: int = 0):
+        self.stdout = list(stdout)
+        self.stderr = list(stderr)
+        self.exit_code = exit_code
+
+    def recv_ready(self):
+        return bool(self.stdout)
+
+    def recv(self, size):
+        return self.stdout.pop(0)
+
+    def recv_stderr_ready(self):
+        return bool(self.stderr)
+
+    def recv_stderr(self, size):
+        return self.stderr.pop(0)
+
+    def exit_status_ready(self):
+        return not self.stdout and not self.stderr
+
+    def recv_exit_status(self):
+        return self.exit_code
+
+    def exec_command(self, command):
+        pass
+
+    def close(self):
+        pass
+
+
+class ExecuteCommandOutputTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.host = Host.objects.create(
+            name='output_host', ip='192.168.0.13', os='linux')
+        self.operation = ExecuteCommand.objects.create(
+            command=['./prepare_update.sh'], protocol='ssh', created_by=self.user)
+        self.result = ExecuteCommandResult.objects.create(
+            operation=self.operation, host=self.host, command_index=0)
+
+    def test_stream_channel_flushes_by_size(self):
+        flushed = []
+        # Многобайтовый символ разрезан между двумя порциями
+        second = 'шаг 2 г\n'.encode()
+        channel = FakeChannel(['шаг 1\n'.encode(), second[:-2], second[-2:]],
+                              [b'warning\n'], exit_code=3)
+        exit_code = stream_channel(
+            channel, lambda out, err: flushed.append((out, err)), interval=60, size=1)
+
+        self.assertEqual(exit_code, 3)
+        self.assertGreater(len(flushed), 1)
+        self.assertEqual(''.join(out for out, _ in flushed), 'шаг 1\nшаг 2 г\n')
+        self.assertEqual(''.join(err for _, err in flushed), 'warning\n')
+
+    def test_append_output(self):
+        # Порция вывода - только вставка чанков, без перезаписи полного вывода
+        with self.assertNumQueries(1):
+            self.result.append_output('line 1\n')
+        self.result.append_output('line 2\n', 'error\n')
+        self.assertEqual(self.operation.output.count(), 3)
+        self.result.refresh_from_db()
+        self.assertEqual(self.result.stdout, '')
+
+        self.result.finish(0)
+        self.result.refresh_from_db()
+        self.assertEqual(self.result.stdout, 'line 1\nline 2\n')
+        self.assertEqual(self.result.stderr, 'error\n')
+        self.assertEqual(self.result.exit_code, 0)
+
+    def test_output_cursor(self):
+        self.result.append_output('line 1\n')
+        url = reverse('execute-command-output', args=[self.operation.id])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([chunk['data'] for chunk in response.data['chunks']], ['line 1\n'])
+        self.assertFalse(response.data['finished'])
+
+        cursor = response.data['cursor']
+        self.result.append_output('line 2\n')
+        response = self.client.get(url, {'cursor': cursor})
+        self.assertEqual([chunk['data'] for chunk in response.data['chunks']], ['line 2\n'])
+        self.assertEqual(response.data['chunks'][0]['host']['ip'], self.host.ip)
+
+        response = self.client.get(url, {'cursor': response.data['cursor']})
+        self.assertEqual(response.data['chunks'], [])
+
+
+class FakeTransport:
+    def __init__(self):
+        self.active = True
+
+    def is_active(self):
+        return self.active
+
+
+class FakeSSHClient:
+    def __init__(self):
+        self.transport = FakeTransport()
+        self.closed = False
+
+    def get_transport(self):
+        return self.transport
+
+    def close(self):
+        self.closed = True
+        self.transport.active = False
+
+
+class FakeSSHConnectionPool(SSHConnectionPool):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.connects = 0
+
+    def _connect(self, connect_params):
+        self.connects += 1
+        return FakeSSHClient()
+
+
+class SSHConnectionPoolTestCase(TestCase):
+    params = {'hostname': '192.168.0.20', 'port': 22, 'username': 'user', 'password': 'pass'}
+
+    def test_connection_reused(self):
+        pool = FakeSSHConnectionPool(max_size=5, idle_timeout=60, keepalive=0)
+        with pool.connection(self.params) as first:
+            pass
+        with pool.connection(self.params) as second:
+            pass
+        self.assertIs(first, second)
+        self.assertEqual(pool.connects, 1)
+
+        with pool.connection({**self.params, 'password': 'changed'}):
+            pass
+        self.assertEqual(pool.connects, 2)
+
+    def test_broken_connection_not_reused(self):
+        pool = FakeSSHConnectionPool(max_size=5, idle_timeout=60, keepalive=0)
+        with self.assertRaises(RuntimeError):
+            with pool.connection(self.params) as client:
+                raise RuntimeError('channel error')
+        self.assertTrue(client.closed)
+
+        with pool.connection(self.params) as client:
+            client.transport.active = False
+        with pool.connection(self.params):
+            pass
+        self.assertEqual(pool.connects, 3)
+
+    def test_idle_and_max_size_eviction(self):
+        pool = FakeSSHConnectionPool(max_size=1, idle_timeout=60, keepalive=0)
+        with pool.connection(self.params) as first:
+            with pool.connection(self.params) as second:
+                pass
+        self.assertTrue(second.closed)
+        self.assertFalse(first.closed)
+
+        pool.idle_timeout = -1
+        with pool.connection(self.params) as third:
+            pass
+        self.assertTrue(first.closed)
+        self.assertIsNot(third, first)
+
+
+class CommandTransport:
+    """
+    Транспорт, открывающий для каждой команды канал с ее текстом в stdout.
+    """
+    def __init__(self):
+        self.opened = 0
+
+    def open_session(self):
+        self.opened += 1
+
+        class Channel(FakeChannel):
+            def exec_command(self, command):
+                if command.startswith('sleep'):
+                    time.sleep(0.2)
+                self.stdout.append(command.encode())
+
+        return Channel([], [])
+
+    def get_transport(self):
+        return self
+
+
+class ExecuteCommandParallelTestCase(BaseTestCase):
+    def test_parallel_results_in_command_order(self):
+        host = Host.objects.create(name='parallel_host', ip='192.168.0.14', os='linux')
+        operation = ExecuteCommand.objects.create(
+            command=['sleep 1', 'uname', 'sleep 2', 'df -h'], protocol='ssh', parallel=True)
+        client = CommandTransport()
+        operation.run_ssh_command(client, host)
+
+        self.assertEqual(client.opened, 4)
+        results = list(operation.results.order_by('id'))
+        self.assertEqual([result.command_index for result in results], [0, 1, 2, 3])
+        self.assertEqual([result.stdout for result in results], operation.command)
+
+
+class AsyncSSHEngineTestCase(TransactionTestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.server = self.loop.run_until_complete(
+            start_standin('127.0.0.1', 0, 'standin', latency=0.1))
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+
+        self.hosts = Host.objects.bulk_create(
+            [Host(name=f'standin-{number}', ip='127.0.0.1', os='linux') for number in range(20)])
+        credential = SSHCredential(username='standin', port=self.port)
+        credential.set_password('standin')
+        credential.save()
+        credential.host.set(self.hosts[:-1])
+
+    def tearDown(self):
+        self.loop.call_soon_threadsafe(self.server.close)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+    def test_fan_out(self):
+        operation = ExecuteCommand.objects.create(
+            command=['uptime', 'uname'], protocol='ssh', engine='asyncio')
+        ExecuteCommand.hosts.through.objects.bulk_create([
+            ExecuteCommand.hosts.through(executecommand_id=operation.id, host_id=host.id)
+            for host in self.hosts
+        ])
+
+        started = time.monotonic()
+        results = AsyncSSHEngine(operation, concurrency=10, batch_size=7).run()
+
+        # 19 хостов по 2 команды с задержкой 0.1 с при 10 одновременных соединениях
+        self.assertLess(time.monotonic() - started, 19 * 2 * 0.1)
+        self.assertEqual(results.count(True), 19)
+        self.assertEqual(results.count(False), 1)
+        self.assertEqual(operation.results.count(), 38)
+        self.assertEqual(set(operation.results.values_list('stdout', flat=True)),
+                         {'uptime\n', 'uname\n'})
+        self.assertEqual(operation.log_entries.count(), 20)
+        # запросы потока записи пачек учитываются в метрике операции при ее завершении
+        self.assertGreater(operation.pop_queries(), 0)
+
+    def test_parallel_rejected(self):
+        operation = ExecuteCommand.objects.create(
+            command=['uptime', 'uname'], protocol='ssh', engine='asyncio', parallel=True)
+        self.assertEqual(AsyncSSHEngine(operation).run(), [False])
+        self.assertEqual(operation.log_entries.get().level, 'error')
+
+
+class OperationTransitionTestCase(TestCase):
+    def setUp(self):
+        self.operation = ExecuteCommand.objects.create(command=['uptime'], protocol='ssh')
+        ContentType.objects.get_for_model(ExecuteCommand)
+
+    def test_transition(self):
+        with self.assertNumQueries(1):
+            self.assertTrue(self.operation.start())
+        self.assertTrue(self.operation.finish(True))
+        # конечный статус не меняется, лог не дополняется
+        self.assertFalse(self.operation.start())
+        self.assertFalse(self.operation.finish(False))
+
+        self.assertEqual(ExecuteCommand.objects.get(id=self.operation.id).status, 'completed')
+        self.assertEqual(
+            list(self.operation.log_entries.values_list('message', flat=True)),
+            ['Операция запущена.', 'Операция успешно завершена.'])
+
+    def test_db_queries(self):
+        ExecuteCommand.objects.filter(id=self.operation.id).update(status='progress')
+        with CaptureQueriesContext(connection) as queries:
+            check_results([{'result': True, 'db_queries': 3}, {'result': False, 'db_queries': 4}],
+                          self.operation.id, 'execute-command', 2)
+        self.operation.refresh_from_db()
+        self.assertEqual((self.operation.status, self.operation.db_queries), ('error', 9))
+        # счетчик записывается тем же запросом, что и статус
+        self.assertEqual(len(queries), 2)
+
+    def test_error_log_after_finish(self):
+        self.assertTrue(self.operation.finish(True))
+        with mock.patch('ops.models.CredentialResolver.evict') as evict:
+            self.operation.error_log('late failure')
+        evict.assert_called_once_with(self.operation)
+        self.assertEqual(ExecuteCommand.objects.get(id=self.operation.id).status, 'completed')
+        self.assertEqual(self.operation.log_entries.last().message, 'late failure')
+
+
+class RunInlineTestCase(TestCase):
+    def test_run_inline(self):
+        host = Host.objects.create(name='no_credentials', ip='127.0.0.1', os='linux')
+        with mock.patch('ops.tasks.run_operation.delay') as delay:
+            operation = ExecuteCommand.run_inline(host, command=['uptime'], protocol='ssh')
+
+        delay.assert_not_called()
+        self.assertEqual(operation.status, 'error')
+        self.assertEqual(list(operation.hosts.all()), [host])
+        self.assertEqual(
+            list(operation.log_entries.values_list('message', flat=True)),
+            ['Операция запущена.', '[127.0.0.1] Нет учетных записей для выполнения команды.',
+             'Операция завершена с ошибками.'])
+
+    def test_run_error(self):
+        host = Host.objects.create(name='inline_error', ip='127.0.0.1', os='linux')
+        with mock.patch.object(ExecuteCommand, 'run', side_effect=RuntimeError('connection lost')), \
+                self.assertRaises(RuntimeError):
+            ExecuteCommand.run_inline(host, command=['uptime'], protocol='ssh')
+
+        operation = ExecuteCommand.objects.get()
+        self.assertEqual(operation.status, 'error')
+        self.assertEqual(operation.log_entries.last().message, 'Операция прервана ошибкой: connection lost')
+
+
+class SendFileChecksumTestCase(TestCase):
+    def setUp(self):
+        self.host = Host.objects.create(name='checksum_host', ip='127.0.0.1', os='linux')
+        credential = SSHCredential(username='user')
+        credential.set_password('password')
+        credential.save()
+        credential.host.add(self.host)
+        local = tempfile.NamedTemporaryFile()
+        local.write(b'update')
+        local.flush()
+        self.addCleanup(local.close)
+        self.send_file = SendFile.objects.create(
+            protocol='sftp', local_path=local.name,
+            target_path='/tmp/update_abc.tar.gz', checksum='abc')
+        pool = mock.patch('ops.models.ssh_pool.connection')
+        pool.start()
+        self.addCleanup(pool.stop)
+
+    def test_skip_if_present(self):
+        with mock.patch('ops.models.remote_sha256', return_value='abc'), \
+                mock.patch('ops.models.sftp_upload') as upload:
+            self.assertTrue(self.send_file.send_sftp_file(self.host))
+        upload.assert_not_called()
+        transfer = self.send_file.transfers.get()
+        self.assertEqual((transfer.size, transfer.transferred, transfer.eta), (6, 6, 0))
+
+    def test_resumed_upload_restarted_on_checksum_mismatch(self):
+        with mock.patch('ops.models.remote_sha256', side_effect=[None, 'def', 'abc']), \
+                mock.patch('ops.models.sftp_upload', return_value=3) as upload:
+            SendFileTransfer.objects.create(operation=self.send_file, host=self.host, size=6, transferred=3)
+            self.assertTrue(self.send_file.send_sftp_file(self.host))
+        self.assertEqual([call.kwargs['offset'] for call in upload.call_args_list], [3, 0])
+        self.assertEqual(upload.call_args.kwargs['part_path'], f'/tmp/update_abc.tar.gz.{self.send_file.pk}.part')
+
+    def test_retry_after_connection_error(self):
+        with mock.patch('ops.models.sftp_upload', side_effect=[EOFError('dropped'), 0]) as upload, \
+                mock.patch('ops.models.remote_sha256', side_effect=[None, None, 'abc']):
+            self.assertTrue(self.send_file.send_sftp_file(self.host))
+        self.assertEqual(upload.call_count, 2)
+
+
+class FakeSFTPClient:
+    """
+    SFTP-клиент поверх локального каталога root.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def path(self, path: str) -> str:
+        return os.path.join(self.root, path.lstrip('/'))
+
+    def stat(self, path: str):
+        return os.stat(self.path(path))
+
+    def open(self, path: str, mode: str):
+        file = open(self.path(path), mode + 'b')
+        file.set_pipelined = lambda pipelined: None
+        return file
+
+    def posix_rename(self, old_path: str, new_path: str):
+        os.replace(self.path(old_path), self.path(new_path))
+
+    def close(self):
+        pass
+
+
+class SFTPUploadTestCase(TestCase):
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        self.root = root.name
+        with open(os.path.join(self.root, 'local'), 'wb') as local:
+            local.write(b'new update')
+        sftp = mock.patch('ops.ssh.paramiko.SFTPClient.from_transport', return_value=FakeSFTPClient(self.root))
+        sftp.start()
+        self.addCleanup(sftp.stop)
+        self.progress = mock.Mock()
+
+    def write(self, name: str, data: bytes):
+        with open(os.path.join(self.root, name), 'wb') as file:
+            file.write(data)
+
+    def upload(self, offset: int = 0) -> tuple[int, bytes]:
+        offset = sftp_upload(FakeSSHClient(), os.path.join(self.root, 'local'), '/target', chunk_size=4,
+                             window_size=1024, progress=self.progress, interval=0, offset=offset)
+        self.assertFalse(os.path.exists(os.path.join(self.root, 'target.part')))
+        with open(os.path.join(self.root, 'target'), 'rb') as target:
+            return offset, target.read()
+
+    def test_existing_target_not_resumed(self):
+        self.write('target', b'old')
+        self.assertEqual(self.upload(), (0, b'new update'))
+        self.progress.assert_called_with(10, mock.ANY)
+
+    def test_resume_own_part(self):
+        self.write('target.part', b'new up')
+        self.assertEqual(self.upload(offset=4), (4, b'new update'))
+
+    def test_resume_limited_by_part_size(self):
+        self.write('target.part', b'ne')
+        self.assertEqual(self.upload(offset=6), (2, b'new update'))
+
+
+class RelayFileTestCase(TestCase):
+    def test_cleanup_after_failed_cleanup(self):
+        commands = []
+
+        def run(transport, command):
+            commands.append(command)
+            if command.startswith('rm -rf'):
+                raise EOFError('dropped')
+            return ChannelOutput(timezone.now(), 0, '', '', 0)
+
+        with mock.patch('ops.ssh.run_channel', side_effect=run), self.assertRaises(EOFError):
+            relay_file(mock.MagicMock(), mock.MagicMock(), {'username': 'user', 'hostname': '10.0.0.2'}, '/tmp/file')
+        self.assertEqual([command.split()[0] for command in commands], ['mkdir', 'scp', 'rm', 'flock'])
+        self.assertIn('grep -v -F', commands[-1])
+
+
+class ChunkedUploadTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media = self.settings(MEDIA_ROOT=media_root.name)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.host = Host.objects.create(name='upload_host', ip='127.0.0.1', os='linux')
+
+    def append(self, upload_id, offset: int, data: bytes):
+        return self.client.patch(
+            reverse('upload-detail', args=[upload_id]), data,
+            content_type='application/offset+octet-stream', HTTP_UPLOAD_OFFSET=str(offset))
+
+    def test_chunked_upload(self):
+        content = os.urandom(3000)
+        response = self.client.post(reverse('upload-list'), {'filename': 'payload.bin', 'size': 3000})
+        self.assertEqual(response.status_code, 201)
+        upload_id = response.data['id']
+
+        self.assertEqual(self.append(upload_id, 0, content[:1000]).data['offset'], 1000)
+        # повтор уже принятой части после обрыва соединения
+        conflict = self.append(upload_id, 0, content[:1000])
+        self.assertEqual((conflict.status_code, conflict.data['offset']), (409, 1000))
+        self.assertEqual(self.client.head(reverse('upload-detail', args=[upload_id]))['Upload-Offset'], '1000')
+        self.assertEqual(self.append(upload_id, 1000, content[1000:]).data['offset'], 3000)
+
+        with mock.patch('ops.views.complete_upload.delay', side_effect=complete_upload):
+            response = self.client.post(reverse('upload-complete', args=[upload_id]),
+                                        {'sha256': hashlib.sha256(content).hexdigest()})
+        self.assertEqual(response.status_code, 202)
+        self.assertTrue(self.client.get(reverse('upload-detail', args=[upload_id])).data['completed'])
+
+        response = self.client.post(reverse('send-file-list'), {
+            'hosts': [self.host.id],
+            'protocol': 'sftp',
+            'target_path': '/tmp/payload.bin',
+            'upload': upload_id,
+        })
+        self.assertEqual(response.status_code, 201)
+        send_file = SendFile.objects.get(id=response.data['id'])
+        with send_file.file.open('rb') as file:
+            self.assertEqual(file.read(), content)
+        self.assertEqual(send_file.checksum, hashlib.sha256(content).hexdigest())
+        self.assertFalse(ChunkedUpload.objects.exists())
+
+    def test_complete_incomplete_upload(self):
+        upload = ChunkedUpload.objects.create(filename='payload.bin', size=10, created_by=self.user)
+        self.append(upload.id, 0, b'12345')
+        response = self.client.post(reverse('upload-complete', args=[upload.id]))
+        self.assertEqual((response.status_code, response.data['offset']), (400, 5))
+
+    def test_checksum_mismatch(self):
+        upload = ChunkedUpload.objects.create(filename='payload.bin', size=5, created_by=self.user)
+        self.append(upload.id, 0, b'12345')
+        with mock.patch('ops.views.complete_upload.delay', side_effect=complete_upload):
+            response = self.client.post(reverse('upload-complete', args=[upload.id]), {'sha256': 'abc'})
+        self.assertEqual(response.status_code, 202)
+        upload.refresh_from_db()
+        self.assertEqual((upload.completed, upload.processing, upload.offset, upload.error),
+                         (False, False, 0, 'Контрольная сумма загруженного файла не совпадает.'))
+        self.assertFalse(os.path.exists(upload.path))
+
+        # файл загружается заново
+        self.assertEqual(self.append(upload.id, 0, b'12345').data['offset'], 5)
+        with mock.patch('ops.views.complete_upload.delay', side_effect=complete_upload):
+            self.client.post(reverse('upload-complete', args=[upload.id]),
+                             {'sha256': hashlib.sha256(b'12345').hexdigest()})
+        upload.refresh_from_db()
+        self.assertEqual((upload.completed, upload.error), (True, ''))
+
+    def test_complete_once(self):
+        upload = ChunkedUpload.objects.create(filename='payload.bin', size=5, created_by=self.user)
+        self.append(upload.id, 0, b'12345')
+        with mock.patch('ops.views.complete_upload.delay') as delay:
+            self.assertEqual(self.client.post(reverse('upload-complete', args=[upload.id])).status_code, 202)
+            # проверка уже запущена
+            self.assertEqual(self.client.post(reverse('upload-complete', args=[upload.id])).status_code, 409)
+        delay.assert_called_once()
+        self.assertTrue(ChunkedUpload.objects.get(id=upload.id).processing)
+
+    def test_client_disconnect(self):
+        upload = ChunkedUpload.objects.create(filename='payload.bin', size=10, created_by=self.user)
+        stream = mock.Mock()
+        stream.read.side_effect = [b'123', UnreadablePostError('disconnected')]
+        self.assertEqual(upload.append(stream, 0), 3)
+        self.assertEqual(ChunkedUpload.objects.get(id=upload.id).offset, 3)
+
+    def test_invalid_content_length(self):
+        upload = ChunkedUpload.objects.create(filename='payload.bin', size=10, created_by=self.user)
+        response = self.client.patch(
+            reverse('upload-detail', args=[upload.id]), b'12345', content_type='application/offset+octet-stream',
+            HTTP_UPLOAD_OFFSET='0', CONTENT_LENGTH='abc')
+        self.assertEqual(response.status_code, 400)
+
+    def test_chunk_size_limit(self):
+        upload = ChunkedUpload.objects.create(filename='payload.bin', size=10, created_by=self.user)
+        with self.settings(OPS_UPLOAD_MAX_CHUNK_SIZE=4):
+            self.assertEqual(self.append(upload.id, 0, b'12345').status_code, 413)
+            self.assertEqual(upload.append(io.BytesIO(b'12345'), 0), 4)
+        self.assertEqual(ChunkedUpload.objects.get(id=upload.id).offset, 4)
+
+    def test_concurrent_append(self):
+        upload = ChunkedUpload.objects.create(filename='payload.bin', size=10, created_by=self.user)
+        self.append(upload.id, 0, b'12345')
+        with open(upload.path, 'rb') as file:
+            # часть с того же смещения принимается другим запросом
+            fcntl.flock(file, fcntl.LOCK_EX)
+            conflict = self.append(upload.id, 5, b'67890')
+        self.assertEqual((conflict.status_code, conflict.data['offset']), (409, 5))
+        self.assertEqual(self.append(upload.id, 5, b'67890').data['offset'], 10)
+
+    def test_upload_of_other_user(self):
+        other = User.objects.create_user(username='other', password='password')
+        upload = ChunkedUpload.objects.create(filename='payload.bin', size=5, completed=True, created_by=other)
+        response = self.client.post(reverse('send-file-list'), {
+            'hosts': [self.host.id],
+            'protocol': 'sftp',
+            'target_path': '/tmp/payload.bin',
+            'upload': upload.id,
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('upload', response.data)
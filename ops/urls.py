@@ -1,6 +1,6 @@
 from rest_framework.routers import DefaultRouter
 
-from .views import ExecuteCommandViewSet, SendFileViewSet
+from .views import ChunkedUploadViewSet, ExecuteCommandViewSet, SendFileViewSet
 
 
 router = DefaultRouter()
@@ -8,5 +8,7 @@ router.register('execute-command', ExecuteCommandViewSet,
                 basename='execute-command')
 router.register('send-file', SendFileViewSet,
                 basename='send-file')
+router.register('upload', ChunkedUploadViewSet,
+                basename='upload')
 
 urlpatterns = router.urls
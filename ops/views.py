@@ -1,9 +1,16 @@
+from django.conf import settings
 from rest_framework import viewsets
 from rest_framework import mixins
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.response import Response
 
-from core.views import CorePageNumberPagination
-from .models import ExecuteCommand, SendFile
-from .serializers import ExecuteCommandSerializer, SendFileSerializer
+from core.views import KeysetPagination
+from .filters import ExecuteCommandFilter, SendFileFilter
+from .models import ChunkedUpload, ExecuteCommand, SendFile, UploadOffsetMismatch
+from .serializers import (ChunkedUploadSerializer, ExecuteCommandListSerializer, ExecuteCommandSerializer,
+                          ExecuteCommandOutputSerializer, SendFileListSerializer, SendFileSerializer)
+from .tasks import complete_upload
 
 
 class ExecuteCommandViewSet(mixins.CreateModelMixin,
@@ -11,9 +18,47 @@ class ExecuteCommandViewSet(mixins.CreateModelMixin,
                             mixins.DestroyModelMixin,
                             mixins.ListModelMixin,
                             viewsets.GenericViewSet):
-    queryset = ExecuteCommand.objects.select_related('created_by').prefetch_related('hosts')
+    queryset = ExecuteCommand.objects.select_related('created_by').prefetch_related('hosts', 'log_entries', 'results__host')
     serializer_class = ExecuteCommandSerializer
-    pagination_class = CorePageNumberPagination
+    pagination_class = KeysetPagination
+    filterset_class = ExecuteCommandFilter
+    output_limit = 500
+
+    def get_queryset(self):
+        if self.action == 'output':
+            return ExecuteCommand.objects.only('id', 'status')
+        if self.action == 'list':
+            # Лог и результаты команд в списке не выводятся
+            return ExecuteCommand.objects.select_related('created_by').prefetch_related('hosts').defer('callback')
+        return super().get_queryset()
+
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return ExecuteCommandListSerializer
+        return super().get_serializer_class()
+
+    @action(methods=['GET'], detail=True)
+    def output(self, request, pk=None):
+        """
+        Вывод выполняющейся операции начиная с курсора cursor (id последнего полученного чанка).
+        """
+        operation = self.get_object()
+        try:
+            cursor = int(request.query_params.get('cursor', 0))
+        except ValueError:
+            cursor = 0
+        chunks = list(
+            operation.output.filter(id__gt=cursor)
+            .select_related('result__host')[:self.output_limit]
+        )
+        if chunks:
+            cursor = chunks[-1].id
+        return Response({
+            'cursor': cursor,
+            'status': operation.status,
+            'finished': operation.status in ('completed', 'error') and len(chunks) < self.output_limit,
+            'chunks': ExecuteCommandOutputSerializer(chunks, many=True).data,
+        })
 
 
 class SendFileViewSet(mixins.CreateModelMixin,
@@ -21,6 +66,75 @@ class SendFileViewSet(mixins.CreateModelMixin,
                       mixins.DestroyModelMixin,
                       mixins.ListModelMixin,
                       viewsets.GenericViewSet):
-    queryset = SendFile.objects.select_related('created_by').prefetch_related('hosts')
+    queryset = SendFile.objects.select_related('created_by').prefetch_related('hosts', 'log_entries', 'transfers__host')
     serializer_class = SendFileSerializer
-    pagination_class = CorePageNumberPagination
+    pagination_class = KeysetPagination
+    filterset_class = SendFileFilter
+
+    def get_queryset(self):
+        if self.action == 'list':
+            # Лог и передачи файла в списке не выводятся
+            return SendFile.objects.select_related('created_by').prefetch_related('hosts').defer('callback')
+        return super().get_queryset()
+
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return SendFileListSerializer
+        return super().get_serializer_class()
+
+
+class ChunkedUploadViewSet(mixins.CreateModelMixin,
+                           mixins.RetrieveModelMixin,
+                           mixins.DestroyModelMixin,
+                           viewsets.GenericViewSet):
+    """
+    Загрузка файла по частям:
+    POST {filename, size} создает загрузку; PATCH с заголовком Upload-Offset дописывает тело запроса
+    (application/offset+octet-stream) с указанного смещения; GET/HEAD возвращают принятое смещение;
+    POST complete запускает вычисление контрольной суммы и завершение загрузки (processing, completed, error). Тело
+    PATCH длиннее settings.OPS_UPLOAD_MAX_CHUNK_SIZE отклоняется. Завершенная загрузка передается в поле upload файла обновления
+    или операции отправки файла.
+    """
+    serializer_class = ChunkedUploadSerializer
+
+    def get_queryset(self):
+        return ChunkedUpload.objects.filter(created_by=self.request.user)
+
+    def retrieve(self, request, *args, **kwargs):
+        response = super().retrieve(request, *args, **kwargs)
+        response['Upload-Offset'] = response.data['offset']
+        return response
+
+    def partial_update(self, request, pk=None):
+        upload = self.get_object()
+        try:
+            offset = int(request.headers.get('Upload-Offset', ''))
+        except ValueError:
+            return Response({'detail': 'Не указан заголовок Upload-Offset.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            length = int(request.headers.get('Content-Length') or 0)
+        except ValueError:
+            return Response({'detail': 'Некорректный заголовок Content-Length.'}, status=status.HTTP_400_BAD_REQUEST)
+        if length > settings.OPS_UPLOAD_MAX_CHUNK_SIZE:
+            return Response({'detail': f'Часть файла больше {settings.OPS_UPLOAD_MAX_CHUNK_SIZE} байт.'},
+                            status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        try:
+            # Тело читается напрямую из запроса, без разбора и буферизации парсерами
+            offset = upload.append(request._request, offset)
+        except UploadOffsetMismatch as e:
+            return Response({'detail': str(e), 'offset': e.offset},
+                            status=status.HTTP_409_CONFLICT, headers={'Upload-Offset': e.offset})
+        return Response({'offset': offset}, headers={'Upload-Offset': offset})
+
+    @action(methods=['POST'], detail=True)
+    def complete(self, request, pk=None):
+        upload = self.get_object()
+        if upload.offset != upload.size:
+            return Response({'detail': 'Файл загружен не полностью.', 'offset': upload.offset},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if not upload.begin_complete():
+            return Response({'detail': 'Загрузка уже завершена или проверяется.'}, status=status.HTTP_409_CONFLICT)
+        upload.refresh_from_db()
+        # Контрольная сумма многогигабайтного файла вычисляется фоновой задачей, результат - в completed и error
+        complete_upload.delay(upload.id, request.data.get('sha256', ''))
+        return Response(self.get_serializer(upload).data, status=status.HTTP_202_ACCEPTED)
@@ -74,9 +74,11 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework_simplejwt',
     'corsheaders',
+    'django_filters',
     'core',
     'ops',
     'etaupdater',
@@ -99,7 +101,10 @@ REST_FRAMEWORK = {
     ),
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
-    )
+    ),
+    'DEFAULT_FILTER_BACKENDS': (
+        'django_filters.rest_framework.DjangoFilterBackend',
+    ),
 }
 
 # Simple JWT
@@ -177,9 +182,47 @@ CELERY_RESULT_BACKEND = os.getenv('CELERY_BROKER_URL')
 CELERY_TIMEZONE = 'Asia/Krasnoyarsk'
 CELERY_TASK_ALWAYS_EAGER = get_bool_env('DEBUG', False)
 CELERY_TASK_EAGER_PROPAGATES = get_bool_env('DEBUG', False)
+CELERY_BEAT_SCHEDULE = {
+    'discover-etalon-instances': {
+        'task': 'etaupdater.tasks.discover_etalon_instances',
+        'schedule': get_int_env('ETALON_DISCOVERY_INTERVAL', 3600),
+    },
+    'refresh-etalon-health': {
+        'task': 'etaupdater.tasks.refresh_etalon_health',
+        'schedule': get_int_env('ETALON_HEALTH_REFRESH_INTERVAL', 60),
+    },
+}
+
+# CORE
+CREDENTIAL_CACHE_TTL = get_int_env('CREDENTIAL_CACHE_TTL', 60)
+HOST_IMPORT_BATCH_SIZE = get_int_env('HOST_IMPORT_BATCH_SIZE', 500)
+
+# OPS
+OPS_OUTPUT_FLUSH_INTERVAL = get_int_env('OPS_OUTPUT_FLUSH_INTERVAL', 1)
+OPS_OUTPUT_FLUSH_SIZE = get_int_env('OPS_OUTPUT_FLUSH_SIZE', 65536)
+OPS_SSH_POOL_MAX_SIZE = get_int_env('OPS_SSH_POOL_MAX_SIZE', 20)
+OPS_SSH_POOL_IDLE_TIMEOUT = get_int_env('OPS_SSH_POOL_IDLE_TIMEOUT', 300)
+OPS_SSH_KEEPALIVE = get_int_env('OPS_SSH_KEEPALIVE', 30)
+OPS_SSH_MAX_CHANNELS_PER_HOST = get_int_env('OPS_SSH_MAX_CHANNELS_PER_HOST', 4)
+OPS_ASYNC_CONCURRENCY = get_int_env('OPS_ASYNC_CONCURRENCY', 200)
+OPS_ASYNC_BATCH_SIZE = get_int_env('OPS_ASYNC_BATCH_SIZE', 500)
+OPS_ASYNC_FLUSH_INTERVAL = get_int_env('OPS_ASYNC_FLUSH_INTERVAL', 1)
+OPS_SFTP_CHUNK_SIZE = get_int_env('OPS_SFTP_CHUNK_SIZE', 1048576)
+OPS_SFTP_WINDOW_SIZE = get_int_env('OPS_SFTP_WINDOW_SIZE', 16777216)
+OPS_SFTP_PROGRESS_INTERVAL = get_int_env('OPS_SFTP_PROGRESS_INTERVAL', 2)
+OPS_SFTP_RETRIES = get_int_env('OPS_SFTP_RETRIES', 3)
+OPS_UPLOAD_MAX_CHUNK_SIZE = get_int_env('OPS_UPLOAD_MAX_CHUNK_SIZE', 104857600)
 
 # ETAUPDATER
 ETALON_DOCKER_IMAGES_COUNT = get_int_env('ETALON_DOCKER_IMAGES_COUNT', 7)
 ETALON_UPDATE_OPERATION_TIMEOUT = get_int_env('ETALON_UPDATE_OPERATION_TIMEOUT', 900)
 ETALON_UPDATE_OPERATION_WAIT_INTERVAL = get_int_env('ETALON_UPDATE_OPERATION_WAIT_INTERVAL', 30)
-ETALON_UPDATE_MIN_FREE_SPACE_MB = get_int_env('ETALON_UPDATE_MIN_FREE_SPACE_MB', 4096)
\ No newline at end of file
+ETALON_UPDATE_MIN_FREE_SPACE_MB = get_int_env('ETALON_UPDATE_MIN_FREE_SPACE_MB', 4096)
+ETALON_UPDATE_RELAY_SEEDS = get_int_env('ETALON_UPDATE_RELAY_SEEDS', 2)
+ETALON_UPDATE_RELAY_CONCURRENCY = get_int_env('ETALON_UPDATE_RELAY_CONCURRENCY', 8)
+ETALON_DISCOVERY_CONCURRENCY = get_int_env('ETALON_DISCOVERY_CONCURRENCY', 16)
+ETALON_HEALTH_CONCURRENCY = get_int_env('ETALON_HEALTH_CONCURRENCY', 100)
+ETALON_HEALTH_TIMEOUT = get_int_env('ETALON_HEALTH_TIMEOUT', 15)
+ETALON_HEALTH_BACKOFF = get_int_env('ETALON_HEALTH_BACKOFF', 2)
+ETALON_HEALTH_CACHE_TTL = get_int_env('ETALON_HEALTH_CACHE_TTL', 180)
+ETALON_HEALTH_HISTORY_SIZE = get_int_env('ETALON_HEALTH_HISTORY_SIZE', 60)
\ No newline at end of file
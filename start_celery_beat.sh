@@ -0,0 +1,4 @@
+#!/bin/bash
+set -e
+
+exec celery -A srvmanager beat --loglevel=INFO
\ No newline at end of file